@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+# Workers share their Prometheus metrics through mmap'd files in this directory.
+# It must be set before the app (and prometheus_client) is imported in a worker.
+multiproc_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'scholarshiphub-metrics'))
+
+# Imported up front: importing inside child_exit, which runs from a signal handler, can
+# interrupt an import already in progress in the arbiter
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    # Files left by a previous run would be added to this run's counters
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import User, Scholarship, Comment, StatementOfPurpose
+from django.utils.html import format_html, format_html_join
+from .models import User, Scholarship, Comment, StatementOfPurpose, Job, RequestProfile
+from .profiling import project_functions
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'first_name', 'last_name', 'email', 'username', 'is_verified', 'is_staff', 'is_superuser')
@@ -7,7 +9,7 @@ class UserAdmin(admin.ModelAdmin):
     list_filter = ('is_verified',)
 
 class ScholarshipAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'field_of_study', 'deadline')
+    list_display = ('id', 'title', 'field_of_study', 'deadline', 'deadline_date', 'comment_count', 'last_comment_at')
     search_fields = ('title', 'field_of_study')
     list_filter = ('field_of_study',)
 
@@ -21,7 +23,40 @@ class StatementOfPurposeAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'title')
     list_filter = ('is_reviewed', 'submission_date')
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    search_fields = ('kind',)
+    list_filter = ('status', 'kind')
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('id', 'method', 'path', 'status_code', 'duration_ms', 'user', 'hottest_function', 'created_at')
+    search_fields = ('path', 'url_name')
+    list_filter = ('method', 'url_name')
+    exclude = ('stats', 'top_functions')
+    readonly_fields = ('user', 'method', 'path', 'url_name', 'status_code', 'duration_ms', 'created_at', 'function_table')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Hottest project function')
+    def hottest_function(self, obj):
+        functions = project_functions(obj.top_functions) or obj.top_functions
+        return functions[0]['function'] if functions else ''
+
+    @admin.display(description='Top functions (by cumulative time)')
+    def function_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((f['calls'], f['tottime_ms'], f['cumtime_ms'], f['function']) for f in obj.top_functions),
+        )
+        return format_html('<table><tr><th>calls</th><th>tottime ms</th><th>cumtime ms</th><th>function</th></tr>{}</table>', rows)
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Scholarship, ScholarshipAdmin)
 admin.site.register(Comment, CommentAdmin)
-admin.site.register(StatementOfPurpose, StatementOfPurposeAdmin)
\ No newline at end of file
+admin.site.register(StatementOfPurpose, StatementOfPurposeAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(RequestProfile, RequestProfileAdmin)
\ No newline at end of file
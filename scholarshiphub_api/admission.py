@@ -0,0 +1,78 @@
+import math
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+def client_ip(request):
+    """
+    The client address. Behind ADMISSION_TRUSTED_PROXIES reverse proxies it is
+    the entry that many hops from the right of X-Forwarded-For, the last one a
+    client cannot forge.
+    """
+    proxies = settings.ADMISSION_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _slot_keys(route, window):
+    return 'admission:inflight:%s:%d' % (route, window), 'admission:inflight:%s:%d' % (route, window - 1)
+
+
+def acquire_slot(route, limit):
+    """
+    Claim one of ``limit`` concurrent slots of a route, counted in the default
+    cache (so across workers only if it is shared). Returns the key to
+    release, or None when the route is at capacity.
+
+    In-flight requests are counted in a key per ADMISSION_WINDOW_SECONDS
+    window, and a request counts against the window it started in and the
+    next. Slots leaked by a worker that died mid-request therefore expire
+    after two windows instead of shrinking the limit for good.
+    """
+    window_seconds = settings.ADMISSION_WINDOW_SECONDS
+    window = int(time.time() // window_seconds)
+    key, previous_key = _slot_keys(route, window)
+    cache.add(key, 0, window_seconds * 3)
+    try:
+        in_flight = cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); admit rather than shed on a cache hiccup
+        return ''
+    in_flight += max(cache.get(previous_key, 0), 0)
+    if in_flight > limit:
+        release_slot(key)
+        return None
+    return key
+
+
+def release_slot(key):
+    if not key:
+        return
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+def take_token(route, client, rate, burst):
+    """
+    Token bucket of ``burst`` tokens refilled at ``rate`` per second, per route
+    and client. Returns 0 when a token was taken, otherwise the seconds until
+    the next one.
+
+    The bucket is read and written without a lock, so simultaneous requests of
+    one client on different workers can overdraw it slightly.
+    """
+    key = 'admission:bucket:%s:%s' % (route, client)
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return math.ceil((1 - tokens) / rate)
+    # Kept until a full bucket would have refilled; after that a missing key means a full bucket
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate) + 1)
+    return 0
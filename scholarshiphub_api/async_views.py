@@ -0,0 +1,121 @@
+"""
+Async versions of the hot read endpoints, served under /api/async/ when the
+project runs on an ASGI server (see scholarshiphub/asgi.py).
+
+DRF's APIView has no async handlers, so these are plain Django views that
+reuse the serializers, filters and paginators of their sync counterparts in
+views.py and return the same JSON. Queries go through the async ORM.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .caching import acached_catalog_response
+from .fast_serializers import ScholarshipValuesSerializer
+from .filters import filter_scholarships, select_scholarship_fields
+from .models import Scholarship, Comment
+from .pagination import apaginate, PagePagination
+from .renderers import FastJSONRenderer
+from .search import search_scholarships
+from .serializers import (ScholarshipSerializer, ScholarshipFilterSerializer, ScholarshipFieldsetSerializer,
+                          ScholarshipListSerializer, CommentThreadSerializer, UserSerializer)
+from .utils import aload_reply_threads, build_comment_tree
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+class AsyncAPIView(View):
+    """ Wraps the request so DRF paginators and authenticators can be used """
+    authentication_classes = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            # e.g. NotFound for an invalid cursor, answered as DRF's views would
+            return json_response({"detail": exc.detail}, status=exc.status_code)
+
+
+class AsyncGetScholarship(AsyncAPIView):
+    """ Async GetScholarship """
+    @acached_catalog_response
+    async def get(self, request):
+        filters = ScholarshipFilterSerializer(data=request.query_params.dict())
+        if not filters.is_valid():
+            return json_response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+        scholarships, ordering = filter_scholarships(Scholarship.objects.all(), filters.validated_data)
+        fieldset = filters.validated_data['fieldset']
+        rows = ScholarshipValuesSerializer.values(scholarships, fieldset, ordering)
+        paginator = await apaginate(request, rows, ordering=ordering)
+        if paginator is not None:
+            return json_response(paginator.get_paginated_data(ScholarshipValuesSerializer(paginator.page, fields=fieldset).data))
+        if ordering is not None:
+            rows = rows.order_by(*ordering)
+        return json_response(ScholarshipValuesSerializer([row async for row in rows], fields=fieldset).data)
+
+
+class AsyncGetAScholarship(AsyncAPIView):
+    """ Async GetAScholarship """
+    @acached_catalog_response
+    async def get(self, request, id):
+        try:
+            scholarship = await Scholarship.objects.aget(id=id)
+        except Scholarship.DoesNotExist:
+            return json_response({"error": "Scholarship not found."}, status=status.HTTP_404_NOT_FOUND)
+        return json_response(ScholarshipSerializer(scholarship).data)
+
+
+class AsyncScholarshipSearchView(AsyncAPIView):
+    """ Async ScholarshipSearchView """
+    async def get(self, request):
+        fields = ScholarshipFieldsetSerializer(data=request.query_params.dict())
+        if not fields.is_valid():
+            return json_response(fields.errors, status=status.HTTP_400_BAD_REQUEST)
+        fieldset = fields.validated_data['fieldset']
+        query = request.query_params.get('search', None)
+        if query:
+            # Picking the search backend may introspect the database on first use
+            queryset = await sync_to_async(search_scholarships)(Scholarship.objects.all(), query)
+        else:
+            queryset = Scholarship.objects.order_by('id')
+        queryset = select_scholarship_fields(queryset, fieldset)
+
+        paginator = await apaginate(request, queryset, pagination_class=PagePagination)
+        if paginator is not None:
+            return json_response(paginator.get_paginated_data(ScholarshipListSerializer(paginator.page, many=True, fields=fieldset).data))
+        return json_response(ScholarshipListSerializer([s async for s in queryset], many=True, fields=fieldset).data)
+
+
+class AsyncGetComments(AsyncAPIView):
+    """ Async GetComments; replies are loaded in bulk rather than per comment """
+    async def get(self, request):
+        ordering = ('created_at', 'id')
+        comments = Comment.objects.select_related('user').order_by(*ordering)
+        paginator = await apaginate(request, comments, ordering=ordering)
+        if paginator is not None:
+            page = await aload_reply_threads(paginator.page, comments)
+            return json_response(paginator.get_paginated_data(CommentThreadSerializer(page, many=True).data))
+        # Every reply is in the full list too, so the threads can be built from it
+        comments = [c async for c in comments]
+        build_comment_tree(comments)
+        return json_response(CommentThreadSerializer(comments, many=True).data)
+
+
+class AsyncUserDetailView(AsyncAPIView):
+    """ Async UserDetailView """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    async def get(self, request):
+        # The authenticators are sync (token lookups), so resolve the user in a thread
+        try:
+            user = await sync_to_async(lambda: request.user)()
+        except exceptions.AuthenticationFailed as exc:
+            return json_response({"detail": exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_authenticated:
+            return json_response({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+        return json_response(UserSerializer(user).data)
@@ -0,0 +1,238 @@
+import copy
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from .models import TokenRevocation, UsedRefreshToken, User
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+# User fields embedded in access tokens, so request.user can be built without a query
+USER_CLAIM_FIELDS = ('email', 'username', 'first_name', 'last_name', 'is_verified', 'is_staff', 'is_superuser', 'is_active')
+# Claims that grant access: changing one revokes the user's tokens (signals.py), not waiting for them to expire
+PRIVILEGE_CLAIM_FIELDS = ('is_staff', 'is_superuser', 'is_active')
+
+
+def _signing_key():
+    return settings.JWT_SECRET or settings.SECRET_KEY
+
+
+def _revocation_key(user_id):
+    return 'jwt:revoked-before:%s' % user_id
+
+
+def create_token(user, token_type):
+    now = time.time()
+    lifetime = settings.JWT_ACCESS_TOKEN_LIFETIME if token_type == ACCESS else settings.JWT_REFRESH_TOKEN_LIFETIME
+    claims = {
+        'sub': str(user.pk),
+        'type': token_type,
+        'iat': now,
+        'exp': int(now + lifetime.total_seconds()),
+        'jti': uuid.uuid4().hex,
+    }
+    if token_type == ACCESS:
+        claims['user'] = {field: getattr(user, field) for field in USER_CLAIM_FIELDS}
+    return jwt.encode(claims, _signing_key(), algorithm=settings.JWT_ALGORITHM)
+
+
+def issue_tokens(user):
+    """ Return a fresh access/refresh token pair for the user """
+    return {'access': create_token(user, ACCESS), 'refresh': create_token(user, REFRESH)}
+
+
+def decode_token(token, token_type):
+    """ Verify signature, expiry, type and revocation; return the claims """
+    try:
+        claims = jwt.decode(token, _signing_key(), algorithms=[settings.JWT_ALGORITHM], options={'require': ['exp', 'iat', 'sub', 'jti']})
+    except jwt.ExpiredSignatureError:
+        raise exceptions.AuthenticationFailed('Token has expired.')
+    except jwt.InvalidTokenError:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    if claims.get('type') != token_type:
+        raise exceptions.AuthenticationFailed('Invalid token type.')
+    # Refreshes are rare and their tokens long-lived, so they always read the table
+    if claims['iat'] <= revoked_before(claims['sub'], cached=token_type == ACCESS):
+        raise exceptions.AuthenticationFailed('Token has been revoked.')
+    return claims
+
+
+def revoked_before(user_id, cached=True):
+    """
+    The user's revocation time from TokenRevocation, 0 if none. The cache
+    only saves the query: with a per-process cache, other workers see a
+    revocation after at most JWT_REVOCATION_CACHE_TTL seconds.
+    """
+    key = _revocation_key(user_id)
+    value = cache.get(key) if cached else None
+    if value is None:
+        value = TokenRevocation.objects.filter(user_id=user_id).values_list('revoked_before', flat=True).first() or 0
+        cache.set(key, value, settings.JWT_REVOCATION_CACHE_TTL)
+    return value
+
+
+def revoke_user_tokens(user_id):
+    """
+    Reject every token issued to the user up to now. Revocations older than
+    the longest token lifetime no longer reject anything and are pruned.
+    """
+    now = time.time()
+    TokenRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_before': now})
+    TokenRevocation.objects.filter(revoked_before__lt=now - settings.JWT_REFRESH_TOKEN_LIFETIME.total_seconds()).delete()
+    cache.set(_revocation_key(user_id), now, settings.JWT_REVOCATION_CACHE_TTL)
+
+
+def spend_refresh_token(claims):
+    """
+    Record that a refresh token was exchanged, so each one works once. A token
+    presented again was stolen or replayed: every token of the user is revoked.
+    """
+    expires_at = datetime.datetime.fromtimestamp(claims['exp'], tz=datetime.timezone.utc)
+    try:
+        with transaction.atomic():
+            UsedRefreshToken.objects.create(jti=claims['jti'], user_id=claims['sub'], expires_at=expires_at)
+    except IntegrityError:
+        revoke_user_tokens(claims['sub'])
+        raise exceptions.AuthenticationFailed('Token has been revoked.')
+    UsedRefreshToken.objects.filter(expires_at__lt=timezone.now()).delete()
+
+
+def user_from_claims(claims):
+    """
+    Build the user from the access token claims. Fields not carried in the token
+    (e.g. password) are deferred and loaded on first access; views that save the
+    user should re-fetch it so stale claims are not written back.
+    """
+    loaded = dict(claims['user'], id=int(claims['sub']))
+    # from_db() expects values in concrete field order
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in loaded]
+    return User.from_db(router.db_for_read(User), field_names, [loaded[name] for name in field_names])
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    Stateless authentication with ``Authorization: Bearer <access token>``.
+    Signature and claims are enough to authorize the request; the only lookup
+    is the user's revocation time, usually answered by the cache.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        claims = decode_token(token, ACCESS)
+        user = user_from_claims(claims)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class TokenUserCache:
+    """
+    Bounded LRU of ``token key -> (user, token, generation)`` with a TTL, shared
+    by the threads of one worker process.
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, user, token, generation):
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, token, generation)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[1].pk]
+
+
+token_user_cache = TokenUserCache(settings.TOKEN_CACHE_MAX_ENTRIES, settings.TOKEN_CACHE_TTL)
+
+
+def _generation_key(user_id):
+    return 'authtoken:generation:%s' % user_id
+
+
+def invalidate_token_user(user_id):
+    """
+    Drop cached token lookups for the user in this process, and bump the user's
+    generation in the shared cache so every other worker drops them on next use.
+    """
+    token_user_cache.discard_user(user_id)
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication that keeps resolved
+    tokens in a per-process LRU. Each hit is validated against the user's
+    generation counter in the shared cache, so invalidations published by any
+    worker take effect everywhere without a database query.
+    """
+    def authenticate_credentials(self, key):
+        entry = token_user_cache.get(key)
+        if entry is not None:
+            user, token, cached_generation = entry
+            if cache.get(_generation_key(user.pk), 0) == cached_generation:
+                return (copy.copy(user), token)
+
+        user, token = super().authenticate_credentials(key)
+        # An invalidation landing between the query and this read is only bounded by the TTL
+        token_user_cache.set(key, copy.copy(user), token, cache.get(_generation_key(user.pk), 0))
+        return (user, token)
@@ -0,0 +1,90 @@
+import time
+from django.db import connection, transaction
+
+WORDS = (
+    "engineering medicine law business computer science data mathematics physics chemistry biology "
+    "economics finance nursing agriculture architecture education music arts history public health "
+    "scholarship fellowship tuition stipend masters doctoral undergraduate research international "
+    "women leaders africa europe asia graduate award grant funded fully partial excellence merit"
+).split()
+FIELDS_OF_STUDY = [
+    "Engineering", "Medicine", "Law", "Business", "Computer Science", "Data Science",
+    "Mathematics", "Public Health", "Agriculture", "Education", "Economics", "Arts",
+]
+SYLLABLES = "ka lo mi ne ra su ti vo ze ba de fi gu ho ju".split()
+
+
+class Rollback(Exception):
+    """ Raised to discard the rows a benchmark seeded """
+
+
+def filler_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def sentence(rng, words, topical=0.05):
+    """ Synthetic text: mostly filler words, with a ``topical`` share of real search terms """
+    return ' '.join(
+        rng.choice(WORDS) if rng.random() < topical else filler_word(rng)
+        for _ in range(words)
+    ).capitalize()
+
+
+def percentile(samples, pct):
+    """ Nearest-rank percentile of a list of samples """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """ Latency summary in milliseconds """
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    """ Call ``fn`` ``repeat`` times and return the wall-clock duration of each call """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def count_queries(fn):
+    """
+    Number of queries ``fn`` runs. Uses an execute wrapper rather than
+    CaptureQueriesContext because request_started resets the query log.
+    """
+    executed = []
+
+    def wrapper(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        fn()
+    return len(executed)
+
+
+def run_and_rollback(fn):
+    """ Run ``fn`` inside a transaction that is always rolled back, returning its result """
+    result = None
+    try:
+        with transaction.atomic():
+            result = fn()
+            raise Rollback
+    except Rollback:
+        pass
+    return result
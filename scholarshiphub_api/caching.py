@@ -0,0 +1,159 @@
+import contextlib
+import datetime
+import functools
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from .renderers import FastJSONRenderer
+from .routers import read_from_primary
+
+CATALOG_VERSION_KEY = 'scholarships:catalog:version'
+CATALOG_MODIFIED_KEY = 'scholarships:catalog:modified'
+# Bumped when comments change the counters; only caches of data that shows them depend on it
+CATALOG_ACTIVITY_KEY = 'scholarships:catalog:activity'
+
+
+def _initial_version():
+    # Seeded from the clock so a counter lost to eviction never reuses an old version
+    return int(time.time() * 1000)
+
+
+def _catalog_keys(*keys):
+    """ The values of catalog state ``keys``, recreating any the cache evicted """
+    state = cache.get_many(keys)
+    for key in keys:
+        if state.get(key) is None:
+            initial = int(time.time()) if key == CATALOG_MODIFIED_KEY else _initial_version()
+            cache.add(key, initial, None)
+            state[key] = cache.get(key, initial)
+    return [state[key] for key in keys]
+
+
+def get_catalog_state():
+    """ Return ``(version, last_modified_timestamp)`` of the scholarship catalog """
+    version, modified = _catalog_keys(CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY)
+    return version, modified
+
+
+def get_catalog_activity():
+    """ Version of the comment counters (``comment_count``, ``last_comment_at``) """
+    return _catalog_keys(CATALOG_ACTIVITY_KEY)[0]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+    cache.set(CATALOG_MODIFIED_KEY, int(time.time()), None)
+
+
+def bump_catalog_version():
+    """ Invalidate every cached catalog response """
+    _bump(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_activity():
+    """
+    Invalidate the cached catalog responses, which show the comment counters,
+    but not caches keyed on the catalog version alone such as facet counts
+    """
+    _bump(CATALOG_ACTIVITY_KEY)
+
+
+def _catalog_validators(request):
+    """ ``(etag, last_modified, cache_key, changed_at)`` of a catalog read at the current catalog version """
+    catalog, activity, changed_at = _catalog_keys(CATALOG_VERSION_KEY, CATALOG_ACTIVITY_KEY, CATALOG_MODIFIED_KEY)
+    version = '%s.%s' % (catalog, activity)
+    modified = changed_at
+    # Responses carry date-dependent fields (``expired``), so they also change at midnight
+    today = timezone.localdate()
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    modified = max(modified, int(midnight.timestamp()))
+    url_hash = hashlib.md5(('%s %s' % (today, request.build_absolute_uri())).encode()).hexdigest()
+    etag = '"%s-%s"' % (version, url_hash[:16])
+    return etag, modified, 'scholarships:response:%s:%s' % (version, url_hash), changed_at
+
+
+def _recently_changed(changed_at):
+    """
+    A replica may not have the change that bumped the version yet, and its
+    answer would be cached for the whole version, so read from the primary
+    """
+    return time.time() - changed_at < settings.REPLICA_PIN_SECONDS
+
+
+def _cached_response(body, etag, modified):
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    # The browsable API is served at the same URL
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _negotiated_plain_json(request):
+    """ Whether content negotiation picked compact JSON, the only representation that is cached """
+    renderer = request.accepted_renderer
+    return isinstance(renderer, JSONRenderer) and not renderer.get_indent(request.accepted_media_type, {})
+
+
+def cached_catalog_response(view_method):
+    """
+    Cache the rendered JSON of a catalog read under the current catalog version.
+
+    Conditional requests are answered from the version counter alone, so a
+    matching ``If-None-Match`` returns 304 without touching the database.
+    Only 200 responses are cached, and only JSON ones: other renderers
+    (the browsable API, ``?format=``, indented JSON) get the view's response.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not _negotiated_plain_json(request):
+            return view_method(self, request, *args, **kwargs)
+        etag, modified, cache_key, changed_at = _catalog_validators(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+        if not_modified is not None:
+            return not_modified
+
+        body = cache.get(cache_key)
+        if body is None:
+            with read_from_primary() if _recently_changed(changed_at) else contextlib.nullcontext():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = FastJSONRenderer().render(response.data)
+            cache.set(cache_key, body, settings.CATALOG_CACHE_TIMEOUT)
+        return _cached_response(body, etag, modified)
+    return wrapper
+
+
+def acached_catalog_response(view_method):
+    """
+    ``cached_catalog_response`` for async views, which return an already
+    rendered JSON HttpResponse.
+    """
+    @functools.wraps(view_method)
+    async def wrapper(self, request, *args, **kwargs):
+        etag, modified, cache_key, changed_at = await sync_to_async(_catalog_validators)(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+        if not_modified is not None:
+            return not_modified
+
+        body = await cache.aget(cache_key)
+        if body is None:
+            with read_from_primary() if _recently_changed(changed_at) else contextlib.nullcontext():
+                response = await view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = response.content
+            await cache.aset(cache_key, body, settings.CATALOG_CACHE_TIMEOUT)
+        return _cached_response(body, etag, modified)
+    return wrapper
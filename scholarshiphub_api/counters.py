@@ -0,0 +1,102 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .caching import bump_catalog_activity
+from .models import Scholarship, Comment
+
+
+def comment_added(comment):
+    """ Count a new comment on its scholarship """
+    created_at = Value(comment.created_at)
+    Scholarship.objects.filter(pk=comment.scholarship_id_id).update(
+        comment_count=F('comment_count') + 1,
+        # Another comment committed concurrently may be newer than this one
+        last_comment_at=Greatest(Coalesce('last_comment_at', created_at), created_at),
+    )
+    transaction.on_commit(bump_catalog_activity)
+
+
+IN_BATCH_SIZE = 500
+
+
+def _batches(ids):
+    # Keeps IN (...) lists under the bound-parameter limits of SQLite
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        yield ids[start:start + IN_BATCH_SIZE]
+
+
+def comment_subtree_ids(ids):
+    """ The given comment ids plus all of their replies, one query per level of nesting """
+    found = list(ids)
+    level = found
+    while level:
+        level = [
+            reply_id for batch in _batches(level)
+            for reply_id in Comment.objects.filter(parent_comment_id__in=batch).values_list('id', flat=True)
+        ]
+        found.extend(level)
+    return found
+
+
+def delete_comments(comments):
+    """
+    Delete the comments (with the replies the ``parent_comment`` cascade
+    removes) and take all of them off their scholarships' counters, in one
+    transaction. Returns the number of comments deleted.
+    """
+    with transaction.atomic():
+        ids = comment_subtree_ids(comments.values_list('id', flat=True))
+        per_scholarship = Counter()
+        for batch in _batches(ids):
+            per_scholarship.update(dict(
+                Comment.objects.filter(id__in=batch).order_by().values_list('scholarship_id').annotate(n=Count('id'))
+            ))
+        comments.delete()
+        comments_removed(per_scholarship)
+    return len(ids)
+
+
+def comments_removed(per_scholarship):
+    """ Subtract ``{scholarship_id: removed}`` and recompute the last activity from what is left """
+    latest = Comment.objects.filter(scholarship_id=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    for scholarship_id, removed in per_scholarship.items():
+        Scholarship.objects.filter(pk=scholarship_id).update(
+            comment_count=Greatest(F('comment_count') - removed, 0),
+            last_comment_at=Subquery(latest),
+        )
+    if per_scholarship:
+        transaction.on_commit(bump_catalog_activity)
+
+
+def reconcile_comment_counters(batch_size=1000):
+    """
+    Recompute ``comment_count`` and ``last_comment_at`` from the comments,
+    one batch of scholarships per transaction. Returns ``(scanned, updated)``.
+    """
+    scanned = updated = 0
+    last_id = 0
+    while True:
+        batch = list(Scholarship.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'comment_count', 'last_comment_at')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        with transaction.atomic():
+            actual = {
+                row['scholarship_id']: (row['count'], row['last'])
+                for row in Comment.objects.filter(scholarship_id__in=[s.id for s in batch])
+                .order_by().values('scholarship_id').annotate(count=Count('id'), last=Max('created_at'))
+            }
+            changed = []
+            for scholarship in batch:
+                count, last = actual.get(scholarship.id, (0, None))
+                if (scholarship.comment_count, scholarship.last_comment_at) != (count, last):
+                    scholarship.comment_count, scholarship.last_comment_at = count, last
+                    changed.append(scholarship)
+            Scholarship.objects.bulk_update(changed, ['comment_count', 'last_comment_at'])
+        scanned += len(batch)
+        updated += len(changed)
+    if updated:
+        bump_catalog_activity()
+    return scanned, updated
@@ -0,0 +1,54 @@
+import calendar
+import datetime
+import re
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9,
+    'oct': 10, 'nov': 11, 'dec': 12,
+}
+_MONTH = r'(?P<month>%s)\.?' % '|'.join(sorted(MONTHS, key=len, reverse=True))
+_DAY = r'(?P<day>\d{1,2})(?:st|nd|rd|th)?'
+_YEAR = r'(?P<year>\d{4})'
+
+# Tried in this order; the match that starts earliest in the text wins
+DEADLINE_PATTERNS = [
+    re.compile(r'\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b'),
+    re.compile(r'\b(?P<first>\d{1,2})[/.-](?P<second>\d{1,2})[/.-](?P<year>\d{4})\b'),
+    re.compile(r'\b%s\s+(?:of\s+)?%s,?\s+%s\b' % (_DAY, _MONTH, _YEAR), re.IGNORECASE),
+    re.compile(r'\b%s\s+%s,?\s+%s\b' % (_MONTH, _DAY, _YEAR), re.IGNORECASE),
+    re.compile(r'\b%s,?\s+%s\b' % (_MONTH, _YEAR), re.IGNORECASE),
+]
+
+
+def _to_date(match):
+    parts = match.groupdict()
+    year = int(parts['year'])
+    if 'first' in parts:
+        # Numeric dates are read day-first unless that is impossible
+        first, second = int(parts['first']), int(parts['second'])
+        day, month = (second, first) if second > 12 else (first, second)
+    else:
+        month = int(parts['month']) if parts['month'].isdigit() else MONTHS[parts['month'].lower()]
+        # "June 2025" means the end of June
+        day = int(parts['day']) if parts.get('day') else calendar.monthrange(year, month)[1]
+    return datetime.date(year, month, day)
+
+
+def parse_deadline(text):
+    """
+    Best-effort parse of a free-text deadline such as "30 June 2025",
+    "June 30th, 2025", "2025-06-30", "30/06/2025" or "June 2025". Returns the
+    first date found, or None when the text has no recognisable date
+    ("Rolling", "Varies by university", ...).
+    """
+    if not text:
+        return None
+    matches = [match for match in (pattern.search(text) for pattern in DEADLINE_PATTERNS) if match]
+    for match in sorted(matches, key=lambda m: m.start()):
+        try:
+            return _to_date(match)
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,133 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from rest_framework.negotiation import BaseContentNegotiation
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileDownloadNegotiation(BaseContentNegotiation):
+    """ Downloads are not rendered, so never answer 406 to e.g. ``Accept: application/pdf`` """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` of a single byte range, or None when
+    the header is absent, malformed or asks for several ranges (the whole file
+    is sent then). Raises RangeNotSatisfiable for ranges past the end of file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+class RangedFile:
+    """
+    Read at most ``length`` bytes of ``file`` starting at ``start``. fileno()
+    is kept so a WSGI server's file_wrapper (e.g. gunicorn) can still
+    sendfile() the range straight from the page cache.
+    """
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class DownloadResponse(FileResponse):
+    # Only used when the server cannot sendfile(); bigger reads mean fewer syscalls
+    block_size = 64 * 1024
+
+
+def serve_file(request, field):
+    """
+    Respond with the file behind a FileField, honouring conditional requests,
+    ``Range`` and ``If-Range``. With ``SENDFILE_BACKEND`` set, the proxy is told
+    to send the file (and handle ranges) itself and no bytes pass through Python.
+    """
+    path = field.path
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = '"%x-%x"' % (stat.st_mtime_ns, size)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    filename = os.path.basename(field.name)
+    backend = settings.SENDFILE_BACKEND
+    if backend:
+        content_type, _ = mimetypes.guess_type(filename)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.SENDFILE_URL_PREFIX + field.name)
+        else:
+            response['X-Sendfile'] = path
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if if_range is None or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            try:
+                byte_range = parse_range(request.headers.get('Range'), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+
+        file = open(path, 'rb')
+        if byte_range is None:
+            response = DownloadResponse(file, as_attachment=True, filename=filename)
+        else:
+            start, end = byte_range
+            response = DownloadResponse(RangedFile(file, start, end - start + 1), as_attachment=True, filename=filename, status=206)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private'
+    return response
@@ -0,0 +1,83 @@
+import csv
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .models import User, Scholarship, Comment, StatementOfPurpose
+from .renderers import CSVRenderer, NDJSONRenderer
+
+EXPORT_FORMATS = (NDJSONRenderer.format, CSVRenderer.format)
+
+# resource -> (queryset factory, [(column, lookup), ...])
+EXPORTS = {
+    'users': (lambda: User.objects.order_by('id'), [
+        ('id', 'id'), ('first_name', 'first_name'), ('last_name', 'last_name'), ('email', 'email'),
+        ('username', 'username'), ('is_verified', 'is_verified'), ('is_staff', 'is_staff'), ('date_joined', 'date_joined'),
+    ]),
+    'scholarships': (lambda: Scholarship.objects.order_by('id'), [
+        ('id', 'id'), ('title', 'title'), ('description', 'description'), ('eligibility', 'eligibility'),
+        ('benefit', 'benefit'), ('field_of_study', 'field_of_study'), ('deadline', 'deadline'), ('deadline_date', 'deadline_date'), ('link', 'link'),
+        ('image', 'image'), ('comment_count', 'comment_count'), ('last_comment_at', 'last_comment_at'),
+    ]),
+    'comments': (lambda: Comment.objects.order_by('id'), [
+        ('id', 'id'), ('scholarship_id', 'scholarship_id_id'), ('user_id', 'user_id'), ('username', 'user__username'),
+        ('parent_comment', 'parent_comment_id'), ('content', 'content'), ('created_at', 'created_at'),
+    ]),
+    'sops': (lambda: StatementOfPurpose.objects.order_by('id'), [
+        ('id', 'id'), ('user_id', 'user_id'), ('email', 'user__email'), ('title', 'title'), ('sop_file', 'sop_file'),
+        ('submission_date', 'submission_date'), ('is_reviewed', 'is_reviewed'), ('reviewed_sop', 'reviewed_sop'),
+    ]),
+}
+
+
+class _Echo:
+    """ File-like object whose write() returns the value, so csv.writer can feed a generator """
+    def write(self, value):
+        return value
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _batched(lines, size):
+    """ Join lines into larger chunks so the server is not handed one tiny write per row """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_export(queryset, fields, export_format, filename):
+    """
+    Stream ``queryset`` as NDJSON or CSV. Rows are read with a chunked
+    ``values_list().iterator()`` (a server-side cursor on Postgres), so memory
+    use does not grow with the size of the table.
+    """
+    columns = [column for column, lookup in fields]
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    rows = queryset.values_list(*[lookup for column, lookup in fields]).iterator(chunk_size=chunk_size)
+    if export_format == CSVRenderer.format:
+        lines, content_type = _csv_lines(columns, rows), CSVRenderer.media_type
+    else:
+        lines, content_type = _ndjson_lines(columns, rows), NDJSONRenderer.media_type
+    response = StreamingHttpResponse(_batched(lines, chunk_size), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (filename, export_format)
+    return response
+
+
+def export_resource(resource, export_format):
+    queryset_factory, fields = EXPORTS[resource]
+    return stream_export(queryset_factory(), fields, export_format, resource)
@@ -0,0 +1,189 @@
+"""
+Read-only serializers for large list responses, built on ``.values()`` rows.
+
+A ModelSerializer instantiates model objects and then runs every field's
+``to_representation`` for every object. These build each dict straight from
+the row with accessors prepared once per response, and render the same JSON
+as the serializers named in their docstrings (tests.py checks that they agree).
+They are used like a serializer: ``Serializer(rows, many=True).data``, where
+the rows come from ``Serializer.values(queryset)``.
+"""
+import datetime
+from operator import itemgetter
+from django.conf import settings
+from django.db.models.functions import Substr
+from django.utils import timezone
+from .filters import SCHOLARSHIP_FIELD_COLUMNS
+from .images import image_srcset
+from .models import Scholarship, StatementOfPurpose
+from .serializers import ScholarshipListSerializer, UserSerializer, description_snippet
+
+
+def media_url(model, field_name):
+    """ Row value of a FileField/ImageField -> its URL, as DRF renders it without a request """
+    url = model._meta.get_field(field_name).storage.url
+    return lambda name: url(name) if name else None
+
+
+def iso_date(value):
+    return value.isoformat() if value else None
+
+
+def iso_datetime():
+    """ Datetime -> string, in the current time zone with UTC written as 'Z' like DRF """
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def convert(value):
+        if not value:
+            return None
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class ValuesSerializer:
+    """
+    Base class. ``fields`` lists the output fields in order and
+    ``field_columns`` the columns of those not read from a column of the same
+    name; ``get_accessors()`` returns ``{field: function(row)}`` for fields
+    that are not passed through unchanged.
+    """
+    fields = []
+    field_columns = {}
+
+    def __init__(self, rows, many=True, fields=None):
+        self.rows = rows
+        if fields is not None:
+            self.fields = [name for name in self.fields if name in fields]
+
+    @classmethod
+    def columns(cls, fields=None, ordering=None):
+        columns = {'id'}
+        for name in cls.fields if fields is None else fields:
+            columns.update(cls.field_columns.get(name, (name,)))
+        # Keyset pagination reads the position of the last row from it
+        columns.update(order.lstrip('-') for order in ordering or ())
+        return columns
+
+    @classmethod
+    def values(cls, queryset, fields=None, ordering=None):
+        return queryset.values(*cls.columns(fields, ordering))
+
+    def get_accessors(self):
+        return {}
+
+    def represent(self, rows):
+        accessors = self.get_accessors()
+        getters = [(name, accessors.get(name) or itemgetter(name)) for name in self.fields]
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+    @property
+    def data(self):
+        return self.represent(self.rows)
+
+
+class ScholarshipValuesSerializer(ValuesSerializer):
+    """ ScholarshipListSerializer (and so ScholarshipSerializer, with its fields) """
+    fields = ScholarshipListSerializer.Meta.fields
+    field_columns = dict(SCHOLARSHIP_FIELD_COLUMNS, description_snippet=('description_head',))
+
+    @classmethod
+    def values(cls, queryset, fields=None, ordering=None):
+        columns = cls.columns(fields, ordering)
+        if 'description_head' in columns:
+            if 'description' in columns:
+                columns.remove('description_head')
+            elif 'description_head' not in queryset.query.annotations:
+                queryset = queryset.annotate(description_head=Substr('description', 1, settings.SCHOLARSHIP_SNIPPET_LENGTH + 1))
+        return queryset.values(*columns)
+
+    def get_accessors(self):
+        today = timezone.localdate()
+        image_url = media_url(Scholarship, 'image')
+        return {
+            'deadline_date': lambda row: iso_date(row['deadline_date']),
+            'expired': lambda row: None if row['deadline_date'] is None else row['deadline_date'] < today,
+            'image': lambda row: image_url(row['image']),
+            'image_srcset': lambda row: image_srcset(row['image'], row['image_variants']),
+            'last_comment_at': lambda row, convert=iso_datetime(): convert(row['last_comment_at']),
+            'description_snippet': lambda row: description_snippet(row.get('description_head', row.get('description'))),
+        }
+
+
+class CommentValuesSerializer(ValuesSerializer):
+    """
+    CommentSerializer, replies included. Replies are taken from the rows
+    themselves when they hold every comment; for a page, pass the queryset
+    as ``replies`` and they are read one level of nesting per query.
+    """
+    fields = ['id', 'username', 'content', 'parent_comment', 'replies', 'created_at', 'scholarship_id']
+    field_columns = {
+        'username': ('user__username',),
+        'parent_comment': ('parent_comment_id',),
+        'scholarship_id': ('scholarship_id_id',),
+        'replies': ('parent_comment_id',),
+    }
+
+    def __init__(self, rows, many=True, fields=None, replies=None):
+        super().__init__(rows, many, fields)
+        self.replies = replies
+
+    def get_accessors(self):
+        return {
+            'username': itemgetter('user__username'),
+            'parent_comment': itemgetter('parent_comment_id'),
+            'scholarship_id': itemgetter('scholarship_id_id'),
+            'created_at': lambda row, convert=iso_datetime(): convert(row['created_at']),
+            # Filled in by data once every comment has its dict
+            'replies': lambda row: [],
+        }
+
+    def _reply_rows(self, rows):
+        """ Rows of every reply below ``rows`` not among them, one query per level """
+        seen = {row['id'] for row in rows}
+        found = []
+        level = rows
+        while level:
+            parents = [row['id'] for row in level]
+            level = [row for row in self.replies.filter(parent_comment_id__in=parents).order_by('created_at', 'id')
+                     if row['id'] not in seen]
+            seen.update(row['id'] for row in level)
+            found.extend(level)
+        return found
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        if 'replies' not in self.fields:
+            return self.represent(rows)
+        everything = rows if self.replies is None else rows + self._reply_rows(rows)
+        comments = self.represent(everything)
+        by_id = {row['id']: comment for row, comment in zip(everything, comments)}
+        for row, comment in sorted(zip(everything, comments), key=lambda item: (item[0]['created_at'], item[0]['id'])):
+            parent = by_id.get(row['parent_comment_id'])
+            if parent is not None:
+                parent['replies'].append(comment)
+        return comments[:len(rows)]
+
+
+class UserValuesSerializer(ValuesSerializer):
+    """ UserSerializer """
+    fields = [name for name in UserSerializer.Meta.fields if name != 'password']
+
+
+class StatementOfPurposeValuesSerializer(ValuesSerializer):
+    """ StatementOfPurposeSerializer """
+    fields = ['title', 'sop_file', 'submission_date', 'is_reviewed', 'reviewed_sop']
+
+    def get_accessors(self):
+        sop_file_url = media_url(StatementOfPurpose, 'sop_file')
+        reviewed_sop_url = media_url(StatementOfPurpose, 'reviewed_sop')
+        return {
+            'sop_file': lambda row: sop_file_url(row['sop_file']),
+            'reviewed_sop': lambda row: reviewed_sop_url(row['reviewed_sop']),
+            'submission_date': lambda row, convert=iso_datetime(): convert(row['submission_date']),
+        }
@@ -0,0 +1,159 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+from django.utils import timezone
+from .caching import get_catalog_activity, get_catalog_state
+from .models import Scholarship
+from .search import search_scholarships
+
+# ?ordering= value -> order_by() arguments. The id tie-breaker keeps keyset pages stable.
+SCHOLARSHIP_ORDERINGS = {
+    'id': ('id',),
+    'deadline_date': ('deadline_date', 'id'),
+    '-deadline_date': ('-deadline_date', '-id'),
+    '-comment_count': ('-comment_count', '-id'),
+    '-last_comment_at': ('-last_comment_at', '-id'),
+}
+
+
+# Columns read by ScholarshipListSerializer fields not named after one
+SCHOLARSHIP_FIELD_COLUMNS = {
+    'expired': ('deadline_date',),
+    'image_srcset': ('image', 'image_variants'),
+    'description_snippet': (),
+}
+
+
+def select_scholarship_fields(queryset, fieldset, ordering=None):
+    """
+    Load only the columns a validated ScholarshipFieldsetSerializer
+    ``fieldset`` renders, plus those of the keyset ``ordering``. A
+    ``description_snippet`` reads the head of the description, not all of it.
+    """
+    columns = {'id'}
+    for name in fieldset:
+        columns.update(SCHOLARSHIP_FIELD_COLUMNS.get(name, (name,)))
+    columns.update(order.lstrip('-') for order in ordering or ())
+    queryset = queryset.only(*columns)
+    if 'description_snippet' in fieldset and 'description' not in columns:
+        queryset = queryset.annotate(description_head=Substr('description', 1, settings.SCHOLARSHIP_SNIPPET_LENGTH + 1))
+    return queryset
+
+
+def _orders_by_deadline(filters):
+    ordering = SCHOLARSHIP_ORDERINGS.get(filters.get('ordering'))
+    return ordering is not None and ordering[0].lstrip('-') == 'deadline_date'
+
+
+def _base_filters(queryset, filters):
+    """ Filters that are not facets: free text, ``expired`` and activity ordering """
+    if filters.get('ordering') == '-last_comment_at':
+        # Ordering by activity lists the scholarships that have comments
+        queryset = queryset.filter(last_comment_at__isnull=False)
+    if filters.get('q'):
+        queryset = search_scholarships(queryset, filters['q'])
+    if 'expired' in filters:
+        today = timezone.localdate()
+        if filters['expired']:
+            queryset = queryset.filter(deadline_date__lt=today)
+        else:
+            # Scholarships without a parseable deadline are treated as open
+            queryset = queryset.filter(Q(deadline_date__gte=today) | Q(deadline_date__isnull=True))
+    return queryset
+
+
+def filter_scholarships(queryset, filters):
+    """
+    Apply validated ScholarshipFilterSerializer data. Returns the filtered
+    queryset and the ordering to use, or None to keep the default order
+    (search rank when ``q`` is given).
+
+    Deadline filters are ranges on ``deadline_date``, the leading column of
+    ``scholarship_deadline_idx``; ``field_of_study`` plus a deadline range is
+    served by ``scholarship_field_deadline_idx``.
+    """
+    queryset = _base_filters(queryset, filters)
+    if filters.get('field_of_study'):
+        queryset = queryset.filter(field_of_study__in=filters['field_of_study'])
+    if 'deadline_after' in filters:
+        queryset = queryset.filter(deadline_date__gte=filters['deadline_after'])
+    if 'deadline_before' in filters:
+        queryset = queryset.filter(deadline_date__lte=filters['deadline_before'])
+    if _orders_by_deadline(filters):
+        queryset = queryset.filter(deadline_date__isnull=False)
+    return queryset, SCHOLARSHIP_ORDERINGS.get(filters.get('ordering'))
+
+
+def _facet_cache_key(filters):
+    signature = {key: filters[key] for key in ('q', 'expired', 'deadline_after', 'deadline_before', 'ordering') if key in filters}
+    signature['field_of_study'] = sorted(filters.get('field_of_study') or [])
+    if 'expired' in filters:
+        signature['today'] = timezone.localdate()
+    if filters.get('ordering') == '-last_comment_at':
+        # Only scholarships with comments are counted then
+        signature['activity'] = get_catalog_activity()
+    digest = hashlib.md5(json.dumps(signature, sort_keys=True, default=str).encode()).hexdigest()
+    return 'scholarships:facets:%s:%s' % (get_catalog_state()[0], digest)
+
+
+def scholarship_facets(filters):
+    """
+    Count matches per ``field_of_study`` and per deadline month, plus the total.
+
+    Each facet ignores its own filter, so a client can offer the other values
+    of a facet it already narrowed on, yet both come from one
+    ``GROUP BY field_of_study, deadline_date`` pass over the rows matching
+    the remaining filters; the facet filters are then applied to the groups.
+    Results are cached per filter signature under the catalog version, which
+    every Scholarship write bumps. New comments do not change them unless
+    ordering by activity.
+    """
+    cache_key = _facet_cache_key(filters)
+    facets = cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    fields = set(filters.get('field_of_study') or [])
+    after = filters.get('deadline_after')
+    before = filters.get('deadline_before')
+    needs_date = after is not None or before is not None or _orders_by_deadline(filters)
+
+    groups = (
+        _base_filters(Scholarship.objects.all(), filters)
+        .order_by()
+        .values_list('field_of_study', 'deadline_date')
+        .annotate(count=Count('id'))
+    )
+    by_field, by_month, total = {}, {}, 0
+    for field_of_study, deadline_date, count in groups:
+        field_matches = not fields or field_of_study in fields
+        deadline_matches = not needs_date or (
+            deadline_date is not None
+            and (after is None or deadline_date >= after)
+            and (before is None or deadline_date <= before)
+        )
+        if deadline_matches:
+            by_field[field_of_study] = by_field.get(field_of_study, 0) + count
+        if field_matches:
+            month = deadline_date.strftime('%Y-%m') if deadline_date is not None else None
+            by_month[month] = by_month.get(month, 0) + count
+        if field_matches and deadline_matches:
+            total += count
+
+    facets = {
+        'count': total,
+        'field_of_study': [
+            {'value': value, 'count': count}
+            for value, count in sorted(by_field.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'deadline_month': [
+            {'value': value, 'count': count}
+            # Chronological, scholarships without a parseable deadline last
+            for value, count in sorted(by_month.items(), key=lambda item: (item[0] is None, item[0] or ''))
+        ],
+    }
+    cache.set(cache_key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,153 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from .caching import bump_catalog_version
+from .models import Scholarship
+
+logger = logging.getLogger(__name__)
+
+# format key -> (Pillow format, file extension)
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, width, variant_format):
+    """ Storage name of a variant, e.g. scholarship_images/variants/mastercard_320w.webp """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', '%s_%dw.%s' % (stem, width, VARIANT_FORMATS[variant_format][1]))
+
+
+def variant_names(name):
+    return [
+        (width, variant_format, variant_name(name, width, variant_format))
+        for width in settings.IMAGE_VARIANT_WIDTHS
+        for variant_format in VARIANT_FORMATS
+    ]
+
+
+def image_srcset(name, recorded):
+    """
+    ``{format: "url 320w, url 640w, ..."}`` from the variants recorded in
+    ``Scholarship.image_variants``, or None while there are none for this
+    image (not rendered yet, or rendering failed): clients use ``image``.
+    """
+    if not name or not recorded or recorded.get('source') != name:
+        return None
+    srcset = {}
+    for width, variant_format, path in recorded['variants']:
+        srcset.setdefault(variant_format, []).append('%s %dw' % (default_storage.url(path), width))
+    return {variant_format: ', '.join(entries) for variant_format, entries in srcset.items()}
+
+
+def render_variants(source_path, outputs, quality):
+    """
+    Resize ``source_path`` into each ``(width, format, destination)`` of
+    ``outputs``. Runs in a worker process, so it only touches Pillow and the
+    filesystem. Images narrower than a variant are not upscaled, and a width
+    the image already has in that format is not rendered twice.
+
+    Returns ``(index in outputs, actual width)`` of each variant written.
+    """
+    rendered, seen = [], set()
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        for index, (width, variant_format, destination) in enumerate(outputs):
+            actual = min(width, image.width)
+            if (actual, variant_format) in seen:
+                continue
+            seen.add((actual, variant_format))
+            variant = image.copy()
+            if variant.width > width:
+                variant.thumbnail((width, variant.height * width // variant.width), Image.LANCZOS)
+            pillow_format = VARIANT_FORMATS[variant_format][0]
+            if pillow_format == 'JPEG' and variant.mode not in ('RGB', 'L'):
+                variant = variant.convert('RGB')
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            temporary = destination + '.tmp'
+            variant.save(temporary, pillow_format, quality=quality)
+            os.replace(temporary, destination)
+            rendered.append((index, variant.width))
+    return rendered
+
+
+def variant_job(name, force):
+    """ Arguments for render_variants, or None when there is nothing to do """
+    try:
+        source_path = default_storage.path(name)
+    except NotImplementedError:
+        logger.warning("Image variants need a filesystem storage; skipping %s", name)
+        return None
+    recorded = Scholarship.objects.filter(image=name).values_list('image_variants', flat=True)
+    if not force and all(variants.get('source') == name for variants in recorded):
+        return None
+    outputs = [(width, variant_format, default_storage.path(path)) for width, variant_format, path in variant_names(name)]
+    return (source_path, outputs, settings.IMAGE_VARIANT_QUALITY)
+
+
+def record_variants(name, rendered):
+    """ Store what render_variants wrote for the image on its scholarships, so image_srcset lists them """
+    names = variant_names(name)
+    variants = [[width, names[index][1], names[index][2]] for index, width in rendered]
+    variants.sort(key=lambda variant: (variant[1], variant[0]))
+    Scholarship.objects.filter(image=name).update(image_variants={'source': name, 'variants': variants})
+    # update() sends no post_save, and cached catalog responses hold the old srcset
+    bump_catalog_version()
+
+
+def get_executor():
+    """ Process pool shared by the worker; spawned so it is safe to start from threaded servers """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _recorder(name):
+    def done(future):
+        if future.exception() is not None:
+            logger.error("Image variant generation failed: %s", future.exception())
+            return
+        try:
+            record_variants(name, future.result())
+        finally:
+            # Callbacks run on the pool's management thread, which keeps no connection open
+            connections.close_all()
+    return done
+
+
+def schedule_variants(name, force=False):
+    """
+    Generate the variants of an image off the request path once the current
+    transaction commits, then record them. With IMAGE_VARIANT_WORKERS = 0 they
+    are rendered inline.
+    """
+    def submit():
+        job = variant_job(name, force)
+        if job is None:
+            return
+        if settings.IMAGE_VARIANT_WORKERS:
+            get_executor().submit(render_variants, *job).add_done_callback(_recorder(name))
+            return
+        try:
+            rendered = render_variants(*job)
+        except Exception:
+            logger.exception("Image variant generation failed for %s", name)
+            return
+        record_variants(name, rendered)
+    transaction.on_commit(submit)
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from rest_framework import serializers
+from .caching import bump_catalog_version
+from .dates import parse_deadline
+from .images import schedule_variants
+from .models import Scholarship
+from .serializers import ScholarshipImportSerializer
+
+IMPORT_FIELDS = ['title', 'description', 'eligibility', 'benefit', 'field_of_study', 'deadline', 'link', 'image']
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _csv_rows(fileobj):
+    yield from csv.DictReader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+
+
+def _jsonl_rows(fileobj):
+    for line in io.TextIOWrapper(fileobj, encoding='utf-8-sig'):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield exc
+
+
+def _readers(name):
+    name = name.lower()
+    if name.endswith('.csv'):
+        return _csv_rows
+    if name.endswith(('.jsonl', '.ndjson')):
+        return _jsonl_rows
+    return None
+
+
+class ScholarshipImporter:
+    """
+    Validate scholarship rows with ScholarshipImportSerializer and upsert them
+    on ``title`` with ``bulk_create(update_conflicts=True)``, one transaction
+    per batch. Rows that fail validation are reported and skipped.
+    """
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.imported = 0
+        self.batches = 0
+        self.error_count = 0
+        self.errors = []
+        self._pending = {}
+        # One instance validates every row, so DRF builds the serializer fields only once
+        self._serializer = ScholarshipImportSerializer()
+
+    def run(self, upload):
+        try:
+            self._run(upload)
+        except (zipfile.BadZipFile, UnicodeDecodeError, csv.Error) as exc:
+            raise ImportFormatError(str(exc))
+        finally:
+            if self.imported:
+                # bulk_create does not send post_save, so invalidate the catalog cache here,
+                # also when a malformed row stops the import after some batches committed
+                bump_catalog_version()
+        return self.report()
+
+    def _run(self, upload):
+        name = upload.name or ''
+        if name.lower().endswith('.zip'):
+            with zipfile.ZipFile(upload) as archive:
+                members = [m for m in archive.namelist() if _readers(m) and not m.startswith('__MACOSX/')]
+                if not members:
+                    raise ImportFormatError("The zip archive must contain a .csv or .jsonl file.")
+                with archive.open(members[0]) as fileobj:
+                    self._import(_readers(members[0])(fileobj), archive)
+        else:
+            reader = _readers(name)
+            if reader is None:
+                raise ImportFormatError("Upload a .csv, .jsonl or .zip file.")
+            self._import(reader(upload), None)
+
+    def report(self):
+        return {
+            'imported': self.imported,
+            'batches': self.batches,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+    def _import(self, rows, archive):
+        for number, row in enumerate(rows, start=1):
+            if isinstance(row, Exception) or not isinstance(row, dict):
+                self._error(number, {'non_field_errors': ["Row is not a valid JSON object."]})
+                continue
+            data = {field: row[field] for field in IMPORT_FIELDS if row.get(field) not in (None, '')}
+            if 'image' in data:
+                image = self._image(archive, data['image'])
+                if image is None:
+                    self._error(number, {'image': ["Image '%s' not found in the archive." % data['image']]})
+                    continue
+                data['image'] = image
+            try:
+                validated_data = self._serializer.run_validation(data)
+            except serializers.ValidationError as exc:
+                self._error(number, serializers.as_serializer_error(exc))
+                continue
+            # Later rows with the same title win; one statement cannot upsert a title twice
+            self._pending[validated_data['title']] = Scholarship(deadline_date=parse_deadline(validated_data['deadline']), **validated_data)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+        self._flush()
+
+    def _image(self, archive, name):
+        if archive is None:
+            return None
+        try:
+            content = archive.read(name)
+        except KeyError:
+            return None
+        return SimpleUploadedFile(os.path.basename(name), content)
+
+    def _error(self, row, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def _flush(self):
+        if not self._pending:
+            return
+        objs = list(self._pending.values())
+        self._pending = {}
+        update_fields = [field for field in IMPORT_FIELDS if field not in ('title', 'image')] + ['deadline_date']
+        with transaction.atomic():
+            # Rows without an image must not clear the image of an existing scholarship
+            with_image = [obj for obj in objs if obj.image]
+            without_image = [obj for obj in objs if not obj.image]
+            if with_image:
+                Scholarship.objects.bulk_create(with_image, update_conflicts=True, unique_fields=['title'], update_fields=update_fields + ['image'])
+            if without_image:
+                Scholarship.objects.bulk_create(without_image, update_conflicts=True, unique_fields=['title'], update_fields=update_fields)
+            for obj in with_image:
+                schedule_variants(obj.image.name)
+        self.imported += len(objs)
+        self.batches += 1
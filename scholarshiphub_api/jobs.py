@@ -0,0 +1,135 @@
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """
+    Register a handler for jobs of ``kind``. Handlers receive a list of claimed
+    jobs of that kind and return a ``{job_id: exception}`` dict for the jobs that
+    failed; raising marks the whole batch as failed.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload, run_at=None, max_attempts=None):
+    job = Job(kind=kind, payload=payload)
+    if run_at is not None:
+        job.run_at = run_at
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    return enqueue('send_email', {
+        'subject': subject,
+        'body': body,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': list(to),
+    })
+
+
+def retry_delay(attempts):
+    """ Exponential backoff, capped at JOB_RETRY_MAX_DELAY seconds """
+    return min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+
+
+def claim_jobs(limit):
+    """
+    Lock up to ``limit`` due jobs for this worker. ``SKIP LOCKED`` lets several
+    workers poll the table concurrently without blocking on each other; jobs
+    whose lease expired (their worker died) become claimable again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.PENDING) | Q(status=Job.RUNNING, locked_until__lt=now), run_at__lte=now)
+            .order_by('run_at', 'id')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=Job.RUNNING,
+                locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            )
+    return jobs
+
+
+def _finish(job, error=None):
+    job.attempts += 1
+    job.locked_until = None
+    if error is None:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.last_error = ''
+    else:
+        job.last_error = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s (%s) failed permanently: %s", job.id, job.kind, error)
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning("Job %s (%s) failed, retrying at %s: %s", job.id, job.kind, job.run_at, error)
+    job.save(update_fields=['attempts', 'locked_until', 'status', 'finished_at', 'last_error', 'run_at'])
+
+
+def run_pending_jobs(limit=None):
+    """ Claim and execute one batch of due jobs. Returns the number of jobs processed. """
+    jobs = claim_jobs(limit or settings.JOB_BATCH_SIZE)
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    for kind, batch in by_kind.items():
+        handler = _handlers.get(kind)
+        try:
+            if handler is None:
+                raise LookupError("No handler registered for job kind '%s'" % kind)
+            errors = handler(batch) or {}
+        except Exception as exc:
+            errors = {job.id: exc for job in batch}
+        for job in batch:
+            _finish(job, errors.get(job.id))
+    return len(jobs)
+
+
+@job_handler('send_email')
+def send_email_jobs(jobs):
+    """ Deliver a batch of emails over a single SMTP connection """
+    errors = {}
+    connection = get_connection()
+    connection.open()
+    try:
+        for job in jobs:
+            payload = job.payload
+            message = EmailMultiAlternatives(
+                payload['subject'],
+                payload['body'],
+                payload['from_email'],
+                payload['to'],
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                errors[job.id] = exc
+    finally:
+        connection.close()
+    return errors
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from scholarshiphub_api.caching import bump_catalog_version
+from scholarshiphub_api.dates import parse_deadline
+from scholarshiphub_api.models import Scholarship
+
+
+class Command(BaseCommand):
+    help = "Parse Scholarship.deadline into deadline_date for existing rows, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help="Re-parse rows that already have a deadline_date")
+
+    def handle(self, *args, **options):
+        queryset = Scholarship.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(deadline_date__isnull=True)
+
+        last_id = 0
+        scanned = updated = 0
+        while True:
+            # Keyset over the primary key; each batch is its own short transaction
+            batch = list(queryset.filter(id__gt=last_id).only('id', 'deadline', 'deadline_date')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = []
+            for scholarship in batch:
+                deadline_date = parse_deadline(scholarship.deadline)
+                if deadline_date != scholarship.deadline_date:
+                    scholarship.deadline_date = deadline_date
+                    changed.append(scholarship)
+            with transaction.atomic():
+                Scholarship.objects.bulk_update(changed, ['deadline_date'])
+            scanned += len(batch)
+            updated += len(changed)
+
+        if updated:
+            bump_catalog_version()
+        self.stdout.write("Scanned %d scholarship(s), updated %d" % (scanned, updated))
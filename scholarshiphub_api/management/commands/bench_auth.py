@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework.authtoken.models import Token
+from scholarshiphub_api.authentication import issue_tokens
+from scholarshiphub_api.benchmarks import count_queries, run_and_rollback, summarize, time_calls
+from scholarshiphub_api.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare authenticated /api/me/ throughput for legacy tokens and JWT access tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for name, summary, queries in run_and_rollback(lambda: self.run(options['requests'])):
+            self.stdout.write("%-6s  %8.0f req/s  p50 %6.3f ms  p99 %6.3f ms  %d queries/request" % (
+                name, summary['count'] / summary['total_s'], summary['p50_ms'], summary['p99_ms'], queries))
+
+    def run(self, requests):
+        user = User.objects.create_user("Bench", "User", "bench-auth@example.com", "password", username="bench-auth")
+        schemes = [
+            ('token', 'Token %s' % Token.objects.create(user=user).key),
+            ('jwt', 'Bearer %s' % issue_tokens(user)['access']),
+        ]
+        client = Client(HTTP_HOST='localhost')
+        results = []
+        for name, header in schemes:
+            request = lambda: client.get('/api/me/', HTTP_AUTHORIZATION=header)
+            assert request().status_code == 200
+            queries = count_queries(request)
+            start = time.perf_counter()
+            samples = time_calls(request, requests)
+            summary = summarize(samples)
+            summary['total_s'] = time.perf_counter() - start
+            results.append((name, summary, queries))
+        return results
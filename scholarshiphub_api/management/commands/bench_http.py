@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from scholarshiphub_api.authentication import issue_tokens
+from scholarshiphub_api.benchmarks import summarize
+from scholarshiphub_api.models import User, Scholarship
+
+# (name, sync path, async path, authenticated); {scholarship} is filled in from the database
+ENDPOINTS = [
+    ('scholarships', '/api/scholarships/?page_size=20', '/api/async/scholarships/?page_size=20', False),
+    ('scholarship', '/api/scholarships/{scholarship}/', '/api/async/scholarships/{scholarship}/', False),
+    ('search', '/api/scholarships/search/?search=engineering+research&page_size=20',
+     '/api/async/scholarships/search/?search=engineering+research&page_size=20', False),
+    ('comments', '/api/comments/?page_size=20', '/api/async/comments/?page_size=20', False),
+    ('me', '/api/me/', '/api/async/me/', True),
+]
+
+# Both deployments run under gunicorn so the process model is the same; only the worker class differs
+SERVERS = {
+    'wsgi': ['scholarshiphub.wsgi:application'],
+    'asgi': ['scholarshiphub.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+class HTTPClient:
+    """ Minimal HTTP/1.1 client over one connection, reconnecting when the server closes it """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = ['GET %s HTTP/1.1' % path, 'Host: %s:%d' % (self.host, self.port)]
+        lines += ['%s: %s' % item for item in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            self.close()
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def load(host, port, path, headers, concurrency, duration):
+    """ ``concurrency`` connections sending requests back to back for ``duration`` seconds """
+    samples, statuses, errors = [], {}, []
+    deadline = time.perf_counter() + duration
+
+    async def connection():
+        client = HTTPClient(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await client.get(path, headers)
+                except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+                    errors.append(repr(exc))
+                    client.close()
+                    await asyncio.sleep(0.01)
+                    continue
+                samples.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            client.close()
+
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    summary = summarize(samples)
+    summary['requests_per_s'] = round(len(samples) / duration, 1)
+    summary['status'] = {str(code): count for code, count in sorted(statuses.items())}
+    summary['errors'] = len(errors)
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI (sync views) and ASGI (async views under /api/async/) deployments: "
+        "start each under gunicorn, load the hot read endpoints with an increasing number of "
+        "concurrent keep-alive connections and record throughput and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS), help="Deployments to benchmark")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes per deployment")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50], help="Concurrent connections per run")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per endpoint and concurrency level")
+        parser.add_argument('--only', nargs='+', default=[], help="Only these endpoints: %s" % ', '.join(e[0] for e in ENDPOINTS))
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', default='bench_http.json', help="Where to write the results")
+
+    def handle(self, *args, **options):
+        scholarship = Scholarship.objects.order_by('id').values_list('id', flat=True).first()
+        user = User.objects.order_by('id').first()
+        if scholarship is None or user is None:
+            raise CommandError("The database is empty; run seed_data first.")
+        # Valid for the whole run rather than the usual few minutes
+        with override_settings(JWT_ACCESS_TOKEN_LIFETIME=datetime.timedelta(days=1)):
+            auth = {'Authorization': 'Bearer %s' % issue_tokens(user)['access']}
+        endpoints = [e for e in ENDPOINTS if not options['only'] or e[0] in options['only']]
+
+        results = {}
+        self.stdout.write("%-5s %-13s %5s %9s %9s %9s %9s %6s" % ("", "endpoint", "conns", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"))
+        for server in options['servers']:
+            with Server(SERVERS[server], options['workers'], options['port']):
+                for name, sync_path, async_path, authenticated in endpoints:
+                    path = (async_path if server == 'asgi' else sync_path).format(scholarship=scholarship)
+                    headers = auth if authenticated else {}
+                    for concurrency in options['concurrency']:
+                        summary = asyncio.run(load('127.0.0.1', options['port'], path, headers, concurrency, options['duration']))
+                        summary['path'] = path
+                        results.setdefault(server, {}).setdefault(name, {})[str(concurrency)] = summary
+                        self.stdout.write("%-5s %-13s %5d %9.1f %9.2f %9.2f %9.2f %6d" % (
+                            server, name, concurrency, summary['requests_per_s'], summary['p50_ms'],
+                            summary['p95_ms'], summary['p99_ms'], summary['errors']))
+
+        report = {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'workers': options['workers'],
+            'duration_s': options['duration'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write("Wrote %s" % options['output'])
+
+
+class Server:
+    """ A gunicorn process for the duration of a ``with`` block """
+    def __init__(self, app_args, workers, port):
+        self.command = [sys.executable, '-m', 'gunicorn', *app_args, '--workers', str(workers),
+                        '--bind', '127.0.0.1:%d' % port, '--log-level', 'warning']
+        self.port = port
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=settings.BASE_DIR, env=os.environ.copy())
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError("gunicorn exited with status %d" % self.process.returncode)
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError("gunicorn did not start listening on port %d" % self.port)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers_by_algorithm, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from scholarshiphub_api.benchmarks import run_and_rollback, summarize, time_calls
+from scholarshiphub_api.models import User
+from scholarshiphub_api.passwords import _verify
+
+BENCH_PASSWORD = 'bench-login-password'
+
+
+def hasher_path(hasher):
+    return '%s.%s' % (type(hasher).__module__, type(hasher).__qualname__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Logins per second per core for each password hasher: end to end through /api/login/ "
+        "(known and unknown emails), and the verification throughput of a pool of threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashers', nargs='+', default=[],
+                            help="Hasher algorithms to compare (default: those in PASSWORD_HASHERS that are installed)")
+        parser.add_argument('--logins', type=int, default=20, help="Logins per measurement")
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4], help="Pool sizes for the throughput runs")
+
+    def handle(self, *args, **options):
+        by_algorithm = get_hashers_by_algorithm()
+        algorithms = options['hashers'] or list(by_algorithm)
+        unknown = set(algorithms) - set(by_algorithm)
+        if unknown:
+            raise CommandError("Not in PASSWORD_HASHERS: %s" % ', '.join(sorted(unknown)))
+        cores = os.cpu_count() or 1
+        self.stdout.write("%d cores" % cores)
+
+        for algorithm in algorithms:
+            hasher = by_algorithm[algorithm]
+            try:
+                make_password(BENCH_PASSWORD, hasher=hasher)
+            except ValueError as exc:
+                self.stdout.write("%-14s skipped: %s" % (algorithm, exc))
+                continue
+            # The hasher under test first, so logins neither rehash nor use another one for the dummy hash
+            hashers = [hasher_path(hasher)] + [p for p in settings.PASSWORD_HASHERS if p != hasher_path(hasher)]
+            with override_settings(PASSWORD_HASHERS=hashers, ADMISSION_LIMITS={}):
+                known, missing = run_and_rollback(lambda: self.logins(algorithm, options['logins']))
+                self.stdout.write("%-14s login  %7.1f/s per core  p50 %7.1f ms  p99 %7.1f ms  unknown email p50 %7.1f ms" % (
+                    algorithm, 1000.0 / known['mean_ms'], known['p50_ms'], known['p99_ms'], missing['p50_ms']))
+                encoded = make_password(BENCH_PASSWORD)
+                for threads in options['threads']:
+                    rate = self.throughput(encoded, threads, options['logins'] * threads)
+                    self.stdout.write("%-14s pool   %7.1f/s per core  %7.1f/s with %d threads" % (
+                        algorithm, rate / min(threads, cores), rate, threads))
+
+        self.rehash(by_algorithm)
+
+    def logins(self, algorithm, logins):
+        email = 'bench-login-%s@example.com' % algorithm
+        User.objects.create_user("Bench", "Login", email, BENCH_PASSWORD, username='bench-login-%s' % algorithm)
+        client = Client(HTTP_HOST='localhost')
+
+        def login(email):
+            response = client.post('/api/login/', {'email': email, 'password': BENCH_PASSWORD})
+            assert response.status_code in (200, 400), response.status_code
+
+        known = summarize(time_calls(lambda: login(email), logins))
+        missing = summarize(time_calls(lambda: login('nobody-%s@example.com' % algorithm), logins))
+        return known, missing
+
+    def throughput(self, encoded, threads, verifications):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(_verify, [BENCH_PASSWORD] * threads, [encoded] * threads))
+            start = time.perf_counter()
+            list(pool.map(_verify, [BENCH_PASSWORD] * verifications, [encoded] * verifications))
+            return verifications / (time.perf_counter() - start)
+
+    def rehash(self, by_algorithm):
+        """ The first login with an outdated hash pays for a second hash, the next ones do not """
+        preferred = hasher_path(next(iter(by_algorithm.values())))
+        outdated = next((h for h in by_algorithm.values() if hasher_path(h) != preferred), None)
+        if outdated is None:
+            return
+
+        def run():
+            user = User.objects.create_user("Bench", "Rehash", 'bench-rehash@example.com', None, username='bench-rehash')
+            user.password = make_password(BENCH_PASSWORD, hasher=outdated)
+            user.save(update_fields=['password'])
+            client = Client(HTTP_HOST='localhost')
+            samples = []
+            for _ in range(2):
+                start = time.perf_counter()
+                assert client.post('/api/login/', {'email': user.email, 'password': BENCH_PASSWORD}).status_code == 200
+                samples.append(time.perf_counter() - start)
+            user.refresh_from_db()
+            return samples, user.password.split('$', 1)[0]
+
+        with override_settings(ADMISSION_LIMITS={}):
+            (first, second), algorithm = run_and_rollback(run)
+        self.stdout.write("rehash %s -> %s: first login %.1f ms, next %.1f ms" % (
+            outdated.algorithm, algorithm, first * 1000, second * 1000))
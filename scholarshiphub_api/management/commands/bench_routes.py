@@ -0,0 +1,298 @@
+import datetime
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from django import get_version
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+from scholarshiphub_api import urls
+from scholarshiphub_api.authentication import issue_tokens
+from scholarshiphub_api.benchmarks import count_queries, run_and_rollback, summarize
+from scholarshiphub_api.caching import bump_catalog_version
+from scholarshiphub_api.models import User, Scholarship, Comment, StatementOfPurpose, UploadSession, RequestProfile
+from scholarshiphub_api.uploads import CHUNK_CONTENT_TYPE, start_session
+
+BENCH_PASSWORD = 'bench-password'
+PDF = b'%PDF-1.4\n' + b'0' * (256 * 1024)
+
+
+class Fixtures:
+    """ Rows and credentials shared by the scenarios; created inside the rolled-back transaction """
+    def __init__(self):
+        self.counter = itertools.count()
+        self.password = make_password(BENCH_PASSWORD)
+        self.user = self.new_user()
+        self.admin = self.new_user(is_staff=True, is_superuser=True)
+        self.scholarship = self.new_scholarship()
+        self.comment = self.new_comment()
+        self.sop = self.new_sop()
+        self.sop.reviewed_sop.save('reviewed.pdf', ContentFile(PDF))
+        self.refresh = issue_tokens(self.user)['refresh']
+        self.upload = self.new_upload()
+        self.profile = RequestProfile.objects.create(
+            user=self.admin, method='GET', path='/api/scholarships/', url_name='get-all-scholarships',
+            status_code=200, duration_ms=1.0, top_functions=[], stats=b'')
+        self._tokens = {}
+
+    def unique(self):
+        return '%d-%d' % (os.getpid(), next(self.counter))
+
+    def auth(self, user):
+        """ Authorization header with an access token that is re-issued before it can expire """
+        token, issued = self._tokens.get(user.pk, (None, 0))
+        if time.monotonic() - issued > 60:
+            token, issued = issue_tokens(user)['access'], time.monotonic()
+            self._tokens[user.pk] = (token, issued)
+        return {'HTTP_AUTHORIZATION': 'Bearer %s' % token}
+
+    def new_user(self, **extra):
+        n = self.unique()
+        return User.objects.create(
+            first_name="Bench", last_name=n, email="bench-%s@example.com" % n, username="bench-%s" % n,
+            password=self.password, is_verified=True, **extra
+        )
+
+    def new_scholarship(self):
+        return Scholarship.objects.create(
+            title="Bench scholarship %s" % self.unique(), description="Engineering research grant", eligibility="Graduates",
+            benefit="Full tuition", field_of_study="Engineering", deadline="30 June 2030", link="https://example.com",
+        )
+
+    def new_comment(self, parent=None):
+        return Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Benchmark comment", parent_comment=parent)
+
+    def new_sop(self):
+        sop = StatementOfPurpose(user=self.user, title="Bench SOP")
+        sop.sop_file.save('sop.pdf', ContentFile(PDF))
+        return sop
+
+    def new_upload(self, complete=False):
+        session = UploadSession.objects.create(user=self.user, title="Bench SOP", filename="sop.pdf", length=len(PDF))
+        start_session(session)
+        if complete:
+            with open(session.temp_path, 'wb') as f:
+                f.write(PDF)
+            session.offset = session.length
+            session.save(update_fields=['offset'])
+        return session
+
+    def pdf(self, name='sop.pdf'):
+        return SimpleUploadedFile(name, PDF, content_type='application/pdf')
+
+
+def _csv(fx, rows):
+    lines = ["title,description,eligibility,benefit,field_of_study,deadline,link"]
+    lines += ["Bench import %s,Research grant,Graduates,Stipend,Engineering,1 May 2030,https://example.com" % fx.unique() for _ in range(rows)]
+    return SimpleUploadedFile('import.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+
+# (method, route pattern in scholarshiphub_api/urls.py, variant, prepare)
+# prepare(client, fixtures) does any untimed setup and returns the zero-argument request to time.
+SCENARIOS = [
+    ('GET', 'swagger/<format>/', '', lambda c, fx: lambda: c.get('/api/swagger/openapi/')),
+    ('GET', 'swagger/', '', lambda c, fx: lambda: c.get('/api/swagger/')),
+    ('GET', 'redoc/', '', lambda c, fx: lambda: c.get('/api/redoc/')),
+    ('POST', 'register/', '', lambda c, fx: (lambda n: lambda: c.post('/api/register/', {
+        'first_name': "Bench", 'last_name': "User", 'email': 'register-%s@example.com' % n, 'username': 'register-%s' % n,
+        'password': BENCH_PASSWORD}, format='json'))(fx.unique())),
+    ('POST', 'login/', '', lambda c, fx: lambda: c.post('/api/login/', {'email': fx.user.email, 'password': BENCH_PASSWORD}, format='json')),
+    ('GET', 'verify-email/<int:uid>/<str:token>/', '', lambda c, fx: (lambda u: lambda: c.get(
+        '/api/verify-email/%d/%s/' % (u.pk, default_token_generator.make_token(u))))(fx.new_user())),
+    ('DELETE', 'logout/', '', lambda c, fx: (lambda auth: lambda: c.delete('/api/logout/', **auth))(fx.auth(fx.new_user()))),
+    ('POST', 'token/refresh/', '', lambda c, fx: lambda: c.post('/api/token/refresh/', {'refresh': fx.refresh}, format='json')),
+    ('POST', 'scholarships/create', '', lambda c, fx: (lambda n: lambda: c.post('/api/scholarships/create', {
+        'title': "Bench create %s" % n, 'description': "Grant", 'eligibility': "Graduates", 'benefit': "Tuition",
+        'field_of_study': "Law", 'deadline': "1 May 2030", 'link': "https://example.com"}, **fx.auth(fx.admin)))(fx.unique())),
+    ('POST', 'scholarships/bulk', '100 rows', lambda c, fx: (lambda f: lambda: c.post(
+        '/api/scholarships/bulk', {'file': f}, format='multipart', **fx.auth(fx.admin)))(_csv(fx, 100))),
+    ('POST', 'comments/create', '', lambda c, fx: lambda: c.post('/api/comments/create', {
+        'scholarship_id': fx.scholarship.pk, 'content': "Benchmark comment"}, format='json', **fx.auth(fx.user))),
+    ('POST', 'sop/create', '256 KB', lambda c, fx: (lambda f: lambda: c.post(
+        '/api/sop/create', {'title': "Bench SOP", 'sop_file': f}, format='multipart', **fx.auth(fx.user)))(fx.pdf())),
+    ('POST', 'sop/uploads/', '', lambda c, fx: lambda: c.post('/api/sop/uploads/', {
+        'title': "Bench SOP", 'filename': "sop.pdf", 'length': len(PDF)}, format='json', **fx.auth(fx.user))),
+    ('GET', 'sop/uploads/<uuid:upload_id>/', '', lambda c, fx: lambda: c.get('/api/sop/uploads/%s/' % fx.upload.pk, **fx.auth(fx.user))),
+    ('PATCH', 'sop/uploads/<uuid:upload_id>/', '256 KB chunk', lambda c, fx: (lambda s: lambda: c.generic(
+        'PATCH', '/api/sop/uploads/%s/' % s.pk, PDF, content_type=CHUNK_CONTENT_TYPE, HTTP_UPLOAD_OFFSET='0',
+        **fx.auth(fx.user)))(fx.new_upload())),
+    ('DELETE', 'sop/uploads/<uuid:upload_id>/', '', lambda c, fx: (lambda s: lambda: c.delete(
+        '/api/sop/uploads/%s/' % s.pk, **fx.auth(fx.user)))(fx.new_upload())),
+    ('POST', 'sop/uploads/<uuid:upload_id>/complete', '', lambda c, fx: (lambda s: lambda: c.post(
+        '/api/sop/uploads/%s/complete' % s.pk, **fx.auth(fx.user)))(fx.new_upload(complete=True))),
+    ('GET', 'scholarships/', 'page_size=20', lambda c, fx: lambda: c.get('/api/scholarships/', {'page_size': 20})),
+    ('GET', 'scholarships/', 'open, by deadline', lambda c, fx: lambda: c.get('/api/scholarships/', {
+        'expired': 'false', 'ordering': 'deadline_date', 'page_size': 20})),
+    ('GET', 'scholarships/<int:id>/', '', lambda c, fx: lambda: c.get('/api/scholarships/%d/' % fx.scholarship.pk)),
+    ('GET', 'scholarships/<int:id>/comments/', '', lambda c, fx: lambda: c.get('/api/scholarships/%d/comments/' % fx.scholarship.pk)),
+    ('GET', 'comments/', 'page_size=20', lambda c, fx: lambda: c.get('/api/comments/', {'page_size': 20})),
+    ('GET', 'comments/<int:id>/', '', lambda c, fx: lambda: c.get('/api/comments/%d/' % fx.comment.pk)),
+    ('GET', 'sop/<int:id>/', '', lambda c, fx: lambda: c.get('/api/sop/%d/' % fx.sop.pk, **fx.auth(fx.user))),
+    ('GET', 'sop/<int:id>/download/', '', lambda c, fx: lambda: c.get('/api/sop/%d/download/' % fx.sop.pk, **fx.auth(fx.user))),
+    ('GET', 'sop/<int:id>/download/', 'Range', lambda c, fx: lambda: c.get(
+        '/api/sop/%d/download/' % fx.sop.pk, HTTP_RANGE='bytes=65536-131071', **fx.auth(fx.user))),
+    ('GET', 'sop/<int:id>/review/download/', '', lambda c, fx: lambda: c.get('/api/sop/%d/review/download/' % fx.sop.pk, **fx.auth(fx.user))),
+    ('PUT', 'profile/update', '', lambda c, fx: lambda: c.put('/api/profile/update', {'first_name': "Benchmark"}, format='json', **fx.auth(fx.user))),
+    ('PUT', 'scholarships', '', lambda c, fx: (lambda n: lambda: c.put('/api/scholarships', {
+        'title': "Bench edit %s" % n, 'description': "Grant", 'eligibility': "Graduates", 'benefit': "Tuition",
+        'field_of_study': "Law", 'deadline': "1 May 2030", 'link': "https://example.com"}, format='json', **fx.auth(fx.admin)))(fx.unique())),
+    ('PUT', 'comments', '', lambda c, fx: lambda: c.put('/api/comments', {'content': "Edited"}, format='json', **fx.auth(fx.user))),
+    ('PUT', 'sop/<int:id>', '', lambda c, fx: (lambda f: lambda: c.put(
+        '/api/sop/%d' % fx.sop.pk, {'title': "Edited", 'sop_file': f}, format='multipart', **fx.auth(fx.user)))(fx.pdf())),
+    ('POST', 'change_password/', '', lambda c, fx: (lambda auth: lambda: c.post('/api/change_password/', {
+        'old_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD + '2'}, format='json', **auth))(fx.auth(fx.new_user()))),
+    ('GET', 'scholarships/search/', 'page_size=20', lambda c, fx: lambda: c.get('/api/scholarships/search/', {'search': "engineering research", 'page_size': 20})),
+    ('GET', 'scholarships/filter/', 'field + open', lambda c, fx: lambda: c.get('/api/scholarships/filter/', {
+        'field_of_study': "Engineering", 'expired': 'false'})),
+    ('GET', 'scholarships/filter/', 'q', lambda c, fx: lambda: c.get('/api/scholarships/filter/', {'q': "research grant"})),
+    ('GET', 'users/', 'page_size=20', lambda c, fx: lambda: c.get('/api/users/', {'page_size': 20}, **fx.auth(fx.admin))),
+    ('GET', 'exports/<str:resource>/', 'users ndjson', lambda c, fx: lambda: c.get('/api/exports/users/', {'format': 'ndjson'}, **fx.auth(fx.admin))),
+    ('GET', 'profiles/', 'page_size=20', lambda c, fx: lambda: c.get('/api/profiles/', {'page_size': 20}, **fx.auth(fx.admin))),
+    ('GET', 'profiles/<int:id>/', '', lambda c, fx: lambda: c.get('/api/profiles/%d/' % fx.profile.pk, **fx.auth(fx.admin))),
+    ('DELETE', 'users/<int:id>/', '', lambda c, fx: (lambda u: lambda: c.delete('/api/users/%d/' % u.pk, **fx.auth(fx.admin)))(fx.new_user())),
+    ('PUT', 'sop/<int:id>/review/', '256 KB', lambda c, fx: (lambda f: lambda: c.put(
+        '/api/sop/%d/review/' % fx.sop.pk, {'reviewed_sop': f}, format='multipart', **fx.auth(fx.admin)))(fx.pdf('reviewed.pdf'))),
+    ('DELETE', 'scholarships/<int:id>/delete/', '', lambda c, fx: (lambda s: lambda: c.delete(
+        '/api/scholarships/%d/delete/' % s.pk, **fx.auth(fx.admin)))(fx.new_scholarship())),
+    ('DELETE', 'sop/<int:id>/delete/', '', lambda c, fx: (lambda s: lambda: c.delete(
+        '/api/sop/%d/delete/' % s.pk, **fx.auth(fx.admin)))(StatementOfPurpose.objects.create(user=fx.user, title="Bench"))),
+    ('DELETE', 'comments/<int:id>/delete/', '', lambda c, fx: (lambda cm: lambda: c.delete(
+        '/api/comments/%d/delete/' % cm.pk, **fx.auth(fx.admin)))(fx.new_comment())),
+    ('GET', 'me/', '', lambda c, fx: lambda: c.get('/api/me/', **fx.auth(fx.user))),
+    ('GET', 'async/scholarships/', 'page_size=20', lambda c, fx: lambda: c.get('/api/async/scholarships/', {'page_size': 20})),
+    ('GET', 'async/scholarships/<int:id>/', '', lambda c, fx: lambda: c.get('/api/async/scholarships/%d/' % fx.scholarship.pk)),
+    ('GET', 'async/scholarships/search/', 'page_size=20', lambda c, fx: lambda: c.get('/api/async/scholarships/search/', {
+        'search': "engineering research", 'page_size': 20})),
+    ('GET', 'async/comments/', 'page_size=20', lambda c, fx: lambda: c.get('/api/async/comments/', {'page_size': 20})),
+    ('GET', 'async/me/', '', lambda c, fx: lambda: c.get('/api/async/me/', **fx.auth(fx.user))),
+]
+
+
+def scenario_label(method, route, variant):
+    return '%s /api/%s%s' % (method, route, ' [%s]' % variant if variant else '')
+
+
+def _consume(response):
+    # The test client closes the response itself once streaming content is exhausted
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in scholarshiphub_api/urls.py against the current database "
+        "(see seed_data) and record latency percentiles, queries per request and throughput "
+        "as a JSON baseline. Writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30, help="Timed requests per scenario")
+        parser.add_argument('--only', nargs='+', default=[], help="Only run scenarios whose label contains one of these strings")
+        parser.add_argument('--output', default='bench_routes.json', help="Where to write the results")
+        parser.add_argument('--compare', help="Baseline JSON to compare against; regressions make the command fail")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative p95 slowdown before it counts as a regression")
+
+    def handle(self, *args, **options):
+        patterns = {str(pattern.pattern) for pattern in urls.urlpatterns}
+        missing = patterns - {route for _, route, _, _ in SCENARIOS}
+        if missing:
+            self.stderr.write("No benchmark scenario for: %s" % ', '.join(sorted(missing)))
+
+        scenarios = [s for s in SCENARIOS if not options['only'] or any(o in scenario_label(*s[:3]) for o in options['only'])]
+        media_root = tempfile.mkdtemp(prefix='bench-media-')
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        # Expected 4xx/5xx responses would otherwise be logged for every request
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, SOP_UPLOAD_TEMP_DIR=os.path.join(media_root, 'upload_sessions'),
+                                   IMAGE_VARIANT_WORKERS=0, ALLOWED_HOSTS=['*']):
+                results = run_and_rollback(lambda: self.run(scenarios, options['repeat']))
+        finally:
+            request_logger.setLevel(level)
+            shutil.rmtree(media_root, ignore_errors=True)
+            # Rolled-back writes bumped the catalog version; make sure no cached page refers to them
+            bump_catalog_version()
+
+        report = {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'django': get_version(),
+            'rows': {
+                'users': User.objects.count(),
+                'scholarships': Scholarship.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+            'repeat': options['repeat'],
+            'routes': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write("Wrote %s" % options['output'])
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(baseline['routes'], results, options['tolerance'])
+            if regressions:
+                raise CommandError("%d route(s) regressed against %s" % (regressions, options['compare']))
+
+    def run(self, scenarios, repeat):
+        client = APIClient(HTTP_HOST='localhost')
+        client.raise_request_exception = False
+        fixtures = Fixtures()
+        results = {}
+        self.stdout.write("%-58s %6s %9s %9s %9s %8s %7s" % ("route", "status", "p50 ms", "p95 ms", "p99 ms", "req/s", "queries"))
+        for method, route, variant, prepare in scenarios:
+            label = scenario_label(method, route, variant)
+            # Warm caches and lazy imports, then count the queries of one request
+            _consume(prepare(client, fixtures)())
+            send = prepare(client, fixtures)
+            statuses = set()
+            queries = count_queries(lambda: statuses.add(self.timed(send)[0]))
+
+            samples = []
+            for _ in range(repeat):
+                send = prepare(client, fixtures)
+                status, elapsed = self.timed(send)
+                statuses.add(status)
+                samples.append(elapsed)
+            summary = summarize(samples)
+            summary['queries'] = queries
+            summary['requests_per_s'] = round(len(samples) / sum(samples), 1) if samples else 0.0
+            summary['status'] = sorted(statuses)
+            results[label] = summary
+            self.stdout.write("%-58s %6s %9.2f %9.2f %9.2f %8.1f %7d" % (
+                label, '/'.join(map(str, summary['status'])), summary['p50_ms'], summary['p95_ms'],
+                summary['p99_ms'], summary['requests_per_s'], queries))
+        return results
+
+    def timed(self, send):
+        start = time.perf_counter()
+        response = send()
+        _consume(response)
+        return response.status_code, time.perf_counter() - start
+
+    def compare(self, baseline, results, tolerance):
+        regressions = 0
+        for label, summary in sorted(results.items()):
+            before = baseline.get(label)
+            if before is None:
+                continue
+            slower = before['p95_ms'] and summary['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+            more_queries = summary['queries'] > before['queries']
+            if slower or more_queries:
+                regressions += 1
+                self.stdout.write(self.style.ERROR("REGRESSION %s: p95 %.2f -> %.2f ms, queries %d -> %d" % (
+                    label, before['p95_ms'], summary['p95_ms'], before['queries'], summary['queries'])))
+        return regressions
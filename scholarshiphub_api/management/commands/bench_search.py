@@ -0,0 +1,50 @@
+import random
+from django.core.management.base import BaseCommand
+from django.db import connection
+from scholarshiphub_api.benchmarks import FIELDS_OF_STUDY, run_and_rollback, sentence, summarize, time_calls
+from scholarshiphub_api.models import Scholarship
+from scholarshiphub_api.search import SubstringSearchBackend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Compare the indexed search backend against the legacy ICONTAINS query on synthetic catalogs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--queries', nargs='+', default=['engineering', 'women leaders', 'fully funded research', 'nonexistentterm'])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        backends = [('legacy', SubstringSearchBackend()), ('indexed', get_search_backend(connection.alias))]
+        self.stdout.write("Indexed backend on %s: %s" % (connection.vendor, type(backends[1][1]).__name__))
+        for size in options['sizes']:
+            results = run_and_rollback(lambda: self.run_size(size, backends, options))
+            for name, summary in results:
+                self.stdout.write("%8d rows  %-8s  mean %8.2f ms  p50 %8.2f ms  p95 %8.2f ms" % (
+                    size, name, summary['mean_ms'], summary['p50_ms'], summary['p95_ms']))
+
+    def run_size(self, size, backends, options):
+        rng = random.Random(options['seed'])
+        Scholarship.objects.bulk_create(
+            (Scholarship(
+                title="%s %d" % (sentence(rng, 4), i),
+                description=sentence(rng, 80),
+                eligibility=sentence(rng, 20),
+                benefit=sentence(rng, 15),
+                field_of_study=rng.choice(FIELDS_OF_STUDY),
+                deadline="%d %s 2025" % (rng.randint(1, 28), rng.choice(["March", "June", "October"])),
+                link="https://example.com/%d" % i,
+            ) for i in range(size)),
+            batch_size=2000,
+        )
+        page_size = options['page_size']
+        results = []
+        for name, backend in backends:
+            samples = []
+            for query in options['queries']:
+                queryset = backend.search(Scholarship.objects.all(), query)
+                samples += time_calls(lambda: list(queryset.all()[:page_size]), options['repeat'])
+            results.append((name, summarize(samples)))
+        return results
@@ -0,0 +1,77 @@
+from functools import partial
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from scholarshiphub_api.benchmarks import summarize, time_calls
+from scholarshiphub_api.fast_serializers import ScholarshipValuesSerializer, CommentValuesSerializer, UserValuesSerializer
+from scholarshiphub_api.filters import select_scholarship_fields
+from scholarshiphub_api.models import User, Scholarship, Comment
+from scholarshiphub_api.renderers import FastJSONRenderer, orjson
+from scholarshiphub_api.serializers import ScholarshipSerializer, ScholarshipListSerializer, SCHOLARSHIP_COMPACT_FIELDS, CommentSerializer, UserSerializer
+
+
+def scholarship_cases(fieldset):
+    queryset = Scholarship.objects.order_by('id')
+    return (
+        lambda rows: ScholarshipListSerializer(select_scholarship_fields(queryset, fieldset)[:rows], many=True, fields=fieldset).data,
+        lambda rows: ScholarshipValuesSerializer(ScholarshipValuesSerializer.values(queryset, fieldset)[:rows], fields=fieldset).data,
+    )
+
+
+def comment_cases():
+    # A page of comments with their reply threads, as GetComments serves it
+    queryset = Comment.objects.order_by('created_at', 'id')
+    values = CommentValuesSerializer.values(queryset)
+    return (
+        lambda rows: CommentSerializer(queryset.select_related('user')[:rows], many=True).data,
+        lambda rows: CommentValuesSerializer(values[:rows], replies=values).data,
+    )
+
+
+def user_cases():
+    queryset = User.objects.order_by('id')
+    return (
+        lambda rows: UserSerializer(queryset[:rows], many=True).data,
+        lambda rows: UserValuesSerializer(UserValuesSerializer.values(queryset)[:rows]).data,
+    )
+
+
+# name -> (model, cases); each case is (DRF serializer, fast path), a function of the number of rows
+CASES = {
+    'scholarships': (Scholarship, partial(scholarship_cases, ScholarshipSerializer.Meta.fields)),
+    'scholarships-compact': (Scholarship, partial(scholarship_cases, SCHOLARSHIP_COMPACT_FIELDS)),
+    'comments': (Comment, comment_cases),
+    'users': (User, user_cases),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Rows per second of the DRF serializers rendered by JSONRenderer against the .values() "
+        "serializers rendered by FastJSONRenderer, queries included, on the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per response")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--only', nargs='+', choices=list(CASES), default=list(CASES))
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.stdout.write("JSON encoder of the fast path: %s" % ('orjson' if orjson is not None else 'json (orjson is not installed)'))
+        self.stdout.write("%-21s %-5s %10s %10s %10s %8s" % ("", "", "rows/s", "p50 ms", "p95 ms", "speedup"))
+        for name in options['only']:
+            model, cases = CASES[name]
+            if not model.objects.exists():
+                raise CommandError("No %s in the database; run seed_data first." % model._meta.verbose_name_plural)
+            drf, fast = cases()
+            runs = [
+                ('drf', lambda: JSONRenderer().render(drf(rows))),
+                ('fast', lambda: FastJSONRenderer().render(fast(rows))),
+            ]
+            before = None
+            for label, run in runs:
+                summary = summarize(time_calls(run, options['repeat']))
+                rate = rows / (summary['mean_ms'] / 1000.0)
+                before = before or rate
+                self.stdout.write("%-21s %-5s %10.0f %10.2f %10.2f %7.1fx" % (
+                    name, label, rate, summary['p50_ms'], summary['p95_ms'], rate / before))
@@ -0,0 +1,30 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from scholarshiphub_api.images import variant_job, record_variants, render_variants
+from scholarshiphub_api.models import Scholarship
+
+
+class Command(BaseCommand):
+    help = "Backfill thumbnail and WebP variants for existing scholarship images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(1, settings.IMAGE_VARIANT_WORKERS))
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        names = Scholarship.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True).distinct()
+        jobs = [(name, variant_job(name, options['force'])) for name in names.iterator()]
+        jobs = [(name, job) for name, job in jobs if job is not None]
+        self.stdout.write("Rendering variants for %d image(s) with %d worker(s)" % (len(jobs), options['workers']))
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(render_variants, *job): name for name, job in jobs}
+            for future in as_completed(futures):
+                try:
+                    record_variants(futures[future], future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write("%s: %s" % (futures[future], exc))
+        self.stdout.write("Done, %d failed" % failed)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from scholarshiphub_api.counters import reconcile_comment_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute Scholarship.comment_count and last_comment_at from the comments, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        scanned, updated = reconcile_comment_counters(options['batch_size'])
+        self.stdout.write("Scanned %d scholarship(s), updated %d" % (scanned, updated))
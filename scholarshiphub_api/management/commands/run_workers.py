@@ -0,0 +1,59 @@
+import multiprocessing
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from scholarshiphub_api.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Process background jobs (emails, ...) from the job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+        parser.add_argument('--batch-size', type=int, default=settings.JOB_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            self.work(options)
+            return
+
+        # Children must not inherit the parent's database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options,), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            # Each child finishes its current batch on SIGTERM
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        # A deploy stops the parent with SIGTERM; without this the children would be orphaned
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop()
+            for process in processes:
+                process.join()
+
+    def work(self, options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        while not stopping:
+            processed = run_pending_jobs(options['batch_size'])
+            if processed:
+                self.stdout.write("Processed %d job(s)" % processed)
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
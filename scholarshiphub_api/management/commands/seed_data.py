@@ -0,0 +1,136 @@
+import datetime
+import random
+import time
+from array import array
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from scholarshiphub_api.benchmarks import FIELDS_OF_STUDY, sentence
+from scholarshiphub_api.caching import bump_catalog_version
+from scholarshiphub_api.counters import reconcile_comment_counters
+from scholarshiphub_api.models import User, Scholarship, Comment
+
+SEED_PASSWORD = 'seed-password'
+DEADLINE_FORMATS = ('%d %B %Y', '%B %d, %Y', '%Y-%m-%d')
+# Distinct synthetic texts per field; rows pick from these so generating millions stays cheap
+TEXT_POOL_SIZE = 2000
+LOCAL_HOSTS = ('', 'localhost', '127.0.0.1', '::1')
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, scholarships and comments for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--scholarships', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--reply-ratio', type=float, default=0.3, help="Share of comments that reply to another comment")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--allow-remote', action='store_true', help="Seed a database that is not on this machine")
+
+    def handle(self, *args, **options):
+        host = connection.settings_dict.get('HOST') or ''
+        if connection.vendor != 'sqlite' and host not in LOCAL_HOSTS and not options['allow_remote']:
+            raise CommandError("Refusing to seed the database on %s; pass --allow-remote if that is intended." % host)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.pools = {
+            'title': [sentence(self.rng, 4) for _ in range(TEXT_POOL_SIZE)],
+            'description': [sentence(self.rng, 80) for _ in range(TEXT_POOL_SIZE)],
+            'eligibility': [sentence(self.rng, 20) for _ in range(TEXT_POOL_SIZE)],
+            'benefit': [sentence(self.rng, 15) for _ in range(TEXT_POOL_SIZE)],
+            'comment': [sentence(self.rng, 25, topical=0.2) for _ in range(TEXT_POOL_SIZE)],
+        }
+        self.timed("users", options['users'], self.seed_users)
+        self.timed("scholarships", options['scholarships'], self.seed_scholarships)
+        self.timed("comments", options['comments'], lambda count: self.seed_comments(count, options['reply_ratio']))
+        if options['comments'] > 0:
+            # bulk_create bypasses the comment counters
+            start = time.perf_counter()
+            reconcile_comment_counters(self.batch_size)
+            self.stdout.write("Reconciled comment counters in %.1fs" % (time.perf_counter() - start))
+        # bulk_create sends no post_save, so cached catalog responses are invalidated here
+        bump_catalog_version()
+
+    def timed(self, name, count, seed):
+        if count <= 0:
+            return
+        start = time.perf_counter()
+        seed(count)
+        elapsed = time.perf_counter() - start
+        self.stdout.write("Created %d %s in %.1fs (%.0f rows/s)" % (count, name, elapsed, count / elapsed))
+
+    def text(self, field):
+        return self.rng.choice(self.pools[field])
+
+    def batches(self, count, build):
+        """ Build and insert ``count`` rows, ``batch_size`` rows per transaction """
+        for start in range(0, count, self.batch_size):
+            objs = [build(n) for n in range(start, min(count, start + self.batch_size))]
+            with transaction.atomic():
+                yield objs
+
+    def next_number(self, model):
+        # Continue numbering after existing rows so unique fields never collide on a re-run
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def seed_users(self, count):
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(SEED_PASSWORD)
+        first = self.next_number(User)
+        build = lambda n: User(
+            first_name="Seed", last_name="User %d" % (first + n), email="seed%d@example.com" % (first + n),
+            username="seed%d" % (first + n), password=password, is_verified=self.rng.random() < 0.8,
+        )
+        for objs in self.batches(count, build):
+            User.objects.bulk_create(objs)
+        self.stdout.write("Seeded users log in with the password '%s'" % SEED_PASSWORD)
+
+    def seed_scholarships(self, count):
+        first = self.next_number(Scholarship)
+        today = datetime.date.today()
+
+        def build(n):
+            deadline_date = today + datetime.timedelta(days=self.rng.randint(-180, 365))
+            return Scholarship(
+                title="%s %d" % (self.text('title'), first + n),
+                description=self.text('description'),
+                eligibility=self.text('eligibility'),
+                benefit=self.text('benefit'),
+                field_of_study=self.rng.choice(FIELDS_OF_STUDY),
+                deadline=deadline_date.strftime(self.rng.choice(DEADLINE_FORMATS)),
+                # bulk_create skips Scholarship.save(), which would parse the deadline
+                deadline_date=deadline_date,
+                link="https://example.com/scholarships/%d" % (first + n),
+            )
+
+        for objs in self.batches(count, build):
+            Scholarship.objects.bulk_create(objs)
+
+    def ids(self, model):
+        return array('q', model.objects.order_by().values_list('id', flat=True).iterator(chunk_size=10000))
+
+    def seed_comments(self, count, reply_ratio):
+        scholarship_ids, user_ids = self.ids(Scholarship), self.ids(User)
+        if not scholarship_ids or not user_ids:
+            self.stderr.write("Comments need at least one scholarship and one user")
+            return
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Replies need the primary keys of the comments they answer
+            reply_ratio = 0
+
+        build = lambda n: Comment(
+            scholarship_id_id=self.rng.choice(scholarship_ids), user_id=self.rng.choice(user_ids),
+            content=self.text('comment'),
+        )
+        for objs in self.batches(count, build):
+            replies = int(len(objs) * reply_ratio)
+            roots = Comment.objects.bulk_create(objs[replies:]) if replies < len(objs) else []
+            for reply in objs[:replies]:
+                parent = self.rng.choice(roots) if roots else None
+                if parent is not None:
+                    reply.parent_comment_id = parent.pk
+                    reply.scholarship_id_id = parent.scholarship_id_id
+            Comment.objects.bulk_create(objs[:replies])
@@ -0,0 +1,37 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from scholarshiphub_api.models import UploadSession
+from scholarshiphub_api.uploads import discard_session
+
+
+class Command(BaseCommand):
+    help = "Delete resumable SOP uploads that have not received a chunk within SOP_UPLOAD_SESSION_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - settings.SOP_UPLOAD_SESSION_TTL
+        expired = UploadSession.objects.filter(updated_at__lt=cutoff)
+        sessions = 0
+        for session in expired.iterator():
+            sessions += 1
+            if not options['dry_run']:
+                discard_session(session)
+
+        # Temp files whose session row is already gone (e.g. the user was deleted)
+        orphans = 0
+        if os.path.isdir(settings.SOP_UPLOAD_TEMP_DIR):
+            live = {str(pk) for pk in UploadSession.objects.values_list('id', flat=True)}
+            oldest = time.time() - settings.SOP_UPLOAD_SESSION_TTL.total_seconds()
+            for entry in os.scandir(settings.SOP_UPLOAD_TEMP_DIR):
+                if entry.is_file() and entry.name not in live and entry.stat().st_mtime < oldest:
+                    orphans += 1
+                    if not options['dry_run']:
+                        os.remove(entry.path)
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write("%s %d expired upload(s) and %d orphaned file(s)" % (verb, sessions, orphans))
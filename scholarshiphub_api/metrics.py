@@ -0,0 +1,94 @@
+import hmac
+import os
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# With PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py) every worker writes its
+# samples to mmap'd files in that directory and a scrape of any worker sums them all.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_LATENCY = Histogram(
+    'scholarshiphub_http_request_duration_seconds',
+    'Time spent handling a request, by route',
+    ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS = Counter(
+    'scholarshiphub_http_requests',
+    'Requests handled, by route and status code',
+    ['method', 'route', 'status'],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'scholarshiphub_http_requests_in_progress',
+    'Requests currently being handled',
+    multiprocess_mode='livesum',
+)
+REQUEST_QUERIES = Histogram(
+    'scholarshiphub_db_queries_per_request',
+    'Database queries issued while handling a request, by route',
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUESTS_SHED = Counter(
+    'scholarshiphub_http_requests_shed',
+    'Requests turned away by admission control, by route and reason (concurrency or rate)',
+    ['route', 'reason'],
+)
+REGISTRATIONS = Counter('scholarshiphub_registrations', 'Users registered')
+COMMENTS_CREATED = Counter('scholarshiphub_comments_created', 'Comments and replies posted')
+# Set by whichever worker last saw an SOP change, so every worker reports the same value
+SOPS_PENDING_REVIEW = Gauge(
+    'scholarshiphub_sops_pending_review',
+    'Statements of purpose not yet reviewed',
+    multiprocess_mode='mostrecent',
+)
+_pending_review_counted = False
+
+
+def count_pending_reviews():
+    """ Recount the SOPs waiting for review; runs after SOP writes rather than on every scrape """
+    global _pending_review_counted
+    from .models import StatementOfPurpose
+    SOPS_PENDING_REVIEW.set(StatementOfPurpose.objects.filter(is_reviewed=False).count())
+    _pending_review_counted = True
+
+
+def route(request):
+    """ The URL name, so a label never carries ids or other unbounded values """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route or 'unnamed'
+
+
+class _DefaultCollector:
+    """ The single-process default registry, wrapped so a per-scrape registry can include it """
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def _registry():
+    registry = CollectorRegistry()
+    if MULTIPROCESS:
+        MultiProcessCollector(registry)
+    else:
+        registry.register(_DefaultCollector())
+    return registry
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition for scrapes sending ``Authorization: Bearer
+    <METRICS_TOKEN>``. Not served at all until METRICS_TOKEN is set.
+    """
+    token = settings.METRICS_TOKEN
+    if not settings.METRICS_ENABLED or not token:
+        return HttpResponseNotFound()
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer %s' % token):
+        return HttpResponseForbidden()
+    if not _pending_review_counted:
+        # No SOP was written since this worker started
+        count_pending_reviews()
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
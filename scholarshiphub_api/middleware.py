@@ -0,0 +1,458 @@
+import contextvars
+import cProfile
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .admission import acquire_slot, client_ip, release_slot, take_token
+from .metrics import REQUEST_LATENCY, REQUESTS, REQUESTS_IN_PROGRESS, REQUEST_QUERIES, REQUESTS_SHED, route
+from .routers import RoutingState, _routing, replica_aliases
+from .profiling import allow_profile, profile_requested, save_profile, staff_user
+
+logger = logging.getLogger('scholarshiphub_api.requests')
+
+
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name if match is not None and match.url_name else None
+
+
+def logfmt(fields):
+    """ key=value pairs; strings with spaces, quotes or '=' are JSON-quoted """
+    return ' '.join(
+        '%s=%s' % (key, json.dumps(value) if isinstance(value, str) and any(c in value for c in ' "=') else value)
+        for key, value in fields.items()
+    )
+
+
+class QueryStats:
+    """
+    connection.execute_wrapper() that tallies the queries of one request.
+    Statements (for duplicates) and slow queries are only tracked once
+    ``slow_query_s`` is set, as RequestInstrumentationMiddleware does.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.slow_query_s = None
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            self.max = max(self.max, elapsed)
+            if self.slow_query_s is not None:
+                self.tally(sql, params, context, elapsed)
+
+    def tally(self, sql, params, context, elapsed):
+        self.statements[(sql, repr(params))] += 1
+        if elapsed >= self.slow_query_s:
+            logger.warning("slow query %s", logfmt({
+                'url_name': url_name(self.request),
+                'db': context['connection'].alias,
+                'duration_ms': round(elapsed * 1000, 2),
+                'sql': ' '.join(sql.split())[:1000],
+            }))
+
+    @property
+    def duplicates(self):
+        """ Statements executed again with the same SQL and parameters """
+        return sum(count - 1 for count in self.statements.values())
+
+
+# Queries are tallied through a context variable so they are seen from the
+# threads the async ORM runs them in, not only from the request's own thread.
+_query_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_stats(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def watch_queries():
+    """ Put record_query on every connection, open or yet to be opened """
+    connection_created.connect(install_query_stats, dispatch_uid='query_stats')
+    for connection in connections.all(initialized_only=True):
+        install_query_stats(connection)
+
+
+def start_query_stats(request):
+    """
+    ``(stats, token)``: the request's QueryStats, started by the outermost
+    middleware that reads it and shared with the inner ones, which get a
+    None token. Pass the token to stop_query_stats() when the request is done.
+    """
+    stats = _query_stats.get()
+    if stats is not None and stats.request is request:
+        return stats, None
+    stats = QueryStats(request)
+    return stats, _query_stats.set(stats)
+
+
+def stop_query_stats(token):
+    if token is not None:
+        _query_stats.reset(token)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Count the queries, total/max SQL time and duplicate statements of every
+    request. Adds a ``Server-Timing`` header and logs one line per request
+    tagged with the URL name, at WARNING level past SLOW_REQUEST_MS. Runs
+    natively in both sync (WSGI) and async (ASGI) mode.
+
+    Removed from the middleware chain entirely unless REQUEST_INSTRUMENTATION
+    is set, so it costs nothing when disabled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_s = settings.SLOW_REQUEST_MS / 1000.0
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        watch_queries()
+
+    def start(self, request):
+        stats, token = start_query_stats(request)
+        stats.slow_query_s = settings.SLOW_QUERY_MS / 1000.0
+        return stats, token
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = self.start(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_query_stats(token)
+        return self.report(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats, token = self.start(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_query_stats(token)
+        return self.report(request, response, stats, time.perf_counter() - start)
+
+    def report(self, request, response, stats, elapsed):
+        response['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", app;dur=%.2f' % (
+            stats.total * 1000, stats.count, (elapsed - stats.total) * 1000)
+        fields = {
+            'url_name': url_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_queries': stats.count,
+            'db_ms': round(stats.total * 1000, 2),
+            'db_max_ms': round(stats.max * 1000, 2),
+            'db_duplicates': stats.duplicates,
+        }
+        if elapsed >= self.slow_request_s:
+            logger.warning("slow request %s", logfmt(fields), extra=fields)
+        else:
+            logger.info("request %s", logfmt(fields), extra=fields)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, status code and query count of every request in the
+    Prometheus metrics served at /metrics, labelled by URL name rather than
+    path. Removed from the chain unless METRICS_ENABLED is set. Runs natively
+    in both sync (WSGI) and async (ASGI) mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        watch_queries()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_query_stats(request)
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            stop_query_stats(token)
+        self.observe(request, response, time.perf_counter() - start, stats.count)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = start_query_stats(request)
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            stop_query_stats(token)
+        self.observe(request, response, time.perf_counter() - start, stats.count)
+        return response
+
+    def observe(self, request, response, elapsed, queries):
+        name = route(request)
+        REQUEST_LATENCY.labels(request.method, name).observe(elapsed)
+        REQUESTS.labels(request.method, name, str(response.status_code)).inc()
+        REQUEST_QUERIES.labels(name).observe(queries)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let GET/HEAD/OPTIONS requests read from the replicas (see routers.py).
+    A request that writes sets a short-lived cookie that keeps the client's
+    following requests on the primary for REPLICA_PIN_SECONDS, so it reads
+    its own writes despite replication lag. Removed from the chain when no
+    replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(self.use_replica(request))
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(self.use_replica(request))
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(state, response)
+
+    def use_replica(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return False
+        try:
+            pinned_until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return pinned_until <= time.time()
+
+    def pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, str(int(time.time()) + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Turn requests away early instead of letting expensive endpoints queue up
+    and tie down every worker. Routes listed in ADMISSION_LIMITS by URL name
+    get a cap on requests in flight (503 when reached) and a token bucket per
+    client IP (429 when empty), both answered with a ``Retry-After`` header
+    and counted in scholarshiphub_http_requests_shed. Slots and buckets are
+    kept in the default cache, which is per process unless CACHE_BACKEND
+    names a shared one. Removed from the chain unless ADMISSION_CONTROL is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_CONTROL or not settings.ADMISSION_LIMITS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            release_slot(getattr(request, '_admission_slot', None))
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            release_slot(getattr(request, '_admission_slot', None))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs once the URL is resolved, so limits can be looked up by name
+        name = url_name(request)
+        limits = settings.ADMISSION_LIMITS.get(name)
+        if limits is None:
+            return None
+        if 'rate' in limits:
+            retry_after = take_token(name, client_ip(request), limits['rate'], limits.get('burst', 1))
+            if retry_after:
+                return self.shed(name, 'rate', status=429, retry_after=retry_after,
+                                 error="Too many requests. Try again later.")
+        if 'concurrency' in limits:
+            slot = acquire_slot(name, limits['concurrency'])
+            if slot is None:
+                return self.shed(name, 'concurrency', status=503, retry_after=settings.ADMISSION_RETRY_AFTER,
+                                 error="The server is busy. Try again shortly.")
+            request._admission_slot = slot
+        return None
+
+    def shed(self, name, reason, status, retry_after, error):
+        if settings.METRICS_ENABLED:
+            REQUESTS_SHED.labels(name, reason).inc()
+        response = JsonResponse({"error": error}, status=status)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, made able to run natively in async (ASGI) mode so it does not
+    put a sync-only step in front of the async views: the whitenoise pinned in
+    requirements.txt (6.6.0) only declares sync support. Files are still
+    looked up and opened by WhiteNoise, in a thread when running async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Run a single request under cProfile when a staff user asks for it with
+    ``X-Profile: 1`` (or ``?profile=1``). The profile is stored as a
+    RequestProfile and its id returned in the ``X-Profile-Id`` header.
+
+    Requests from anyone else, or over the PROFILE_RATE_LIMIT, are served
+    normally. Only one request per process is profiled at a time. Runs
+    natively in async (ASGI) mode too, where only the event loop thread is
+    profiled: sync code the view hands to worker threads, such as ORM
+    queries, shows up as the time spent awaiting it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = staff_user(request) if profile_requested(request) else None
+        if user is None:
+            return self.get_response(request)
+        if not allow_profile(user) or not self.lock.acquire(blocking=False):
+            return self.throttled(self.get_response(request))
+
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - start
+        finally:
+            self.lock.release()
+        profile = save_profile(request, user, response, profiler, duration)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    async def __acall__(self, request):
+        user = await sync_to_async(staff_user)(request) if profile_requested(request) else None
+        if user is None:
+            return await self.get_response(request)
+        if not await sync_to_async(allow_profile)(user) or not self.lock.acquire(blocking=False):
+            return self.throttled(await self.get_response(request))
+
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - start
+        finally:
+            self.lock.release()
+        profile = await sync_to_async(save_profile)(request, user, response, profiler, duration)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def throttled(self, response):
+        response['X-Profile'] = 'throttled'
+        return response
+
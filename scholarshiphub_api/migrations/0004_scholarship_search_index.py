@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from scholarshiphub_api.search import install_search_index, uninstall_search_index
+
+
+def install(apps, schema_editor):
+    install_search_index(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scholarshiphub_api', '0003_rename_scholarship_comment_scholarship_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
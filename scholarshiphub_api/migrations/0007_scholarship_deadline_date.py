@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scholarshiphub_api', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scholarship',
+            name='deadline_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scholarship',
+            index=models.Index(fields=['deadline_date', 'id'], name='scholarship_deadline_idx'),
+        ),
+    ]
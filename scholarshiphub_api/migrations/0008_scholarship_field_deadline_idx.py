@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scholarshiphub_api', '0007_scholarship_deadline_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scholarship',
+            index=models.Index(fields=['field_of_study', 'deadline_date', 'id'], name='scholarship_field_deadline_idx'),
+        ),
+    ]
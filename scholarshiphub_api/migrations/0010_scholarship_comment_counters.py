@@ -0,0 +1,43 @@
+# Generated by Django 4.2.13 on 2026-10-18 00:34
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def count_existing_comments(apps, schema_editor):
+    """ Fill the new counters from the comments already stored """
+    Scholarship = apps.get_model('scholarshiphub_api', 'Scholarship')
+    Comment = apps.get_model('scholarshiphub_api', 'Comment')
+    counters = (Comment.objects.order_by().values('scholarship_id')
+                .annotate(count=Count('id'), last=Max('created_at')))
+    for row in counters.iterator():
+        Scholarship.objects.filter(pk=row['scholarship_id']).update(comment_count=row['count'], last_comment_at=row['last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scholarshiphub_api', '0009_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scholarship',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='scholarship',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scholarship',
+            index=models.Index(fields=['comment_count', 'id'], name='scholarship_comment_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scholarship',
+            index=models.Index(fields=['last_comment_at', 'id'], name='scholarship_last_comment_idx'),
+        ),
+        migrations.RunPython(count_existing_comments, migrations.RunPython.noop),
+    ]
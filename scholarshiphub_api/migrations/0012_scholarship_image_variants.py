@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scholarshiphub_api', '0011_jwt_revocations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scholarship',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
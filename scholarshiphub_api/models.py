@@ -1,6 +1,10 @@
+import os
+import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group, Permission
 from django.conf import settings
+from django.utils import timezone
+from .dates import parse_deadline
 
 class UserManager(BaseUserManager):
     def create_user(self, first_name, last_name, email, password=None, **extra_fields):
@@ -42,6 +46,20 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+class TokenRevocation(models.Model):
+    """ JWTs issued to the user up to ``revoked_before`` (a Unix time) are rejected """
+    # Not a foreign key: the revocation must outlive a deleted user's tokens
+    user_id = models.BigIntegerField(primary_key=True)
+    revoked_before = models.FloatField()
+
+
+class UsedRefreshToken(models.Model):
+    """ A refresh token already exchanged on /api/token/refresh/, kept until it expires """
+    jti = models.CharField(max_length=32, primary_key=True)
+    user_id = models.BigIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+
 class Scholarship(models.Model):
     title = models.CharField(max_length=255, unique=True)
     description = models.TextField(max_length=3000)
@@ -51,6 +69,36 @@ class Scholarship(models.Model):
     deadline = models.CharField(max_length=500)
     link = models.CharField(max_length=500)
     image = models.ImageField(verbose_name="Scholarship Image", upload_to="scholarship_images/", null=True, blank=True)
+    # Resized copies written by images.py: {'source': image name, 'variants': [[width, format, name], ...]}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Parsed from ``deadline`` on save; NULL when the text has no recognisable date
+    deadline_date = models.DateField(null=True, blank=True, editable=False)
+    # Maintained by counters.py with F() updates as comments are added and deleted
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    COUNTER_FIELDS = ('comment_count', 'last_comment_at')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deadline_date', 'id'], name='scholarship_deadline_idx'),
+            models.Index(fields=['field_of_study', 'deadline_date', 'id'], name='scholarship_field_deadline_idx'),
+            models.Index(fields=['comment_count', 'id'], name='scholarship_comment_count_idx'),
+            models.Index(fields=['last_comment_at', 'id'], name='scholarship_last_comment_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.deadline_date = parse_deadline(self.deadline)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'deadline' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'deadline_date'}
+        elif update_fields is None and not self._state.adding:
+            # The counters on this instance may be stale; never write them back over concurrent updates
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 class Comment(models.Model):
     scholarship_id = models.ForeignKey(Scholarship, related_name='comments', on_delete=models.CASCADE)
@@ -69,4 +117,69 @@ class StatementOfPurpose(models.Model):
     reviewed_sop = models.FileField(upload_to='reviewed_sop/', null=True, blank=True)
 
 
-
+class UploadSession(models.Model):
+    """ A resumable, chunked upload of a Statement of Purpose file """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    sop = models.ForeignKey(StatementOfPurpose, null=True, blank=True, on_delete=models.CASCADE)
+    title = models.CharField(max_length=255, blank=True)
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Set while a chunk is being written (uploads.claim_session)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.SOP_UPLOAD_TEMP_DIR, str(self.id))
+
+    @property
+    def expires_at(self):
+        return self.updated_at + settings.SOP_UPLOAD_SESSION_TTL
+
+
+class Job(models.Model):
+    """ A unit of background work, claimed and executed by ``manage.py run_workers`` """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+
+class RequestProfile(models.Model):
+    """ cProfile output of one request, recorded on demand for a staff user """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    url_name = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    # Top functions by cumulative time: [{function, calls, tottime_ms, cumtime_ms}, ...]
+    top_functions = models.JSONField(default=list)
+    # Marshalled pstats data, the format written by pstats.Stats.dump_stats()
+    stats = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
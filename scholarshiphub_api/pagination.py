@@ -0,0 +1,274 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from drf_yasg import openapi
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, _positive_int, _reverse_ordering
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Integers outside a BIGINT overflow the query parameter
+POSITION_INT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _position_value(field, value):
+    if value is None:
+        if not field.null:
+            raise ValueError
+        return None
+    value = field.to_python(value)
+    if isinstance(value, int) and not POSITION_INT_RANGE[0] <= value <= POSITION_INT_RANGE[1]:
+        raise ValueError
+    return value
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination for the list endpoints.
+
+    Pages are fetched with ``WHERE <key> > <last seen> ORDER BY <key> LIMIT n``
+    so the cost of a page does not depend on how deep the client has scrolled,
+    and no ``COUNT(*)`` is ever issued. Cursors are opaque base64 tokens.
+
+    The key is the whole ordering, which must end with a unique column (the
+    orderings all end with ``id``): the cursor holds every value of the last
+    row and pages continue with a row-wise comparison, so rows sharing a
+    leading value are neither repeated nor skipped however many there are.
+    """
+    page_size = settings.PAGINATION_PAGE_SIZE
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    ordering = ('id',)
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def is_requested(self, request):
+        """ Pagination is opt-in so existing clients keep receiving plain lists """
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    # CursorPagination.paginate_queryset, split around the one query it runs so
+    # the async views can await that query instead.
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([obj async for obj in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        """ The sliced queryset holding this page plus one row to find the next position """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (self.offset, self.reverse, self.current_position) = (0, False, None)
+        else:
+            (self.offset, self.reverse, self.current_position) = self.cursor
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            queryset = queryset.filter(self.following_rows(queryset))
+
+        return queryset[self.offset:self.offset + self.page_size + 1]
+
+    def following_rows(self, queryset):
+        """
+        Q for the rows after ``current_position`` in the direction of travel:
+        ``k1 > p1 OR (k1 = p1 AND k2 > p2) OR ...``, with ``<`` for the keys
+        walked in descending order. NULLs sort where the database puts them
+        (largest on PostgreSQL, smallest on SQLite and MySQL).
+        """
+        position = self.decode_position(queryset.model)
+        nulls_largest = connections[queryset.db].features.nulls_order_largest
+
+        following, equal = Q(pk__in=[]), Q()
+        for order, value in zip(self.ordering, position):
+            field = order.lstrip('-')
+            greater = order.startswith('-') == self.reverse
+            if value is None:
+                # Only non-null values are beyond a NULL, and only when NULLs sort first
+                if greater != nulls_largest:
+                    following |= equal & Q(**{field + '__isnull': False})
+                equal &= Q(**{field + '__isnull': True})
+            else:
+                beyond = Q(**{field + ('__gt' if greater else '__lt'): value})
+                if greater == nulls_largest:
+                    beyond |= Q(**{field + '__isnull': True})
+                following |= equal & beyond
+                equal &= Q(**{field: value})
+        return following
+
+    def decode_position(self, model):
+        """ The values of ``current_position`` as their ordering fields' types; a forged cursor is a 404, not a failing query """
+        try:
+            position = json.loads(self.current_position)
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return [_position_value(model._meta.get_field(order.lstrip('-')), value)
+                    for order, value in zip(self.ordering, position)]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """ Every ordering value of a row (model instance or .values() dict), as the cursor position """
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            values.append(None if value is None else str(value))
+        return json.dumps(values)
+
+    def set_page(self, results):
+        """ Record the page and the next/previous positions from the fetched rows """
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if self.reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (self.current_position is not None) or (self.offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = self.current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (self.current_position is not None) or (self.offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = self.current_position
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+
+class PagePagination(BasePagination):
+    """
+    Page-number pagination for result sets that are ordered by a computed value
+    (e.g. search rank) and therefore cannot be keyset-paginated. One extra row is
+    fetched to detect a following page, so no ``COUNT(*)`` is needed either.
+    """
+    page_size = settings.PAGINATION_PAGE_SIZE
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    # Also keeps the OFFSET within the database's integer range
+    max_offset = settings.PAGINATION_MAX_OFFSET
+    invalid_page_message = "Invalid page."
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.page_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([obj async for obj in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_number = self._get_int(request, self.page_query_param, 1, None)
+        self.page_size = self._get_int(request, self.page_size_query_param, self.page_size, self.max_page_size)
+        offset = (self.page_number - 1) * self.page_size
+        if offset > self.max_offset:
+            raise NotFound(self.invalid_page_message)
+        return queryset[offset:offset + self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def _get_int(self, request, param, default, cutoff):
+        try:
+            return _positive_int(request.query_params[param], strict=True, cutoff=cutoff)
+        except (KeyError, ValueError):
+            return default
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+
+def paginate(request, queryset, serializer_class, view=None, ordering=None, pagination_class=None):
+    """
+    Return a paginated Response when the client asked for a page, otherwise None
+    so the caller can fall back to its unpaginated behaviour.
+    """
+    paginator = KeysetPagination(ordering=ordering) if pagination_class is None else pagination_class()
+    if not paginator.is_requested(request):
+        return None
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = serializer_class(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+async def apaginate(request, queryset, ordering=None, pagination_class=None):
+    """
+    Async counterpart of ``paginate`` for the views in async_views.py: fetch the
+    requested page with the async ORM and return the paginator (holding it in
+    ``page``), or None when no page was asked for.
+    """
+    paginator = KeysetPagination(ordering=ordering) if pagination_class is None else pagination_class()
+    if not paginator.is_requested(request):
+        return None
+    await paginator.apaginate_queryset(queryset, request)
+    return paginator
+
+
+pagination_parameters = [
+    openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor returned in the `next`/`previous` links", type=openapi.TYPE_STRING),
+    openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page (enables pagination)", type=openapi.TYPE_INTEGER),
+]
+
+page_parameters = [
+    openapi.Parameter('page', openapi.IN_QUERY, description="Page number (enables pagination)", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page (enables pagination)", type=openapi.TYPE_INTEGER),
+]
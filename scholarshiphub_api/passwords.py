@@ -0,0 +1,87 @@
+"""
+Password hashing with bounded concurrency.
+
+Verifying a password costs tens to hundreds of milliseconds of CPU by design.
+The hashes run in a small per-process pool of PASSWORD_HASH_WORKERS threads
+(hashlib's PBKDF2 and scrypt release the GIL). ``_run`` blocks the request
+thread until its hash is done, so the pool does not free the request's thread
+or worker; it only caps how many hashes run at once. At most
+PASSWORD_HASH_QUEUE hashes may be waiting, and past that PasswordHashingBusy
+is raised instead of queuing, so a login burst cannot take every core away
+from the catalog reads.
+
+Only hashing happens in the pool; the database is used from the caller's thread.
+"""
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password as _check_password, get_hasher, make_password
+
+_executor = None
+_slots = None
+_dummy_hashes = {}
+_lock = threading.Lock()
+
+
+class PasswordHashingBusy(Exception):
+    """ Too many hashes are already waiting for the pool """
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE)
+    return _executor, _slots
+
+
+def _run(fn, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingBusy
+    try:
+        return executor.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+def _verify(password, encoded):
+    """ Whether ``password`` matches, and its rehash when the hash is outdated """
+    outdated = []
+    correct = _check_password(password, encoded, setter=outdated.append)
+    return correct, make_password(password) if outdated else None
+
+
+def dummy_hash():
+    """ A hash of a random password in the preferred format, for users that do not exist """
+    algorithm = get_hasher().algorithm
+    if algorithm not in _dummy_hashes:
+        _dummy_hashes[algorithm] = _run(make_password, secrets.token_urlsafe())
+    return _dummy_hashes[algorithm]
+
+
+def check_user_password(user, password):
+    """
+    User.check_password() through the pool. Passing ``None`` for an unknown
+    user verifies against a dummy hash, so that answer takes as long as a
+    wrong password. A correct password stored with an outdated hasher (not
+    first in PASSWORD_HASHERS, or too few iterations) is rehashed and saved.
+    """
+    if user is None:
+        _run(_verify, password, dummy_hash())
+        return False
+    correct, rehashed = _run(_verify, password, user.password)
+    if rehashed is not None:
+        user.password = rehashed
+        user.save(update_fields=['password'])
+    return correct
+
+
+def set_user_password(user, password):
+    """ User.set_password() through the pool; the caller saves the user """
+    user.password = _run(make_password, password)
+    # AbstractBaseUser keeps the raw password for password_changed()
+    user._password = password
+
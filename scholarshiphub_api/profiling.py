@@ -0,0 +1,92 @@
+import marshal
+import os
+import pstats
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from .models import RequestProfile
+
+
+def profile_requested(request):
+    return request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+
+
+def staff_user(request):
+    """
+    The staff user making the request, or None. Middleware runs before DRF
+    authenticates the view, so the API authenticators are tried here as well
+    as the session user. A result is handed on to DRF the way
+    APIClient.force_authenticate() does, so the view does not authenticate
+    the request a second time.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        user = None
+        for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authenticator_class().authenticate(request)
+            except exceptions.APIException:
+                # Left for the view to reject with the authenticator's own error
+                return None
+            if result is not None:
+                user, request._force_auth_user, request._force_auth_token = result[0], result[0], result[1]
+                break
+    return user if user is not None and user.is_staff else None
+
+
+def _within_limit(key, limit):
+    window = int(time.time() // 3600)
+    key = 'profiling:rate:%s:%d' % (key, window)
+    cache.add(key, 0, 3600)
+    try:
+        return cache.incr(key) <= limit
+    except ValueError:
+        return False
+
+
+def allow_profile(user):
+    """ Hourly limits per staff user and for the whole site """
+    return (_within_limit('user:%s' % user.pk, settings.PROFILE_RATE_LIMIT)
+            and _within_limit('all', settings.PROFILE_GLOBAL_RATE_LIMIT))
+
+
+def top_functions(stats, limit):
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            'function': pstats.func_std_string(func),
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        }
+        for func, (primitive_calls, calls, tottime, cumtime, callers) in rows
+    ]
+
+
+def project_functions(functions):
+    """ The entries of ``top_functions`` that live in this project rather than in Django or the stdlib """
+    base_dir = str(settings.BASE_DIR) + os.sep
+    return [entry for entry in functions if entry['function'].startswith(base_dir)]
+
+
+def save_profile(request, user, response, profiler, duration):
+    profiler.create_stats()
+    match = getattr(request, 'resolver_match', None)
+    profile = RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        url_name=(match.url_name or '') if match is not None else '',
+        status_code=response.status_code,
+        duration_ms=round(duration * 1000, 3),
+        top_functions=top_functions(profiler.stats, settings.PROFILE_TOP_FUNCTIONS),
+        stats=marshal.dumps(profiler.stats),
+    )
+    # Keep only the most recent profiles
+    limit = settings.PROFILE_MAX_STORED
+    cutoff = list(RequestProfile.objects.order_by('-id').values_list('id', flat=True)[limit:limit + 1])
+    if cutoff:
+        RequestProfile.objects.filter(id__lte=cutoff[0]).delete()
+    return profile
@@ -0,0 +1,104 @@
+import contextlib
+import contextvars
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Set by ReplicaRoutingMiddleware for the duration of a request. Outside a request
+# (management commands, workers) it is None and every query goes to the primary.
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+_health = {}
+
+
+class RoutingState:
+    """ Whether the current request may read from a replica, and whether it has written """
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """ Route the reads inside the block to the primary """
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    use_replica, state.use_replica = state.use_replica, False
+    try:
+        yield
+    finally:
+        state.use_replica = use_replica
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def _check_replica(alias):
+    """ The replica answers and, on Postgres, has replayed WAL within REPLICA_MAX_LAG_SECONDS """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+                lag = cursor.fetchone()[0]
+                if lag is not None and lag > settings.REPLICA_MAX_LAG_SECONDS:
+                    logger.warning("replica %s is %.1fs behind the primary", alias, lag)
+                    return False
+            else:
+                cursor.execute("SELECT 1")
+        return True
+    except DatabaseError as exc:
+        logger.warning("replica %s is unavailable: %s", alias, exc)
+        connection.close()
+        return False
+
+
+def replica_is_healthy(alias):
+    """ Cached per process for REPLICA_HEALTH_CHECK_INTERVAL seconds """
+    healthy, checked_at = _health.get(alias, (None, 0.0))
+    now = time.monotonic()
+    if healthy is None or now - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        healthy = _check_replica(alias)
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+class ReplicaRouter:
+    """
+    Send the reads of safe-method requests to a healthy replica
+    (DATABASE_REPLICA_URLS); everything else uses the primary. Once a request
+    writes, or while it is inside a transaction on the primary, its reads
+    stay on the primary too.
+    """
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        healthy = [alias for alias in replica_aliases() if replica_is_healthy(alias)]
+        return random.choice(healthy) if healthy else None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
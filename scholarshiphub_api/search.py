@@ -0,0 +1,152 @@
+import re
+from django.db import connections
+from django.db.models import Q
+
+SCHOLARSHIP_TABLE = 'scholarshiphub_api_scholarship'
+FTS_TABLE = 'scholarshiphub_api_scholarship_fts'
+FTS_COLUMNS = ('title', 'field_of_study', 'description', 'eligibility', 'benefit', 'deadline')
+# bm25() weights, one per FTS column: title > field_of_study > description > the rest
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 1.0, 1.0)
+
+POSTGRES_SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(field_of_study, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C') ||
+    setweight(to_tsvector('english', coalesce(eligibility, '') || ' ' || coalesce(benefit, '') || ' ' || coalesce(deadline, '')), 'D')
+"""
+
+
+class SubstringSearchBackend:
+    """ Unindexed ICONTAINS search, kept for databases without a full-text index """
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(eligibility__icontains=query) |
+            Q(benefit__icontains=query) |
+            Q(field_of_study__icontains=query) |
+            Q(deadline__icontains=query)
+        ).order_by('id')
+
+
+def search_terms(query):
+    """ The words of a query; each is matched as a prefix, like the ICONTAINS search did for "Master" in "MasterCard" """
+    return re.findall(r'\w+', query)
+
+
+class PostgresSearchBackend:
+    """ Ranked search over the GIN-indexed ``search_vector`` column """
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = ' & '.join('%s:*' % term for term in terms)
+        return queryset.extra(
+            select={'rank': "ts_rank(search_vector, to_tsquery('english', %s))"},
+            select_params=[tsquery],
+            where=["search_vector @@ to_tsquery('english', %s)"],
+            params=[tsquery],
+            order_by=['-rank', 'id'],
+        )
+
+
+class SQLiteSearchBackend:
+    """ Ranked search over the FTS5 shadow table, ordered by bm25() """
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join('"%s"*' % term for term in terms)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return queryset.extra(
+            select={'rank': 'bm25(%s, %s)' % (FTS_TABLE, weights)},
+            tables=[FTS_TABLE],
+            where=[
+                '%s.rowid = %s.id' % (FTS_TABLE, SCHOLARSHIP_TABLE),
+                '%s MATCH %%s' % FTS_TABLE,
+            ],
+            params=[match],
+            order_by=['rank', 'id'],
+        )
+
+
+_backends = {}
+
+
+def get_search_backend(using='default'):
+    """ Pick the best search backend available on the given database """
+    if using not in _backends:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            backend = SQLiteSearchBackend()
+        else:
+            backend = SubstringSearchBackend()
+        _backends[using] = backend
+    return _backends[using]
+
+
+def search_scholarships(queryset, query):
+    return get_search_backend(queryset.db).search(queryset, query)
+
+
+def _sqlite_supports_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def install_search_index(schema_editor):
+    """
+    Create the full-text index for the scholarship table. Called from the
+    migration and again after every migrate run, because SQLite drops the
+    triggers whenever Django rebuilds the scholarship table.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE %s ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS (%s) STORED" % (SCHOLARSHIP_TABLE, POSTGRES_SEARCH_VECTOR)
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS scholarship_search_vector_gin ON %s USING gin (search_vector)" % SCHOLARSHIP_TABLE
+        )
+    elif connection.vendor == 'sqlite' and _sqlite_supports_fts5(schema_editor):
+        columns = ', '.join(FTS_COLUMNS)
+        new_values = ', '.join('new.%s' % column for column in FTS_COLUMNS)
+        old_values = ', '.join('old.%s' % column for column in FTS_COLUMNS)
+        existing = set(connection.introspection.table_names())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [SCHOLARSHIP_TABLE])
+            triggers = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE %s USING fts5(%s, content='%s', content_rowid='id', tokenize='porter unicode61')"
+                % (FTS_TABLE, columns, SCHOLARSHIP_TABLE)
+            )
+        statements = {
+            FTS_TABLE + '_ai': "AFTER INSERT ON %s BEGIN INSERT INTO %s(rowid, %s) VALUES (new.id, %s); END"
+                % (SCHOLARSHIP_TABLE, FTS_TABLE, columns, new_values),
+            FTS_TABLE + '_ad': "AFTER DELETE ON %s BEGIN INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.id, %s); END"
+                % (SCHOLARSHIP_TABLE, FTS_TABLE, FTS_TABLE, columns, old_values),
+            FTS_TABLE + '_au': "AFTER UPDATE ON %s BEGIN INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.id, %s); "
+                "INSERT INTO %s(rowid, %s) VALUES (new.id, %s); END"
+                % (SCHOLARSHIP_TABLE, FTS_TABLE, FTS_TABLE, columns, old_values, FTS_TABLE, columns, new_values),
+        }
+        missing = [name for name in statements if name not in triggers]
+        for name in missing:
+            schema_editor.execute('CREATE TRIGGER %s %s' % (name, statements[name]))
+        if missing:
+            schema_editor.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (FTS_TABLE, FTS_TABLE))
+
+
+def uninstall_search_index(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS scholarship_search_vector_gin")
+        schema_editor.execute("ALTER TABLE %s DROP COLUMN IF EXISTS search_vector" % SCHOLARSHIP_TABLE)
+    elif connection.vendor == 'sqlite':
+        for suffix in ('_ai', '_ad', '_au'):
+            schema_editor.execute('DROP TRIGGER IF EXISTS %s%s' % (FTS_TABLE, suffix))
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
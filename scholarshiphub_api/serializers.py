@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from .models import User, Scholarship, Comment, StatementOfPurpose
+from django.conf import settings
+from django.utils import timezone
+from .models import User, Scholarship, Comment, StatementOfPurpose, UploadSession, RequestProfile
+from .images import image_srcset
+from .filters import SCHOLARSHIP_ORDERINGS
+from .passwords import set_user_password
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -16,16 +21,117 @@ class UserSerializer(serializers.ModelSerializer):
             email=validated_data['email'],
             username=validated_data['username']
         )
-        user.set_password(validated_data['password'])
+        set_user_password(user, validated_data['password'])
         user.save()
         return user
 
 
 
 class ScholarshipSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+    expired = serializers.SerializerMethodField()
+
     class Meta:
         model = Scholarship
-        fields = ['id', 'title', 'description', 'eligibility','benefit', 'field_of_study', 'deadline', 'link', 'image']
+        fields = ['id', 'title', 'description', 'eligibility','benefit', 'field_of_study', 'deadline', 'deadline_date', 'expired', 'link', 'image', 'image_srcset', 'comment_count', 'last_comment_at']
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image.name, obj.image_variants)
+
+    def get_expired(self, obj):
+        """ None when the deadline could not be parsed """
+        if obj.deadline_date is None:
+            return None
+        return obj.deadline_date < timezone.localdate()
+
+
+class ScholarshipListSerializer(ScholarshipSerializer):
+    """
+    Scholarships in catalog lists: any of the ScholarshipSerializer fields
+    plus ``description_snippet``, rendering only those passed as ``fields``.
+    """
+    description_snippet = serializers.SerializerMethodField()
+
+    class Meta(ScholarshipSerializer.Meta):
+        fields = ScholarshipSerializer.Meta.fields + ['description_snippet']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_description_snippet(self, obj):
+        # select_scholarship_fields() loads just enough of the description to tell whether it was cut
+        text = getattr(obj, 'description_head', None)
+        return description_snippet(obj.description if text is None else text)
+
+
+def description_snippet(text):
+    """ The start of a description, cut at a word boundary """
+    length = settings.SCHOLARSHIP_SNIPPET_LENGTH
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    if not text[length].isspace() and ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip() + '…'
+
+
+# Opt-in shape of list responses (?shape=compact); by default they have every field of ScholarshipSerializer
+SCHOLARSHIP_COMPACT_FIELDS = [
+    'id', 'title', 'description_snippet', 'field_of_study', 'deadline', 'deadline_date', 'expired',
+    'image', 'image_srcset', 'comment_count',
+]
+
+
+class ScholarshipFieldsetSerializer(serializers.Serializer):
+    """
+    Which fields a scholarship list renders, as validated ``fieldset``:
+    the ``shape`` (full by default), narrowed to a comma-separated list of
+    ``fields`` and without the ``exclude`` ones.
+    """
+    shape = serializers.ChoiceField(choices=['compact', 'full'], required=False)
+    fields = serializers.CharField(required=False)
+    exclude = serializers.CharField(required=False, allow_blank=True)
+
+    def _names(self, value, param):
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in ScholarshipListSerializer.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError({param: "Unknown field(s): %s" % ', '.join(unknown)})
+        return names
+
+    def validate(self, data):
+        if 'fields' in data:
+            fieldset = self._names(data['fields'], 'fields')
+        elif data.get('shape') == 'compact':
+            fieldset = SCHOLARSHIP_COMPACT_FIELDS
+        else:
+            fieldset = ScholarshipSerializer.Meta.fields
+        excluded = self._names(data.get('exclude', ''), 'exclude')
+        data['fieldset'] = [name for name in ScholarshipListSerializer.Meta.fields if name in fieldset and name not in excluded]
+        return data
+
+
+class ScholarshipFilterSerializer(ScholarshipFieldsetSerializer):
+    """ Query parameters accepted by the scholarship list """
+    deadline_after = serializers.DateField(required=False)
+    deadline_before = serializers.DateField(required=False)
+    expired = serializers.BooleanField(required=False)
+    ordering = serializers.ChoiceField(choices=list(SCHOLARSHIP_ORDERINGS), required=False)
+
+
+class ScholarshipFacetFilterSerializer(ScholarshipFilterSerializer):
+    """ Query parameters accepted by the faceted scholarship filter """
+    q = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    field_of_study = serializers.ListField(child=serializers.CharField(max_length=255), required=False, max_length=50)
+
+
+class ScholarshipImportSerializer(ScholarshipSerializer):
+    """ Row validation for bulk imports; titles may already exist because rows are upserted """
+    class Meta(ScholarshipSerializer.Meta):
+        extra_kwargs = {'title': {'validators': []}}
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -44,6 +150,12 @@ class CommentSerializer(serializers.ModelSerializer):
         return []
 
 
+class CommentThreadSerializer(CommentSerializer):
+    """ Serializes a comment tree prepared by utils.build_comment_tree without further queries """
+    def get_replies(self, obj):
+        return CommentThreadSerializer(getattr(obj, 'thread_replies', []), many=True).data
+
+
 class StatementOfPurposeSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -52,6 +164,31 @@ class StatementOfPurposeSerializer(serializers.ModelSerializer):
         fields = ['user', 'title', 'sop_file', 'submission_date', 'is_reviewed', 'reviewed_sop']
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    sop = serializers.PrimaryKeyRelatedField(queryset=StatementOfPurpose.objects.all(), required=False, allow_null=True)
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'title', 'filename', 'length', 'offset', 'sop', 'created_at', 'expires_at']
+        read_only_fields = ['id', 'offset', 'created_at']
+
+    def validate_length(self, value):
+        if value > settings.SOP_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError("File exceeds the maximum size of %d bytes." % settings.SOP_UPLOAD_MAX_SIZE)
+        return value
+
+    def validate_sop(self, value):
+        if value is not None and value.user_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("You do not have permission to edit this SOP.")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('sop') is None and not attrs.get('title'):
+            raise serializers.ValidationError({'title': ["This field is required."]})
+        return attrs
+
+
 class ReviewSOPSerializer(serializers.ModelSerializer):
     class Meta:
         model = StatementOfPurpose
@@ -97,4 +234,17 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 
 class ResetPasswordEmailSerializer(serializers.Serializer):
-    email = serializers.EmailField(required=True)
\ No newline at end of file
+    email = serializers.EmailField(required=True)
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=True)
+
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    username = serializers.ReadOnlyField(source='user.username')
+
+    class Meta:
+        model = RequestProfile
+        fields = ['id', 'username', 'method', 'path', 'url_name', 'status_code', 'duration_ms', 'created_at', 'top_functions']
+
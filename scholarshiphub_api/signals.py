@@ -1,9 +1,22 @@
-from django.core.mail import EmailMultiAlternatives
 from django.dispatch import receiver
 from django.urls import reverse
-from django_rest_passwordreset.signals import reset_password_token_created
+from django_rest_passwordreset.signals import post_password_reset, reset_password_token_created
 from django.conf import settings
 from rest_framework.reverse import reverse_lazy
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate, pre_save, post_save, post_delete
+from .caching import bump_catalog_version
+from .jobs import enqueue_email
+from .images import schedule_variants
+from .metrics import COMMENTS_CREATED, REGISTRATIONS, count_pending_reviews
+from .models import Comment, Scholarship, StatementOfPurpose, User
+from .authentication import PRIVILEGE_CLAIM_FIELDS, invalidate_token_user, revoke_user_tokens
+from rest_framework.authtoken.models import Token
+from .search import install_search_index
+
+SEARCH_INDEX_MIGRATION = '0004_scholarship_search_index'
+
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
@@ -14,10 +27,89 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
 
     email_message = f"Click the following link to reset your password: {reset_password_url}"
 
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         "Reset Your Password",
         email_message,
-        settings.DEFAULT_FROM_EMAIL,
         [reset_password_token.user.email]
     )
-    msg.send()
+
+
+@receiver(post_migrate)
+def reinstall_search_index(sender, using, **kwargs):
+    """ SQLite drops the full-text triggers whenever a migration rebuilds the scholarship table """
+    if sender.name != 'scholarshiphub_api':
+        return
+    connection = connections[using]
+    if (sender.label, SEARCH_INDEX_MIGRATION) not in MigrationRecorder(connection).applied_migrations():
+        return
+    with connection.schema_editor() as schema_editor:
+        install_search_index(schema_editor)
+
+
+@receiver(post_save, sender=Scholarship)
+@receiver(post_delete, sender=Scholarship)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Scholarship)
+def generate_image_variants(sender, instance, **kwargs):
+    if instance.image:
+        schedule_variants(instance.image.name)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(post_password_reset)
+def revoke_reset_user_tokens(sender, user, **kwargs):
+    revoke_user_tokens(user.pk)
+
+
+@receiver(pre_save, sender=User)
+def note_privilege_change(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & set(PRIVILEGE_CLAIM_FIELDS)):
+        return
+    stored = User.objects.filter(pk=instance.pk).values_list(*PRIVILEGE_CLAIM_FIELDS).first()
+    instance._privileges_changed = stored is not None and stored != tuple(getattr(instance, f) for f in PRIVILEGE_CLAIM_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_privilege_change(sender, instance, created, **kwargs):
+    """ Access tokens carry is_staff/is_superuser/is_active, so tokens issued before a change must stop working """
+    if not created and getattr(instance, '_privileges_changed', False):
+        instance._privileges_changed = False
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_token_user(sender, instance, **kwargs):
+    """ Any change to the user (password, is_staff, profile) must not be served from a stale cache """
+    invalidate_token_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def count_registration(sender, created, **kwargs):
+    if created:
+        REGISTRATIONS.inc()
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, created, **kwargs):
+    if created:
+        COMMENTS_CREATED.inc()
+
+
+@receiver(post_save, sender=StatementOfPurpose)
+@receiver(post_delete, sender=StatementOfPurpose)
+def recount_pending_reviews(sender, **kwargs):
+    if settings.METRICS_ENABLED:
+        transaction.on_commit(count_pending_reviews)
@@ -1,3 +1,1469 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from importlib import import_module
+from unittest import mock
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from . import jobs, routers
+from .admission import acquire_slot, release_slot
+from .counters import reconcile_comment_counters
+from .authentication import (CachedTokenAuthentication, JWTAuthentication, TokenUserCache, _generation_key, issue_tokens,
+                             revoke_user_tokens, token_user_cache)
+from .fast_serializers import ScholarshipValuesSerializer, CommentValuesSerializer, UserValuesSerializer, StatementOfPurposeValuesSerializer
+from .filters import _facet_cache_key, scholarship_facets, select_scholarship_fields
+from .middleware import StaticFilesMiddleware, install_query_stats, record_query
+from .models import User, Scholarship, Comment, StatementOfPurpose, Job, UploadSession, RequestProfile
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
+from .search import SQLiteSearchBackend, get_search_backend
+from .serializers import (ScholarshipListSerializer, ScholarshipSerializer, SCHOLARSHIP_COMPACT_FIELDS, CommentSerializer,
+                          UserSerializer, StatementOfPurposeSerializer)
+from .uploads import CHUNK_CONTENT_TYPE, append_chunk, claim_session
 
-# Create your tests here.
+
+def create_scholarship(title="MasterCard Scholarship for STEM", **kwargs):
+    fields = {
+        'description': "Scholarship targeted at STEM professionals",
+        'eligibility': "Graduates",
+        'benefit': "Full tuition",
+        'field_of_study': "Engineering",
+        'deadline': "30 June 2025",
+        'link': "https://example.com",
+    }
+    fields.update(kwargs)
+    return Scholarship.objects.create(title=title, **fields)
+
+
+class ScholarshipCommentThreadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.scholarship = create_scholarship()
+        self.url = reverse('get-scholarship-comments', kwargs={'id': self.scholarship.id})
+
+    def add_thread(self, depth):
+        parent = None
+        for _ in range(depth):
+            parent = Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Reply", parent_comment=parent)
+
+    def test_replies_are_nested_and_not_repeated_at_top_level(self):
+        root = Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Question")
+        reply = Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Answer", parent_comment=root)
+        Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Thanks", parent_comment=reply)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['id'] for c in response.data], [root.id])
+        self.assertEqual(response.data[0]['username'], "ada")
+        self.assertEqual(response.data[0]['replies'][0]['id'], reply.id)
+        self.assertEqual(response.data[0]['replies'][0]['replies'][0]['content'], "Thanks")
+
+    def test_comment_lists_are_ordered_by_creation(self):
+        now = timezone.now()
+        comments = [Comment.objects.create(scholarship_id=self.scholarship, user=self.user, content="Comment %d" % i) for i in range(4)]
+        # Ids and creation times in different orders, with a tie broken by id
+        for comment, minutes in zip(comments, [3, 1, 2, 1]):
+            Comment.objects.filter(pk=comment.pk).update(created_at=now - timedelta(minutes=10 - minutes))
+        expected = [comments[1].id, comments[3].id, comments[2].id, comments[0].id]
+        for url_name in ['get-scholarships', 'async-get-comments']:
+            with self.subTest(url_name):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual([comment['id'] for comment in response.json()], expected)
+
+    def test_query_count_is_constant_as_thread_grows(self):
+        self.add_thread(3)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+        for _ in range(10):
+            self.add_thread(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 11)
+
+    def test_unknown_scholarship_returns_404(self):
+        response = self.client.get(reverse('get-scholarship-comments', kwargs={'id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("Admin", "User", "admin@example.com", "password", username="admin")
+        password = cls.admin.password
+        User.objects.bulk_create(
+            [User(first_name="User", last_name=str(i), email="user%d@example.com" % i, username="user%d" % i, password=password)
+             for i in range(20000)],
+            batch_size=2000,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_export_streams_every_row(self):
+        response = self.client.get(reverse('user-list'), {'format': 'csv'})
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,first_name,last_name,email,username,is_verified,is_staff,date_joined")
+        self.assertEqual(len(lines), 20002)
+
+    @override_settings(EXPORT_CHUNK_SIZE=500)
+    def test_ndjson_export_memory_is_bounded(self):
+        response = self.client.get(reverse('admin-export', kwargs={'resource': 'users'}), {'format': 'ndjson'})
+
+        tracemalloc.start()
+        rows = 0
+        for chunk in response.streaming_content:
+            rows += chunk.count(b'\n')
+            last = chunk
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertEqual(rows, 20001)
+        self.assertEqual(json.loads(last.splitlines()[-1])['username'], "user19999")
+        # The whole export is several MB; streaming must only ever hold a few chunks
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('admin-export', kwargs={'resource': 'users'}))
+        self.assertEqual(response.status_code, 401)
+
+
+class FastSerializerParityTests(TestCase):
+    """ The .values() serializers and the orjson renderer produce the same JSON as DRF """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada"),
+            User.objects.create_user("Zoë", "Ångström", "zoe@example.com", "password", username="zoë\u2028", is_verified=True),
+        ]
+        create_scholarship(image="scholarship_images/stem.png", description="word " * 100)
+        create_scholarship(title="Rolling Fellowship", deadline="Rolling admissions", description="Short")
+        create_scholarship(title="Future Award", deadline="1 June 2099", link="https://example.com/é")
+        scholarships = list(Scholarship.objects.order_by('id'))
+        for scholarship in scholarships[:2]:
+            root = Comment.objects.create(scholarship_id=scholarship, user=cls.users[0], content="Question")
+            reply = Comment.objects.create(scholarship_id=scholarship, user=cls.users[1], content="Answer", parent_comment=root)
+            Comment.objects.create(scholarship_id=scholarship, user=cls.users[0], content="Thanks", parent_comment=reply)
+            Comment.objects.create(scholarship_id=scholarship, user=cls.users[1], content="Also", parent_comment=root)
+        Scholarship.objects.filter(pk=scholarships[0].pk).update(comment_count=4, last_comment_at=timezone.now())
+        StatementOfPurpose.objects.create(user=cls.users[0], title="Mine", sop_file="sop_files/mine.pdf")
+        StatementOfPurpose.objects.create(user=cls.users[1], title="Reviewed", sop_file="sop_files/r.pdf", reviewed_sop="reviewed_sop/r.pdf")
+
+    def assertSameJSON(self, fast, drf):
+        self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_scholarships(self):
+        queryset = Scholarship.objects.order_by('id')
+        for fieldset in [ScholarshipSerializer.Meta.fields, SCHOLARSHIP_COMPACT_FIELDS, ['title', 'expired', 'description_snippet']]:
+            with self.subTest(fieldset=fieldset):
+                self.assertSameJSON(
+                    ScholarshipValuesSerializer(ScholarshipValuesSerializer.values(queryset, fieldset), fields=fieldset).data,
+                    ScholarshipListSerializer(select_scholarship_fields(queryset, fieldset), many=True, fields=fieldset).data,
+                )
+
+    def test_comments(self):
+        queryset = Comment.objects.order_by('created_at', 'id')
+        rows = CommentValuesSerializer.values(queryset)
+        self.assertSameJSON(CommentValuesSerializer(rows).data, CommentSerializer(queryset, many=True).data)
+
+    def test_comment_page_reads_one_query_per_reply_level(self):
+        queryset = Comment.objects.filter(parent_comment=None).order_by('id')
+        rows = CommentValuesSerializer.values(Comment.objects.all())
+        page = list(rows.filter(parent_comment=None).order_by('id'))
+        with self.assertNumQueries(3):
+            data = CommentValuesSerializer(page, replies=rows).data
+        self.assertSameJSON(data, CommentSerializer(queryset, many=True).data)
+
+    def test_users(self):
+        queryset = User.objects.order_by('id')
+        self.assertSameJSON(UserValuesSerializer(UserValuesSerializer.values(queryset)).data, UserSerializer(queryset, many=True).data)
+
+    def test_statements_of_purpose(self):
+        queryset = StatementOfPurpose.objects.order_by('id')
+        self.assertSameJSON(
+            StatementOfPurposeValuesSerializer(StatementOfPurposeValuesSerializer.values(queryset)).data,
+            StatementOfPurposeSerializer(queryset, many=True).data,
+        )
+
+    def test_lists_have_every_field_unless_a_smaller_shape_is_asked_for(self):
+        full = ScholarshipSerializer.Meta.fields
+        for url_name in ['get-all-scholarships', 'search', 'async-get-all-scholarships', 'async-search']:
+            with self.subTest(url_name):
+                url = reverse(url_name)
+                self.assertCountEqual(self.client.get(url).json()[0], full)
+                self.assertCountEqual(self.client.get(url, {'shape': 'full'}).json()[0], full)
+                self.assertCountEqual(self.client.get(url, {'shape': 'compact'}).json()[0], SCHOLARSHIP_COMPACT_FIELDS)
+                self.assertCountEqual(self.client.get(url, {'fields': 'title,id'}).json()[0], ['id', 'title'])
+
+    def test_list_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser("Admin", "User", "admin@example.com", "password", username="admin"))
+        response = client.get(reverse('get-all-scholarships'), {'ordering': '-comment_count', 'page_size': 2})
+        self.assertEqual([s['title'] for s in json.loads(response.content)['results']],
+                         ["MasterCard Scholarship for STEM", "Future Award"])
+        response = client.get(reverse('user-list'))
+        self.assertEqual(json.loads(response.content), UserSerializer(User.objects.all(), many=True).data)
+
+
+class CommentCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.admin = User.objects.create_superuser("Admin", "User", "admin@example.com", "password", username="admin")
+        self.scholarship = create_scholarship()
+        self.other = create_scholarship("Future Award")
+
+    def comment(self, scholarship, parent=None):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create-comment'), {
+                'scholarship_id': scholarship.id, 'content': "Comment", 'parent_comment': parent or '',
+            })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def counters(self, scholarship):
+        scholarship.refresh_from_db()
+        return scholarship.comment_count, scholarship.last_comment_at
+
+    def test_comments_and_replies_are_counted(self):
+        root = self.comment(self.scholarship)
+        reply = self.comment(self.scholarship, parent=root)
+        self.comment(self.other)
+        self.assertEqual(self.counters(self.scholarship), (2, Comment.objects.get(pk=reply).created_at))
+        self.assertEqual(self.counters(self.other)[0], 1)
+
+    def test_deleting_a_comment_removes_its_replies_from_the_counter(self):
+        root = self.comment(self.scholarship)
+        reply = self.comment(self.scholarship, parent=root)
+        self.comment(self.scholarship, parent=reply)
+        kept = self.comment(self.scholarship)
+        self.comment(self.other)
+        Comment.objects.filter(pk=kept).update(created_at=timezone.now() - timedelta(days=1))
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('delete-comment', kwargs={'id': root}))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counters(self.scholarship), (1, Comment.objects.get(pk=kept).created_at))
+        self.assertEqual(self.counters(self.other)[0], 1)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        self.comment(self.scholarship)
+        last = self.comment(self.scholarship)
+        Scholarship.objects.filter(pk=self.scholarship.pk).update(comment_count=7, last_comment_at=None)
+        Scholarship.objects.filter(pk=self.other.pk).update(comment_count=3)
+        self.assertEqual(reconcile_comment_counters(batch_size=1), (2, 2))
+        self.assertEqual(self.counters(self.scholarship), (2, Comment.objects.get(pk=last).created_at))
+        self.assertEqual(self.counters(self.other), (0, None))
+        self.assertEqual(reconcile_comment_counters(), (2, 0))
+
+    def test_migration_backfills_counters_of_existing_comments(self):
+        self.comment(self.scholarship)
+        last = self.comment(self.scholarship)
+        Scholarship.objects.update(comment_count=0, last_comment_at=None)
+        migration = import_module('scholarshiphub_api.migrations.0010_scholarship_comment_counters')
+        migration.count_existing_comments(apps, None)
+        self.assertEqual(self.counters(self.scholarship), (2, Comment.objects.get(pk=last).created_at))
+        self.assertEqual(self.counters(self.other), (0, None))
+
+    def test_comments_refresh_catalog_responses_but_keep_cached_facets(self):
+        url = reverse('get-all-scholarships')
+        etag = self.client.get(url)['ETag']
+        facets, active_facets = _facet_cache_key({}), _facet_cache_key({'ordering': '-last_comment_at'})
+        self.comment(self.scholarship)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        self.assertEqual(_facet_cache_key({}), facets)
+        self.assertNotEqual(_facet_cache_key({'ordering': '-last_comment_at'}), active_facets)
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Scholarship.objects.bulk_create([
+            Scholarship(title="Scholarship %d" % i, description="Engineering", eligibility="Graduates", benefit="Tuition",
+                        field_of_study="Engineering", deadline="30 June 2025", deadline_date=date(2025, 6, 30),
+                        link="https://example.com")
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def walk(self, url, params):
+        """ Follow ``next`` from the first page; the ids seen and the queries run """
+        ids, total = [], Scholarship.objects.count()
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(url, params).json()
+            while True:
+                ids.extend(row['id'] for row in data['results'])
+                # A cursor that does not advance would loop forever
+                if not data['next'] or len(ids) > total:
+                    break
+                data = self.client.get(data['next']).json()
+        return ids, [query['sql'] for query in context.captured_queries]
+
+    def test_plain_list_is_unpaginated(self):
+        response = self.client.get(reverse('get-all-scholarships'))
+        self.assertEqual(len(response.json()), 25)
+
+    def test_cursor_pages_cover_every_row_once_without_count(self):
+        ids, queries = self.walk(reverse('get-all-scholarships'), {'page_size': 10})
+        self.assertEqual(ids, sorted(Scholarship.objects.values_list('id', flat=True)))
+        self.assertEqual(len(queries), 3)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql.upper()])
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get(reverse('get-all-scholarships'), {'page_size': 10}).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in previous['results']], [row['id'] for row in first['results']])
+
+    def test_page_size_is_capped(self):
+        with self.settings(PAGINATION_MAX_PAGE_SIZE=100):
+            response = self.client.get(reverse('get-all-scholarships'), {'page_size': 1000})
+        self.assertEqual(len(response.json()['results']), 25)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('get-all-scholarships'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def walk_back(self, url):
+        """ Follow ``previous`` from ``url`` back to the first page """
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids[:0] = [row['id'] for row in data['results']]
+            url = data['previous']
+        return ids
+
+    def test_tied_ordering_values_are_neither_repeated_nor_skipped(self):
+        # More rows share a deadline than the offset DRF's cursors can skip (offset_cutoff = 1000)
+        Scholarship.objects.bulk_create([
+            Scholarship(title="Tied %d" % i, field_of_study="Engineering", deadline="30 June 2025", deadline_date=date(2025, 6, 30))
+            for i in range(1100)
+        ])
+        for i in range(7):
+            create_scholarship("Early %d" % i, deadline="1 March 2025")
+        # Left out when ordering by deadline
+        create_scholarship("No deadline", deadline="Rolling")
+        dated = Scholarship.objects.filter(deadline_date__isnull=False)
+        url = reverse('get-all-scholarships')
+        for ordering in ['deadline_date', '-deadline_date']:
+            with self.subTest(ordering):
+                expected = list(dated.order_by(ordering, ordering.replace('deadline_date', 'id')).values_list('id', flat=True))
+                ids, _ = self.walk(url, {'ordering': ordering, 'page_size': 100})
+                self.assertEqual(ids, expected)
+
+                last = self.client.get(url, {'ordering': ordering, 'page_size': 100}).json()
+                while last['next']:
+                    next_url = last['next']
+                    last = self.client.get(next_url).json()
+                self.assertEqual(self.walk_back(next_url), expected)
+
+    def test_tied_comment_counts_are_neither_repeated_nor_skipped(self):
+        Scholarship.objects.bulk_create([
+            Scholarship(title="Quiet %d" % i, field_of_study="Engineering", deadline="30 June 2025", deadline_date=date(2025, 6, 30))
+            for i in range(1300)
+        ])
+        Scholarship.objects.filter(title__in=["Quiet 5", "Quiet 700"]).update(comment_count=3)
+        expected = list(Scholarship.objects.order_by('-comment_count', '-id').values_list('id', flat=True))
+        ids, _ = self.walk(reverse('get-all-scholarships'), {'ordering': '-comment_count', 'page_size': 100})
+        self.assertEqual(ids, expected)
+
+    def test_null_ordering_values_are_walked_in_database_order(self):
+        now = timezone.now()
+        Scholarship.objects.filter(id__in=list(Scholarship.objects.values_list('id', flat=True)[:10])).update(last_comment_at=now)
+        Scholarship.objects.filter(id__in=list(Scholarship.objects.values_list('id', flat=True)[10:15])).update(last_comment_at=now - timedelta(days=1))
+        factory = APIRequestFactory()
+        for ordering in [('last_comment_at', 'id'), ('-last_comment_at', '-id')]:
+            with self.subTest(ordering):
+                queryset = Scholarship.objects.order_by(*ordering)
+                expected = list(queryset.values_list('id', flat=True))
+                ids, url = [], 'http://testserver/?page_size=3'
+                while url:
+                    paginator = KeysetPagination(ordering)
+                    ids.extend(row.id for row in paginator.paginate_queryset(queryset, Request(factory.get(url))))
+                    url = paginator.get_next_link()
+                self.assertEqual(ids, expected)
+
+    def forged_cursor(self, url, position, ordering=None):
+        """ A link to ``url`` with a cursor at ``position``, a list of ordering values """
+        paginator = KeysetPagination()
+        paginator.base_url = 'http://testserver%s?page_size=1%s' % (url, '&ordering=' + ordering if ordering else '')
+        return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(position)))
+
+    def test_cursor_with_the_wrong_key_length_is_404(self):
+        cursor = self.forged_cursor(reverse('get-all-scholarships'), ['2025-06-30'], ordering='deadline_date')
+        self.assertEqual(self.client.get(cursor).status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type_are_404(self):
+        scholarships, comments = reverse('get-all-scholarships'), reverse('get-scholarships')
+        for url, position, ordering in [
+            (scholarships, ['abc'], None),
+            (scholarships, [{'a': 1}], None),
+            (scholarships, [None], None),
+            (scholarships, ['99999999999999999999'], None),
+            (scholarships, ['2024-13-45', '1'], 'deadline_date'),
+            (scholarships, ['many', '1'], '-comment_count'),
+            (comments, ['2024-13-45', '1'], None),
+            (reverse('filter-scholarships'), ['x'], None),
+            (reverse('async-get-all-scholarships'), ['abc'], None),
+            (reverse('async-get-comments'), ['2024-13-45', '1'], None),
+        ]:
+            with self.subTest(url=url, position=position):
+                self.assertEqual(self.client.get(self.forged_cursor(url, position, ordering)).status_code, 404)
+        # NULL is a valid position of a nullable key
+        cursor = self.forged_cursor(scholarships, [None, '1'], ordering='deadline_date')
+        self.assertEqual(self.client.get(cursor).status_code, 200)
+
+    def test_deadline_filters(self):
+        today = timezone.localdate()
+        past = create_scholarship("Past", deadline=(today - timedelta(days=3)).strftime('%d %B %Y'))
+        future = create_scholarship("Future", deadline=(today + timedelta(days=3)).strftime('%d %B %Y'))
+        rolling = create_scholarship("Rolling", deadline="Rolling admissions")
+        url = reverse('get-all-scholarships')
+
+        def ids(**params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return {row['id'] for row in response.json()}
+
+        self.assertEqual(ids(deadline_after=today.isoformat()), {future.id})
+        self.assertEqual(ids(deadline_before='2025-06-30', deadline_after='2025-06-30'),
+                         set(Scholarship.objects.filter(deadline="30 June 2025").values_list('id', flat=True)))
+        self.assertNotIn(rolling.id, ids(deadline_before=today.isoformat()))
+        self.assertIn(past.id, ids(expired='true'))
+        self.assertNotIn(future.id, ids(expired='true'))
+        self.assertEqual(ids(expired='false'), {future.id, rolling.id})
+        self.assertEqual(self.client.get(url, {'deadline_after': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ordering': 'title'}).status_code, 400)
+
+        expired = {row['id']: row['expired'] for row in self.client.get(url).json()}
+        self.assertEqual((expired[past.id], expired[future.id], expired[rolling.id]), (True, False, None))
+
+    def test_search_pages_by_number_without_count(self):
+        with CaptureQueriesContext(connection) as context:
+            first = self.client.get(reverse('search'), {'search': 'engineering', 'page_size': 10}).json()
+        self.assertFalse([q for q in context.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        last = self.client.get(reverse('search'), {'search': 'engineering', 'page_size': 10, 'page': 3}).json()
+        self.assertEqual(len(last['results']), 5)
+        self.assertIsNone(last['next'])
+
+    def test_pages_past_the_maximum_offset_are_404(self):
+        for url_name in ['search', 'async-search']:
+            with self.subTest(url_name):
+                for page in ['99999999999999999999', str(settings.PAGINATION_MAX_OFFSET // 10 + 2)]:
+                    response = self.client.get(reverse(url_name), {'search': 'engineering', 'page_size': 10, 'page': page})
+                    self.assertEqual(response.status_code, 404)
+                last = self.client.get(reverse(url_name), {'search': 'engineering', 'page_size': 10,
+                                                           'page': settings.PAGINATION_MAX_OFFSET // 10 + 1})
+                self.assertEqual(last.json()['results'], [])
+
+
+class SearchTests(TestCase):
+    """ Runs on SQLite's FTS5 index (see search.py) """
+    @classmethod
+    def setUpTestData(cls):
+        cls.in_title = create_scholarship("Engineering Excellence Award", description="For students", field_of_study="Arts")
+        cls.in_description = create_scholarship("Generic Grant", description="Medicine and engineering", field_of_study="Medicine")
+        cls.unrelated = create_scholarship("History Prize", description="History", field_of_study="History")
+
+    def search(self, query):
+        return [row['id'] for row in APIClient().get(reverse('search'), {'search': query}).json()]
+
+    def test_uses_the_full_text_index(self):
+        self.assertIsInstance(get_search_backend(), SQLiteSearchBackend)
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("engineering"), [self.in_title.id, self.in_description.id])
+
+    def test_words_match_as_prefixes(self):
+        mastercard = create_scholarship(field_of_study="Business")
+        self.assertEqual(self.search("Master"), [mastercard.id])
+        self.assertEqual(self.search("engin"), [self.in_title.id, self.in_description.id])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("engineering medicine"), [self.in_description.id])
+        self.assertEqual(self.search("***"), [])
+
+    def test_index_follows_updates(self):
+        Scholarship.objects.filter(pk=self.in_title.pk).update(title="Renamed")
+        self.assertEqual(self.search("excellence"), [])
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for title, field_of_study, deadline in [
+            ("Engineering June A", "Engineering", "30 June 2025"),
+            ("Engineering June B", "Engineering", "15 June 2025"),
+            ("Engineering July", "Engineering", "31 July 2025"),
+            ("Medicine June", "Medicine", "1 June 2025"),
+            ("Law rolling", "Law", "Rolling admissions"),
+        ]:
+            create_scholarship(title, field_of_study=field_of_study, deadline=deadline)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, **params):
+        response = self.client.get(reverse('filter-scholarships'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def counts(self, facet):
+        return {entry['value']: entry['count'] for entry in facet}
+
+    def test_each_facet_ignores_its_own_filter(self):
+        data = self.get(field_of_study='Engineering')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(self.counts(data['facets']['field_of_study']), {'Engineering': 3, 'Medicine': 1, 'Law': 1})
+        self.assertEqual(self.counts(data['facets']['deadline_month']), {'2025-06': 2, '2025-07': 1})
+
+        data = self.get(deadline_after='2025-06-10', deadline_before='2025-06-30')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(self.counts(data['facets']['field_of_study']), {'Engineering': 2})
+        self.assertEqual(self.counts(data['facets']['deadline_month']), {'2025-06': 3, '2025-07': 1, None: 1})
+
+    def test_combined_facets(self):
+        data = self.client.get(reverse('filter-scholarships') + '?field_of_study=Engineering&field_of_study=Medicine&deadline_before=2025-06-30').json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual({row['title'] for row in data['results']}, {"Engineering June A", "Engineering June B", "Medicine June"})
+        self.assertEqual(self.counts(data['facets']['field_of_study']), {'Engineering': 2, 'Medicine': 1})
+        self.assertEqual(self.counts(data['facets']['deadline_month']), {'2025-06': 3, '2025-07': 1})
+        self.assertEqual(data['facets']['field_of_study'][0], {'value': 'Engineering', 'count': 2})
+
+    def test_months_are_chronological_with_undated_last(self):
+        months = [entry['value'] for entry in self.get()['facets']['deadline_month']]
+        self.assertEqual(months, ['2025-06', '2025-07', None])
+
+    def test_count_matches_the_filtered_rows(self):
+        for params in [{}, {'q': 'june'}, {'expired': 'true'}, {'ordering': 'deadline_date'}, {'field_of_study': 'Law', 'expired': 'false'}]:
+            with self.subTest(params):
+                data = self.get(page_size=100, **params)
+                self.assertEqual(data['count'], len(data['results']))
+
+    def test_facets_are_cached_per_filter_signature(self):
+        filters = {'field_of_study': ['Medicine', 'Engineering'], 'deadline_after': date(2025, 6, 1)}
+        facets = scholarship_facets(filters)
+        with self.assertNumQueries(0):
+            self.assertEqual(scholarship_facets({'deadline_after': date(2025, 6, 1), 'field_of_study': ['Engineering', 'Medicine']}), facets)
+        self.assertNotEqual(_facet_cache_key(filters), _facet_cache_key(dict(filters, deadline_after=date(2025, 6, 2))))
+        self.assertNotEqual(_facet_cache_key({}), _facet_cache_key({'expired': False}))
+
+    def test_catalog_writes_invalidate_cached_facets(self):
+        key = _facet_cache_key({})
+        self.assertEqual(scholarship_facets({})['count'], 5)
+        create_scholarship("Medicine July", field_of_study="Medicine", deadline="1 July 2025")
+        self.assertNotEqual(_facet_cache_key({}), key)
+        self.assertEqual(scholarship_facets({})['count'], 6)
+
+    def test_expired_facets_change_with_the_date(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 6, 20)):
+            key = _facet_cache_key({'expired': True})
+            self.assertEqual(scholarship_facets({'expired': True})['count'], 2)
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 7, 5)):
+            self.assertNotEqual(_facet_cache_key({'expired': True}), key)
+            self.assertEqual(scholarship_facets({'expired': True})['count'], 3)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.scholarship = create_scholarship()
+        self.url = reverse('get-scholarship', kwargs={'id': self.scholarship.id})
+
+    def test_second_read_is_served_from_the_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Accept', second['Vary'])
+
+    def test_matching_etag_is_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_bump_the_version(self):
+        before = self.client.get(self.url)
+        self.scholarship.title = "Renamed"
+        self.scholarship.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], before['ETag'])
+        self.assertEqual(response.json()['title'], "Renamed")
+
+    def test_errors_are_not_cached(self):
+        url = reverse('get-scholarship', kwargs={'id': self.scholarship.id + 1})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        create_scholarship("Second")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_other_renderers_bypass_the_cache(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, {'format': 'api'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertNotIn('ETag', response)
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=4')
+        self.assertIn(b'\n    "title"', response.content)
+
+
+class JobQueueTests(TestCase):
+    """ Emails go to Django's locmem backend, which the test runner installs """
+    def tearDown(self):
+        jobs._handlers.pop('test_failure', None)
+
+    def test_enqueued_emails_are_sent_in_one_batch(self):
+        for i in range(3):
+            jobs.enqueue_email("Subject %d" % i, "Body", ["user%d@example.com" % i])
+        self.assertEqual(mail.outbox, [])
+
+        with mock.patch('scholarshiphub_api.jobs.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(jobs.run_pending_jobs(), 3)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ["Subject 0", "Subject 1", "Subject 2"])
+        self.assertEqual(mail.outbox[0].from_email, settings.DEFAULT_FROM_EMAIL)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        self.assertEqual(jobs.run_pending_jobs(), 0)
+
+    def test_claimed_jobs_are_leased(self):
+        job = jobs.enqueue('send_email', {})
+        self.assertEqual([claimed.id for claimed in jobs.claim_jobs(10)], [job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+        # The worker died: once the lease expires another one claims the job
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([claimed.id for claimed in jobs.claim_jobs(10)], [job.id])
+
+    def test_future_jobs_wait(self):
+        jobs.enqueue('send_email', {}, run_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+    @override_settings(JOB_RETRY_BASE_DELAY=30, JOB_RETRY_MAX_DELAY=100)
+    def test_failures_back_off_exponentially_then_fail(self):
+        jobs.job_handler('test_failure')(lambda batch: {job.id: RuntimeError("SMTP down") for job in batch})
+        job = jobs.enqueue('test_failure', {}, max_attempts=4)
+
+        delays = []
+        for _ in range(3):
+            started = timezone.now()
+            with self.assertLogs('scholarshiphub_api.jobs', 'WARNING'):
+                jobs.run_pending_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.PENDING)
+            self.assertIn("SMTP down", job.last_error)
+            delays.append(round((job.run_at - started).total_seconds()))
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(delays, [30, 60, 100])
+
+        with self.assertLogs('scholarshiphub_api.jobs', 'ERROR'):
+            jobs.run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 4))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_unknown_kind_fails_the_job(self):
+        job = jobs.enqueue('no_such_kind', {}, max_attempts=1)
+        with self.assertLogs('scholarshiphub_api.jobs', 'ERROR'):
+            jobs.run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("No handler registered", job.last_error)
+
+
+class JWTRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "old-password", username="ada")
+        self.tokens = issue_tokens(self.user)
+        self.client = APIClient()
+
+    def me(self, access):
+        return self.client.get(reverse('user-detail'), HTTP_AUTHORIZATION='Bearer %s' % access).status_code
+
+    def refresh(self, refresh):
+        return self.client.post(reverse('token-refresh'), {'refresh': refresh})
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        self.assertEqual(self.me(self.tokens['access']), 200)
+        response = self.client.delete(reverse('logout'), HTTP_AUTHORIZATION='Bearer %s' % self.tokens['access'])
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.me(self.tokens['access']), 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+    def test_privilege_changes_revoke_tokens(self):
+        for field, value in [('is_staff', True), ('is_superuser', True), ('is_active', False)]:
+            with self.subTest(field):
+                tokens = issue_tokens(self.user)
+                setattr(self.user, field, value)
+                self.user.save()
+                self.assertEqual(self.me(tokens['access']), 401)
+                self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+                setattr(self.user, field, not value)
+                self.user.save()
+
+    def test_profile_changes_keep_tokens(self):
+        self.user.first_name = "Augusta"
+        self.user.save()
+        self.user.save(update_fields=['last_name'])
+        self.assertEqual(self.me(self.tokens['access']), 200)
+
+    def test_revocation_is_durable(self):
+        revoke_user_tokens(self.user.pk)
+        # As another worker with its own cache, or after eviction, would see it
+        cache.clear()
+        self.assertEqual(self.me(self.tokens['access']), 401)
+
+    def test_deleting_the_user_revokes_their_tokens(self):
+        admin = User.objects.create_superuser("Admin", "User", "admin@example.com", "password", username="admin")
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.delete(reverse('delete-user', kwargs={'id': self.user.pk})).status_code, 204)
+        self.client.force_authenticate(None)
+        cache.clear()
+
+        self.assertEqual(self.me(self.tokens['access']), 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+    def test_changing_the_password_revokes_earlier_tokens(self):
+        response = self.client.post(reverse('change_password'), {'old_password': "old-password", 'new_password': "new-password"},
+                                    HTTP_AUTHORIZATION='Bearer %s' % self.tokens['access'])
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.me(self.tokens['access']), 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.assertEqual(self.me(response.data['access']), 200)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_refresh_tokens_work_once(self):
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me(response.data['access']), 200)
+
+        # Replaying the spent token revokes everything issued so far
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.assertEqual(self.me(response.data['access']), 401)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 401)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.token.key)[0]
+
+    def me(self):
+        return self.client.get(reverse('user-detail'), HTTP_AUTHORIZATION='Token %s' % self.token.key)
+
+    def test_repeat_lookup_is_served_from_the_cache(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_logout_drops_the_cached_token(self):
+        self.assertEqual(self.me().status_code, 200)
+        self.assertEqual(self.client.delete(reverse('logout'), HTTP_AUTHORIZATION='Token %s' % self.token.key).status_code, 200)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_deleted_user_is_not_served_from_the_cache(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_user_changes_are_not_served_from_the_cache(self):
+        self.authenticate()
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.authenticate().is_staff)
+        self.user.set_password("new-password")
+        self.user.save()
+        self.assertTrue(self.authenticate().check_password("new-password"))
+
+    def test_generation_bump_by_another_worker_makes_the_entry_stale(self):
+        self.authenticate()
+        # Another worker saved the user: its own signal bumped the shared generation, not this process's LRU
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        key = _generation_key(self.user.pk)
+        cache.set(key, cache.get(key, 0) + 1, None)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().is_staff)
+
+    def test_least_recently_used_entry_is_evicted_at_capacity(self):
+        users = [User(pk=pk) for pk in range(1, 4)]
+        lru = TokenUserCache(max_entries=2, ttl=60)
+        lru.set('a', users[0], 'token-a', 0)
+        lru.set('b', users[1], 'token-b', 0)
+        lru.get('a')
+        lru.set('c', users[2], 'token-c', 0)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a')[1], 'token-a')
+        self.assertEqual(lru.get('c')[1], 'token-c')
+        self.assertNotIn(users[1].pk, lru._keys_by_user)
+
+    def test_entries_expire_after_the_ttl(self):
+        lru = TokenUserCache(max_entries=2, ttl=60)
+        with mock.patch('time.monotonic', return_value=1000.0):
+            lru.set('a', self.user, 'token-a', 0)
+        with mock.patch('time.monotonic', return_value=1059.0):
+            self.assertIsNotNone(lru.get('a'))
+        with mock.patch('time.monotonic', return_value=1061.0):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru._keys_by_user, {})
+
+
+class BulkImportTests(TestCase):
+    HEADER = "title,description,eligibility,benefit,field_of_study,deadline,link\n"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("Admin", "User", "admin@example.com", "password", username="admin"))
+
+    def upload(self, name, content, **params):
+        url = reverse('bulk-import-scholarships')
+        if params:
+            url += '?' + '&'.join('%s=%s' % item for item in params.items())
+        return self.client.post(url, {'file': SimpleUploadedFile(name, content.encode())}, format='multipart')
+
+    def test_malformed_row_after_a_committed_batch_still_invalidates_the_catalog(self):
+        url = reverse('get-all-scholarships')
+        etag = self.client.get(url)['ETag']
+        rows = [
+            "First Award,First,Graduates,Tuition,Arts,Rolling,https://example.com/a",
+            # Longer than the csv module's field size limit
+            "Broken Award,%s,Graduates,Tuition,Arts,Rolling,https://example.com/b" % ('x' * 200000),
+        ]
+        response = self.upload("scholarships.csv", self.HEADER + "\n".join(rows), batch_size=1)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Scholarship.objects.filter(title="First Award").exists())
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn("First Award", [row['title'] for row in response.json()])
+
+    def test_csv_rows_are_upserted_on_title(self):
+        existing = create_scholarship("Existing Award", image="scholarship_images/kept.png")
+        rows = [
+            "Existing Award,Updated,Graduates,Tuition,Medicine,1 July 2030,https://example.com/a",
+            "New Award,New,Graduates,Tuition,Arts,Rolling,https://example.com/b",
+            "Third Award,Third,Graduates,Tuition,Arts,2 March 2031,https://example.com/c",
+        ]
+        response = self.upload("scholarships.csv", self.HEADER + "\n".join(rows), batch_size=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'imported': 3, 'batches': 2, 'error_count': 0, 'errors': []})
+        existing.refresh_from_db()
+        self.assertEqual((existing.description, existing.field_of_study), ("Updated", "Medicine"))
+        self.assertEqual(existing.deadline_date, date(2030, 7, 1))
+        # Rows without an image keep the existing one
+        self.assertEqual(existing.image.name, "scholarship_images/kept.png")
+        self.assertEqual(Scholarship.objects.count(), 3)
+        self.assertIsNone(Scholarship.objects.get(title="New Award").deadline_date)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = [
+            '{"title": "Good", "description": "d", "eligibility": "e", "benefit": "b", "field_of_study": "f", "deadline": "x", "link": "l"}',
+            '{"title": "No link", "description": "d", "eligibility": "e", "benefit": "b", "field_of_study": "f", "deadline": "x"}',
+            'not json',
+        ]
+        response = self.upload("scholarships.jsonl", "\n".join(rows))
+
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertIn('link', response.data['errors'][0]['errors'])
+        self.assertEqual(list(Scholarship.objects.values_list('title', flat=True)), ["Good"])
+
+    def test_unsupported_files_are_rejected(self):
+        response = self.upload("scholarships.txt", "title\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.data)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada"))
+        self.assertEqual(self.upload("scholarships.csv", self.HEADER).status_code, 403)
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0, IMAGE_VARIANT_WIDTHS=(320, 640, 1024))
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        storage = override_settings(MEDIA_ROOT=media_root)
+        storage.enable()
+        self.addCleanup(storage.disable)
+        cache.clear()
+
+    def create(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_scholarship(image=SimpleUploadedFile("photo.png", content))
+
+    def png(self, width):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, width // 2), 'navy').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def srcset(self, scholarship):
+        return APIClient().get(reverse('get-scholarship', kwargs={'id': scholarship.id})).json()['image_srcset']
+
+    def test_only_rendered_variants_are_listed_with_their_real_width(self):
+        scholarship = self.create(self.png(500))
+
+        srcset = self.srcset(scholarship)
+        widths = {variant_format: [entry.rsplit(' ', 1)[1] for entry in value.split(', ')] for variant_format, value in srcset.items()}
+        self.assertEqual(widths, {'jpeg': ['320w', '500w'], 'webp': ['320w', '500w']})
+        for value in srcset.values():
+            for entry in value.split(', '):
+                path = entry.rsplit(' ', 1)[0][len(settings.MEDIA_URL):]
+                self.assertTrue(default_storage.exists(path.lstrip('/')), path)
+        self.assertEqual(APIClient().get(reverse('get-all-scholarships')).json()[0]['image_srcset'], srcset)
+
+    def test_no_srcset_until_variants_are_rendered(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            scholarship = create_scholarship(image=SimpleUploadedFile("photo.png", self.png(800)))
+        self.assertIsNone(self.srcset(scholarship))
+        self.assertIsNotNone(APIClient().get(reverse('get-scholarship', kwargs={'id': scholarship.id})).json()['image'])
+
+    def test_no_srcset_when_rendering_fails(self):
+        with self.assertLogs('scholarshiphub_api.images', 'ERROR'):
+            scholarship = self.create(b"not an image")
+        self.assertIsNone(self.srcset(scholarship))
+
+    def test_variants_of_a_replaced_image_are_not_listed(self):
+        scholarship = self.create(self.png(500))
+        Scholarship.objects.filter(pk=scholarship.pk).update(image="scholarship_images/other.png")
+        cache.clear()
+        self.assertIsNone(self.srcset(scholarship))
+
+
+class ResumableUploadTests(TestCase):
+    content = b"%PDF-1.4 statement of purpose " * 100
+
+    def setUp(self):
+        temp_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_root)
+        paths = override_settings(MEDIA_ROOT=temp_root, SOP_UPLOAD_TEMP_DIR=temp_root + '/sessions')
+        paths.enable()
+        self.addCleanup(paths.disable)
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('sop-upload-create'), {'title': "My SOP", 'filename': "sop.pdf", 'length': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        self.upload_id = response.data['id']
+
+    def send(self, offset, chunk, checksum=None, **extra):
+        if checksum is not None:
+            extra['HTTP_UPLOAD_CHECKSUM'] = 'sha256 ' + base64.b64encode(checksum).decode()
+        return self.client.generic('PATCH', reverse('sop-upload', kwargs={'upload_id': self.upload_id}), chunk,
+                                   content_type=CHUNK_CONTENT_TYPE, HTTP_UPLOAD_OFFSET=str(offset), **extra)
+
+    def offset(self):
+        return int(self.client.get(reverse('sop-upload', kwargs={'upload_id': self.upload_id}))['Upload-Offset'])
+
+    def complete(self):
+        return self.client.post(reverse('sop-upload-complete', kwargs={'upload_id': self.upload_id}))
+
+    def test_interrupted_chunk_is_resumed_from_the_stored_offset(self):
+        class DroppedConnection(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() >= 400:
+                    raise OSError("client disconnected")
+                return super().read(min(size, 400 - self.tell()))
+
+        session = claim_session(self.upload_id, self.user, 0)
+        with self.assertRaises(OSError):
+            append_chunk(session, DroppedConnection(self.content), 0, 1000)
+        self.assertEqual(self.offset(), 400)
+        self.assertIsNone(UploadSession.objects.get(pk=self.upload_id).claimed_until)
+
+        response = self.send(400, self.content[400:])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+
+        response = self.complete()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+        sop = StatementOfPurpose.objects.get(pk=response.data['id'])
+        with sop.sop_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_offset_mismatch_is_a_conflict(self):
+        self.send(0, self.content[:100])
+        self.assertEqual(self.send(0, self.content[:100]).status_code, 409)
+        self.assertEqual(self.send(200, self.content[200:300]).status_code, 409)
+        self.assertEqual(self.offset(), 100)
+
+    def test_chunk_in_progress_is_a_conflict_until_its_claim_lapses(self):
+        UploadSession.objects.filter(pk=self.upload_id).update(claimed_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.send(0, self.content[:100]).status_code, 409)
+
+        UploadSession.objects.filter(pk=self.upload_id).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.send(0, self.content[:100]).status_code, 204)
+        self.assertIsNone(UploadSession.objects.get(pk=self.upload_id).claimed_until)
+
+    def test_checksum_mismatch_discards_the_chunk(self):
+        chunk = self.content[:500]
+        self.assertEqual(self.send(0, chunk, hashlib.sha256(b"something else").digest()).status_code, 460)
+        self.assertEqual(self.offset(), 0)
+        self.assertEqual(os.path.getsize(UploadSession.objects.get(pk=self.upload_id).temp_path), 0)
+
+        self.assertEqual(self.send(0, chunk, hashlib.sha256(chunk).digest()).status_code, 204)
+        self.assertEqual(self.offset(), 500)
+
+    def test_expired_upload_is_gone(self):
+        self.send(0, self.content[:100])
+        expired = timezone.now() - settings.SOP_UPLOAD_SESSION_TTL - timedelta(minutes=1)
+        UploadSession.objects.filter(pk=self.upload_id).update(updated_at=expired)
+        self.assertEqual(self.send(100, self.content[100:]).status_code, 410)
+
+        UploadSession.objects.filter(pk=self.upload_id).update(offset=len(self.content))
+        self.assertEqual(self.complete().status_code, 410)
+        self.assertFalse(StatementOfPurpose.objects.exists())
+
+
+class SOPDownloadTests(TestCase):
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        storage = override_settings(MEDIA_ROOT=media_root, SENDFILE_BACKEND='')
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.sop = StatementOfPurpose.objects.create(user=self.user, title="My SOP", sop_file=SimpleUploadedFile("sop.pdf", self.content))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, **headers):
+        response = self.client.get(reverse('download-sop', kwargs={'id': self.sop.id}), **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_byte_ranges(self):
+        size = len(self.content)
+        for header, start, end in [
+            ('bytes=100-199', 100, 199),
+            ('bytes=10000-', 10000, size - 1),
+            ('bytes=-24', size - 24, size - 1),
+            ('bytes=9000-99999', 9000, size - 1),
+        ]:
+            with self.subTest(header):
+                response, body = self.download(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(body, self.content[start:end + 1])
+                self.assertEqual(response['Content-Range'], 'bytes %d-%d/%d' % (start, end, size))
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+
+    def test_unsupported_range_sends_the_whole_file(self):
+        for header in ['bytes=0-9,20-29', 'bytes=50-10', 'items=0-1']:
+            with self.subTest(header):
+                response, body = self.download(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, self.content)
+
+    def test_range_past_the_end_is_not_satisfiable(self):
+        for header in ['bytes=%d-' % len(self.content), 'bytes=-0']:
+            with self.subTest(header):
+                response, _ = self.download(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */%d' % len(self.content))
+
+    def test_if_range(self):
+        etag = self.download()[0]['ETag']
+        response, body = self.download(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[:10])
+
+        # The file changed since the client's copy, so the whole new file is sent
+        response, body = self.download(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+    def test_conditional_request(self):
+        etag = self.download()[0]['ETag']
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+    def test_only_the_owner_and_staff_may_download(self):
+        other = User.objects.create_user("Alan", "Turing", "alan@example.com", "password", username="alan")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.download()[0].status_code, 403)
+        other.is_staff = True
+        other.save()
+        self.assertEqual(self.download()[0].status_code, 200)
+
+    @override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL_PREFIX='/protected/')
+    def test_sendfile_backend_leaves_the_body_to_the_proxy(self):
+        response, body = self.download(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.sop.sop_file.name)
+        self.assertEqual(body, b'')
+
+
+class SeedDataTests(TestCase):
+    def test_seeds_the_local_database(self):
+        call_command('seed_data', users=3, scholarships=5, comments=10, stdout=io.StringIO())
+        self.assertEqual((User.objects.count(), Scholarship.objects.count(), Comment.objects.count()), (3, 5, 10))
+
+    def test_refuses_a_remote_database_without_allow_remote(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.dict(connection.settings_dict, {'HOST': 'db.example.com'}):
+            with self.assertRaisesMessage(CommandError, 'db.example.com'):
+                call_command('seed_data', users=1, scholarships=0, comments=0, stdout=io.StringIO())
+            self.assertFalse(User.objects.exists())
+            call_command('seed_data', users=1, scholarships=0, comments=0, allow_remote=True, stdout=io.StringIO())
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(REQUEST_PROFILING=True, PROFILE_RATE_LIMIT=2, PROFILE_GLOBAL_RATE_LIMIT=10)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user("Grace", "Hopper", "grace@example.com", "password", username="grace", is_staff=True)
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.client = APIClient()
+
+    def get(self, user, url_name='user-detail'):
+        return self.client.get(reverse(url_name), HTTP_X_PROFILE='1',
+                               HTTP_AUTHORIZATION='Bearer %s' % issue_tokens(user)['access'])
+
+    def test_staff_request_is_profiled_and_authenticated_once(self):
+        with mock.patch.object(JWTAuthentication, 'authenticate', autospec=True, side_effect=JWTAuthentication.authenticate) as authenticate:
+            response = self.get(self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], self.staff.email)
+        self.assertEqual(authenticate.call_count, 1)
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.user, profile.url_name, profile.status_code), (self.staff, 'user-detail', 200))
+        self.assertTrue(profile.top_functions)
+        detail = self.client.get(reverse('request-profile', kwargs={'id': profile.pk}), HTTP_AUTHORIZATION='Bearer %s' % issue_tokens(self.staff)['access'])
+        self.assertEqual(detail.status_code, 200)
+
+    def test_other_users_are_not_profiled(self):
+        response = self.get(self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertNotIn('X-Profile', response)
+        response = self.client.get(reverse('user-detail'), HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_rate_limit(self):
+        self.assertIn('X-Profile-Id', self.get(self.staff))
+        self.assertIn('X-Profile-Id', self.get(self.staff))
+        response = self.get(self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile'], 'throttled')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    async def test_async_request_is_profiled(self):
+        access = (await sync_to_async(issue_tokens)(self.staff))['access']
+        response = await AsyncClient().get(reverse('async-user-detail'), headers={'X-Profile': '1', 'Authorization': 'Bearer %s' % access})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await RequestProfile.objects.filter(pk=response['X-Profile-Id'], user=self.staff).aexists())
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, SLOW_REQUEST_MS=60000)
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_scholarship()
+        # The test database connection was opened before the middleware hooks new connections
+        install_query_stats(connection)
+
+    def queries(self, response):
+        return int(response['Server-Timing'].split('desc="')[1].split(' ')[0])
+
+    def test_queries_are_counted(self):
+        with self.assertLogs('scholarshiphub_api.requests', 'INFO') as logs:
+            response = APIClient().get(reverse('get-all-scholarships'))
+        self.assertGreaterEqual(self.queries(response), 1)
+        self.assertIn('url_name=get-all-scholarships', logs.output[0])
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_and_instrumentation_share_one_query_wrapper(self):
+        def observed():
+            return REGISTRY.get_sample_value('scholarshiphub_db_queries_per_request_sum', {'route': 'get-all-scholarships'}) or 0
+        before = observed()
+        with self.assertLogs('scholarshiphub_api.requests', 'INFO'):
+            response = APIClient().get(reverse('get-all-scholarships'))
+        self.assertEqual(observed() - before, self.queries(response))
+        self.assertEqual(connection.execute_wrappers, [record_query])
+
+    def test_every_middleware_runs_natively_in_async_mode(self):
+        for path in settings.MIDDLEWARE:
+            with self.subTest(path):
+                self.assertTrue(import_string(path).async_capable)
+
+    async def test_async_queries_are_counted(self):
+        with self.assertLogs('scholarshiphub_api.requests', 'INFO'):
+            response = await AsyncClient().get(reverse('async-get-all-scholarships'))
+        self.assertGreaterEqual(self.queries(response), 1)
+
+
+class StaticFilesMiddlewareTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        with open(os.path.join(self.static_root, 'app.css'), 'w') as f:
+            f.write('body{}')
+        self.factory = RequestFactory()
+
+    def middleware(self, get_response):
+        with self.settings(STATIC_ROOT=self.static_root, WHITENOISE_AUTOREFRESH=False):
+            return StaticFilesMiddleware(get_response)
+
+    def test_serves_files_and_passes_other_requests_through(self):
+        middleware = self.middleware(lambda request: HttpResponse('view'))
+        response = middleware(self.factory.get('/static/app.css'))
+        self.assertEqual(b''.join(response.streaming_content), b'body{}')
+        self.assertEqual(middleware(self.factory.get('/api/scholarships/')).content, b'view')
+
+    async def test_serves_files_natively_in_async_mode(self):
+        async def view(request):
+            return HttpResponse('view')
+        middleware = self.middleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.get('/static/app.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css; charset="utf-8"')
+        self.assertEqual((await middleware(self.factory.get('/api/scholarships/'))).content, b'view')
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token')
+class MetricsEndpointTests(TestCase):
+    def scrape(self, token='scrape-token'):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer %s' % token)
+
+    def pending_reviews(self):
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        line = next(line for line in response.content.decode().splitlines() if line.startswith('scholarshiphub_sops_pending_review '))
+        return float(line.split()[1])
+
+    def test_requires_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.scrape('wrong').status_code, 403)
+        self.assertIn(b'scholarshiphub_http_requests_total', self.scrape().content)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.scrape('').status_code, 404)
+
+    def test_pending_reviews_are_counted_on_write_not_on_scrape(self):
+        user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        with self.captureOnCommitCallbacks(execute=True):
+            sops = [StatementOfPurpose.objects.create(user=user, title="SOP %d" % i, sop_file="sop_files/sop.pdf") for i in range(3)]
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.pending_reviews(), 3)
+        self.assertEqual(context.captured_queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sops[0].is_reviewed = True
+            sops[0].save()
+            sops[1].delete()
+        self.assertEqual(self.pending_reviews(), 1)
+
+
+@override_settings(ADMISSION_CONTROL=True, ADMISSION_LIMITS={'login': {'concurrency': 1, 'rate': 0.5, 'burst': 2}},
+                   ADMISSION_RETRY_AFTER=3, ADMISSION_TRUSTED_PROXIES=1)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, client_ip='203.0.113.5'):
+        return self.client.post(reverse('login'), {'email': "ada@example.com", 'password': "wrong"},
+                                HTTP_X_FORWARDED_FOR=client_ip)
+
+    def test_empty_bucket_is_429_with_retry_after(self):
+        for _ in range(2):
+            self.assertNotEqual(self.login().status_code, 429)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        # Buckets are per client address, read past the trusted proxy
+        self.assertNotEqual(self.login('203.0.113.6').status_code, 429)
+
+    def test_route_at_capacity_is_503_with_retry_after(self):
+        slot = acquire_slot('login', 1)
+        try:
+            response = self.login()
+        finally:
+            release_slot(slot)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertNotEqual(self.login().status_code, 503)
+
+
+@override_settings(ADMISSION_LIMITS={})
+class LoginPasswordTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+
+    def login(self, email="ada@example.com", password="password"):
+        return self.client.post(reverse('login'), {'email': email, 'password': password})
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("password", hasher='pbkdf2_sha1'))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(get_hasher().algorithm + '$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_unknown_email_gets_the_same_answer_as_a_wrong_password(self):
+        wrong = self.login(password="wrong")
+        unknown = self.login(email="nobody@example.com")
+        self.assertEqual((unknown.status_code, unknown.json()), (wrong.status_code, wrong.json()))
+
+    def test_full_hashing_pool_is_503(self):
+        with mock.patch('scholarshiphub_api.passwords._pool', return_value=(None, threading.Semaphore(0))):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSION_RETRY_AFTER))
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routing between the primary and a ``replica_0`` alias, here a second
+    connection to the test database, so each query shows which alias ran it.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added once the test database exists, which the alias then shares. DATABASES is
+        # also connections.settings, so the alias is known to both.
+        cls.replica = mock.patch.dict(settings.DATABASES, {'replica_0': dict(settings.DATABASES['default'])})
+        cls.replica.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica_0'].close()
+        del connections['replica_0']
+        cls.replica.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+        self.user = User.objects.create_user("Ada", "Lovelace", "ada@example.com", "password", username="ada")
+        self.scholarship = create_scholarship()
+        self.client = APIClient()
+
+    def queries(self, request, *args, **kwargs):
+        """ ``(response, primary queries, replica queries)`` of one request """
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica_0']) as replica:
+            response = request(*args, **kwargs)
+        return response, len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_reads_go_to_the_replica(self):
+        response, primary, replica = self.queries(self.client.get, reverse('get-scholarships'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((primary, bool(replica)), (0, True))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_writes_go_to_the_primary_and_pin_the_client_to_it(self):
+        self.client.force_authenticate(self.user)
+        response, primary, replica = self.queries(self.client.post, reverse('create-comment'),
+                                                  {'content': "Question", 'scholarship_id': self.scholarship.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((bool(primary), replica), (True, 0))
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        # The cookie is sent back, so the client reads its own write from the primary
+        response, primary, replica = self.queries(self.client.get, reverse('get-scholarships'))
+        self.assertEqual([comment['content'] for comment in response.json()], ["Question"])
+        self.assertEqual((bool(primary), replica), (True, 0))
+
+        self.client.cookies[settings.REPLICA_PIN_COOKIE] = str(int(time.time()) - 1)
+        self.assertEqual(self.queries(self.client.get, reverse('get-scholarships'))[1], 0)
+
+    def test_read_from_primary(self):
+        token = routers._routing.set(routers.RoutingState(use_replica=True))
+        try:
+            self.assertEqual(Scholarship.objects.all().db, 'replica_0')
+            with routers.read_from_primary():
+                self.assertEqual(Scholarship.objects.all().db, 'default')
+            self.assertEqual(Scholarship.objects.all().db, 'replica_0')
+            with transaction.atomic():
+                self.assertEqual(Scholarship.objects.all().db, 'default')
+        finally:
+            routers._routing.reset(token)
+        # Outside a request, e.g. in workers and management commands
+        self.assertEqual(Scholarship.objects.all().db, 'default')
+
+    def test_unhealthy_replica_is_skipped(self):
+        with mock.patch.object(routers, '_check_replica', return_value=False):
+            response, primary, replica = self.queries(self.client.get, reverse('get-scholarships'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((bool(primary), replica), (True, 0))
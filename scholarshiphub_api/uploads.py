@@ -0,0 +1,152 @@
+import base64
+import binascii
+import hashlib
+import os
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+from .models import StatementOfPurpose, UploadSession
+
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _SessionFile(File):
+    """ Exposes temporary_file_path() so FileSystemStorage moves the file instead of copying it """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def start_session(session):
+    os.makedirs(os.path.dirname(session.temp_path), exist_ok=True)
+    open(session.temp_path, 'wb').close()
+
+
+def parse_checksum(header):
+    """ Parse a tus-style ``Upload-Checksum: sha256 <base64 digest>`` header """
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError("Only sha256 checksums are supported.", 400)
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadError("Invalid Upload-Checksum header.", 400)
+
+
+def claim_session(upload_id, user, offset):
+    """
+    Reserve the session for one chunk at ``offset`` with a single UPDATE, so
+    the chunk is streamed to disk without holding a transaction or a row lock
+    while a slow client sends it. The claim lapses after SOP_UPLOAD_CHUNK_LEASE
+    in case the worker dies.
+    """
+    now = timezone.now()
+    sessions = UploadSession.objects.filter(pk=upload_id, user=user)
+    claimed_until = now + settings.SOP_UPLOAD_CHUNK_LEASE
+    claimed = (
+        sessions.filter(offset=offset, updated_at__gte=now - settings.SOP_UPLOAD_SESSION_TTL)
+        .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+        .update(claimed_until=claimed_until)
+    )
+    session = sessions.first()
+    if session is None:
+        raise UploadError("Upload not found.", 404)
+    if not claimed:
+        if session.expires_at < now:
+            raise UploadError("Upload has expired.", 410)
+        if session.offset != offset:
+            raise UploadError("Upload-Offset does not match the current offset.", 409)
+        raise UploadError("Another chunk of this upload is in progress.", 409)
+    session.claimed_until = claimed_until
+    return session
+
+
+def append_chunk(session, stream, offset, length, checksum=None):
+    """
+    Write ``length`` bytes from ``stream`` at ``offset`` of the temp file of a
+    session claimed with claim_session(), reading in small blocks so the chunk
+    is never held in memory. If the client disconnects mid-chunk the bytes
+    received so far are kept, unless a checksum was sent, in which case the
+    partial chunk is discarded. The new offset is then stored and the claim
+    released by one compare-and-set UPDATE.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        if offset + length > session.length:
+            raise UploadError("Chunk exceeds the declared upload length.", 400)
+        with open(session.temp_path, 'r+b') as temp_file:
+            temp_file.seek(offset)
+            try:
+                while written < length:
+                    block = stream.read(min(BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    temp_file.write(block)
+                    digest.update(block)
+                    written += len(block)
+            finally:
+                if checksum is not None and (written < length or digest.digest() != checksum):
+                    written = 0
+                # Also drops any bytes left behind by an earlier interrupted attempt
+                temp_file.truncate(offset + written)
+    finally:
+        committed = UploadSession.objects.filter(pk=session.pk, offset=offset, claimed_until=session.claimed_until).update(
+            offset=offset + written, claimed_until=None, updated_at=timezone.now(),
+        )
+    if not committed:
+        raise UploadError("The upload was changed by another request.", 409)
+
+    session.offset = offset + written
+    session.claimed_until = None
+    if checksum is not None and not written:
+        raise UploadError("Checksum mismatch.", 460)
+    return session.offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_session(session):
+    """
+    Attach the finished upload to a new SOP, or to the SOP being edited, and
+    return ``(sop, created, sha256)``.
+    """
+    if session.expires_at < timezone.now():
+        raise UploadError("Upload has expired.", 410)
+    if session.offset != session.length:
+        raise UploadError("Upload is incomplete.", 409)
+
+    # hashlib cannot save a digest's state between requests, so the file is read once more here
+    sha256 = file_sha256(session.temp_path)
+    created = session.sop_id is None
+    sop = StatementOfPurpose(user_id=session.user_id) if created else session.sop
+    if session.title:
+        sop.title = session.title
+    with open(session.temp_path, 'rb') as temp_file:
+        sop.sop_file.save(session.filename, _SessionFile(temp_file), save=False)
+    sop.save()
+    discard_session(session)
+    return sop, created, sha256
+
+
+def discard_session(session):
+    try:
+        os.remove(session.temp_path)
+    except FileNotFoundError:
+        pass
+    session.delete()
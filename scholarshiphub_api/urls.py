@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import RegisterView, LoginView, VerifyEmailView, LogoutView, ScholarshipCreateView, CommentCreateView, StatementOfPurposeCreateView, GetScholarship, GetComments, GetSOP, StatementOfPurposeEditView, CommentEditView, ScholarshipEditView, UserEditView, ChangePasswordView, GetAComment, GetAScholarship, ScholarshipSearchView,UserListView, DeleteUserView, UploadReviewedSOPView, DeleteScholarshipView, DeleteSOPView, DeleteCommentView, UserDetailView
+from .views import RegisterView, LoginView, VerifyEmailView, LogoutView, TokenRefreshView, ScholarshipCreateView, ScholarshipBulkImportView, CommentCreateView, StatementOfPurposeCreateView, SOPUploadCreateView, SOPUploadView, SOPUploadCompleteView, GetScholarship, GetComments, GetSOP, SOPDownloadView, ReviewedSOPDownloadView, StatementOfPurposeEditView, CommentEditView, ScholarshipEditView, UserEditView, ChangePasswordView, GetAComment, GetAScholarship, GetScholarshipComments, ScholarshipSearchView, ScholarshipFilterView,UserListView, AdminExportView, RequestProfileListView, RequestProfileView, DeleteUserView, UploadReviewedSOPView, DeleteScholarshipView, DeleteSOPView, DeleteCommentView, UserDetailView
+
+from .async_views import AsyncGetScholarship, AsyncGetAScholarship, AsyncScholarshipSearchView, AsyncGetComments, AsyncUserDetailView
 
 from django.urls import re_path
 from rest_framework import permissions
@@ -28,25 +30,42 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('verify-email/<int:uid>/<str:token>/',VerifyEmailView.as_view(), name='verify-email'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('scholarships/create', ScholarshipCreateView.as_view(), name='create-scholarship'),
+    path('scholarships/bulk', ScholarshipBulkImportView.as_view(), name='bulk-import-scholarships'),
     path('comments/create', CommentCreateView.as_view(), name='create-comment'),
     path('sop/create', StatementOfPurposeCreateView.as_view(), name='create-sop'),
+    path('sop/uploads/', SOPUploadCreateView.as_view(), name='sop-upload-create'),
+    path('sop/uploads/<uuid:upload_id>/', SOPUploadView.as_view(), name='sop-upload'),
+    path('sop/uploads/<uuid:upload_id>/complete', SOPUploadCompleteView.as_view(), name='sop-upload-complete'),
     path('scholarships/', GetScholarship.as_view(), name='get-all-scholarships'),
     path('scholarships/<int:id>/', GetAScholarship.as_view(), name='get-scholarship'),
+    path('scholarships/<int:id>/comments/', GetScholarshipComments.as_view(), name='get-scholarship-comments'),
     path('comments/', GetComments.as_view(), name='get-scholarships'),
     path('comments/<int:id>/', GetAComment.as_view(), name='get-scholarships'),
     path('sop/<int:id>/', GetSOP.as_view(), name='get-sop'),
+    path('sop/<int:id>/download/', SOPDownloadView.as_view(), name='download-sop'),
+    path('sop/<int:id>/review/download/', ReviewedSOPDownloadView.as_view(), name='download-reviewed-sop'),
     path('profile/update', UserEditView.as_view(), name='edit-profile'),
     path('scholarships', ScholarshipEditView.as_view(), name='edit-scholarship'),
     path('comments', CommentEditView.as_view(), name='edit-comment'),
     path('sop/<int:id>', StatementOfPurposeEditView.as_view(), name='edit-sop'),
     path('change_password/', ChangePasswordView.as_view(), name='change_password'),
     path('scholarships/search/', ScholarshipSearchView.as_view(), name='search'),
+    path('scholarships/filter/', ScholarshipFilterView.as_view(), name='filter-scholarships'),
     path('users/', UserListView.as_view(), name='user-list'),
+    path('exports/<str:resource>/', AdminExportView.as_view(), name='admin-export'),
+    path('profiles/', RequestProfileListView.as_view(), name='request-profiles'),
+    path('profiles/<int:id>/', RequestProfileView.as_view(), name='request-profile'),
     path('users/<int:id>/', DeleteUserView.as_view(), name='delete-user'),
     path('sop/<int:id>/review/', UploadReviewedSOPView.as_view(), name='upload-reviewed-sop'),
     path('scholarships/<int:id>/delete/', DeleteScholarshipView.as_view(), name='delete-scholarship'),
     path('sop/<int:id>/delete/', DeleteSOPView.as_view(), name='delete-sop'),
     path('comments/<int:id>/delete/', DeleteCommentView.as_view(), name='delete-comment'),
     path('me/', UserDetailView.as_view(), name='user-detail'),
+    path('async/scholarships/', AsyncGetScholarship.as_view(), name='async-get-all-scholarships'),
+    path('async/scholarships/<int:id>/', AsyncGetAScholarship.as_view(), name='async-get-scholarship'),
+    path('async/scholarships/search/', AsyncScholarshipSearchView.as_view(), name='async-search'),
+    path('async/comments/', AsyncGetComments.as_view(), name='async-get-comments'),
+    path('async/me/', AsyncUserDetailView.as_view(), name='async-user-detail'),
 ]
@@ -1,17 +1,56 @@
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 import jwt
+from .jobs import enqueue_email
 
 
 def send_verification_email(user):
     token = default_token_generator.make_token(user)
     verification_link = settings.API_BASE_URL + reverse('verify-email', kwargs={'uid': user.id, 'token': token})
-    send_mail(
+    enqueue_email(
         'Verify your email',
         f'Please click the link to verify your email: {verification_link}',
-        settings.DEFAULT_FROM_EMAIL,
         [user.email],
-        fail_silently=False,
-    )
\ No newline at end of file
+    )
+
+
+def build_comment_tree(comments):
+    """
+    Arrange a flat iterable of comments into reply threads in a single pass.
+
+    Each comment gets a ``thread_replies`` list holding its direct replies, and
+    the top-level comments are returned in the order they were given.
+    """
+    comments = list(comments)
+    by_id = {}
+    for comment in comments:
+        comment.thread_replies = []
+        by_id[comment.id] = comment
+
+    roots = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_comment_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.thread_replies.append(comment)
+    return roots
+
+
+async def aload_reply_threads(comments, queryset):
+    """
+    Attach the full reply tree of each comment as ``thread_replies`` (for
+    CommentThreadSerializer), one query per level of nesting instead of one
+    per comment. ``queryset`` is the comment queryset replies are read from.
+    """
+    level = comments
+    for comment in level:
+        comment.thread_replies = []
+    while level:
+        by_id = {comment.id: comment for comment in level}
+        level = [reply async for reply in queryset.filter(parent_comment_id__in=by_id).order_by('created_at', 'id')]
+        for reply in level:
+            reply.thread_replies = []
+            by_id[reply.parent_comment_id].thread_replies.append(reply)
+    return comments
@@ -3,16 +3,50 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth.tokens import default_token_generator
 from rest_framework.authtoken.models import Token
-from .models import User, Scholarship, Comment, StatementOfPurpose
-from .serializers import UserSerializer, LoginSerializer, ScholarshipSerializer, CommentSerializer, StatementOfPurposeSerializer, UserEditSerializer, ScholarshipEditSerializer, CommentEditSerializer, StatementOfPurposeEditSerializer, ChangePasswordSerializer, ReviewSOPSerializer
-from .utils import send_verification_email
+from .models import User, Scholarship, Comment, StatementOfPurpose, UploadSession, RequestProfile
+from .serializers import UserSerializer, LoginSerializer, ScholarshipSerializer, CommentSerializer, CommentThreadSerializer, StatementOfPurposeSerializer, UserEditSerializer, ScholarshipEditSerializer, CommentEditSerializer, StatementOfPurposeEditSerializer, ChangePasswordSerializer, ReviewSOPSerializer, TokenRefreshSerializer, UploadSessionSerializer, ScholarshipFilterSerializer, ScholarshipFacetFilterSerializer, RequestProfileSerializer, ScholarshipListSerializer, ScholarshipFieldsetSerializer
+from .utils import send_verification_email, build_comment_tree
+from .pagination import paginate, pagination_parameters, page_parameters, KeysetPagination, PagePagination
+from .search import search_scholarships
+from .filters import SCHOLARSHIP_ORDERINGS, filter_scholarships, scholarship_facets, select_scholarship_fields
+from .caching import cached_catalog_response
+from .fast_serializers import ScholarshipValuesSerializer, CommentValuesSerializer, UserValuesSerializer
+from .counters import comment_added, delete_comments
+from .imports import ScholarshipImporter, ImportFormatError
+from .exports import EXPORTS, EXPORT_FORMATS, export_resource
+from .renderers import NDJSONRenderer, CSVRenderer
+from .authentication import REFRESH, decode_token, issue_tokens, revoke_user_tokens, spend_refresh_token
+from .downloads import FileDownloadNegotiation, serve_file
+from .passwords import PasswordHashingBusy, check_user_password, set_user_password
+from .uploads import CHUNK_CONTENT_TYPE, UploadError, start_session, parse_checksum, claim_session, append_chunk, complete_session, discard_session
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework import permissions
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from django.http import Http404, HttpResponse
+from django.utils.http import content_disposition_header
+from django.db import transaction
+from django.urls import reverse
+from io import BytesIO
+from functools import partial
+from django.conf import settings
+
+
+def password_hashing_busy():
+    """ 503 for when the password hashing pool is full """
+    return Response({"error": "The server is busy. Try again shortly."}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(settings.ADMISSION_RETRY_AFTER)})
+
+
+fieldset_parameters = [
+    openapi.Parameter('shape', openapi.IN_QUERY, description="full (default) or compact (a description_snippet instead of description, eligibility and benefit)", type=openapi.TYPE_STRING, enum=['full', 'compact']),
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated fields to return instead of the shape, e.g. id,title,image", type=openapi.TYPE_STRING),
+    openapi.Parameter('exclude', openapi.IN_QUERY, description="Comma-separated fields to leave out", type=openapi.TYPE_STRING),
+]
 
 
 class RegisterView(APIView):
@@ -50,17 +84,20 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
+            try:
+                user = serializer.save()
+            except PasswordHashingBusy:
+                return password_hashing_busy()
             send_verification_email(user)
             token, created = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key, 'user': UserSerializer(user).data}, status=status.HTTP_201_CREATED)
+            return Response({'token': token.key, **issue_tokens(user), 'user': UserSerializer(user).data}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LoginView(APIView):
     """View for managing user login"""
     @swagger_auto_schema(
         operation_summary="Validate user credentials and login user",
-        operation_description="This endpoint validates user's email and password, and returns the user object along with a token.",
+        operation_description="This endpoint validates user's email and password, and returns the user object along with a legacy token and a short-lived JWT access/refresh pair. Send the access token as `Authorization: Bearer <access>`.",
         tags=["User Processes"],
         request_body=LoginSerializer,
         responses={
@@ -91,15 +128,17 @@ class LoginView(APIView):
         if serializer.is_valid():
             email = serializer.validated_data['email']
             password = serializer.validated_data['password']
+            user = User.objects.filter(email=email).first()
             try:
-                user = User.objects.get(email=email)
-                if user.check_password(password):
-                    token, created = Token.objects.get_or_create(user=user)
-                    return Response({'token': token.key, 'user': UserSerializer(user).data}, status=status.HTTP_200_OK)
-                else:
-                    return Response({"Error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
-            except User.DoesNotExist:
-                return Response({"Error": "No user found for the email provided"}, status=status.HTTP_400_BAD_REQUEST)
+                # An unknown email is checked against a dummy hash so it takes as long as a known one
+                correct = check_user_password(user, password)
+            except PasswordHashingBusy:
+                return password_hashing_busy()
+            if correct:
+                token, created = Token.objects.get_or_create(user=user)
+                return Response({'token': token.key, **issue_tokens(user), 'user': UserSerializer(user).data}, status=status.HTTP_200_OK)
+            # Also for an unknown email, so the answer does not reveal which emails have accounts
+            return Response({"Error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LogoutView(APIView):
@@ -107,7 +146,7 @@ class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     @swagger_auto_schema(
         operation_summary="Logout a user",
-        operation_description="This endpoint deletes the token of a logged in user, effectively logging them out",
+        operation_description="This endpoint deletes the token of a logged in user and revokes their JWTs, effectively logging them out",
         tags=["User Processes"],
         manual_parameters=[
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
@@ -122,11 +161,52 @@ class LogoutView(APIView):
         }
     )
     def delete(self, request):
-        try:
-            request.user.auth_token.delete()
-            return Response({"Message": "Successfully logged out."}, status=status.HTTP_200_OK)
-        except (AttributeError, Token.DoesNotExist):
-            return Response({"Error": "Invalid token."}, status=status.HTTP_400_BAD_REQUEST)
+        revoke_user_tokens(request.user.pk)
+        Token.objects.filter(user=request.user).delete()
+        return Response({"Message": "Successfully logged out."}, status=status.HTTP_200_OK)
+
+
+class TokenRefreshView(APIView):
+    """ Endpoint to exchange a refresh token for a new JWT pair """
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_summary="Refresh JWT access token",
+        operation_description="This endpoint exchanges a valid refresh token for a new access/refresh token pair. Each refresh token can be exchanged once; presenting it again revokes every token of the user.",
+        tags=["User Processes"],
+        request_body=TokenRefreshSerializer,
+        responses={
+            200: openapi.Response(
+                description="New token pair",
+                examples={
+                    "application/json": {
+                        "access": "eyJhbGciOi...",
+                        "refresh": "eyJhbGciOi..."
+                    }
+                }
+            ),
+            401: openapi.Response(
+                description="Invalid, expired or revoked refresh token",
+            )
+        }
+    )
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                claims = decode_token(serializer.validated_data['refresh'], REFRESH)
+            except AuthenticationFailed as exc:
+                return Response({"Error": exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+            try:
+                user = User.objects.get(pk=claims['sub'], is_active=True)
+            except User.DoesNotExist:
+                return Response({"Error": "User inactive or deleted."}, status=status.HTTP_401_UNAUTHORIZED)
+            try:
+                spend_refresh_token(claims)
+            except AuthenticationFailed as exc:
+                return Response({"Error": exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+            return Response(issue_tokens(user), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class VerifyEmailView(APIView):
     """ Endpoint to verify email of a registered user """
@@ -204,6 +284,54 @@ class ScholarshipCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ScholarshipBulkImportView(APIView):
+    """ View for importing many scholarships in one request """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = (MultiPartParser, FormParser)
+
+    @swagger_auto_schema(
+        operation_summary="Bulk import scholarships",
+        operation_description="This endpoint will be used by admin users to create or update many scholarships at once. Upload a CSV or JSON Lines file with the scholarship fields, or a zip archive holding such a file plus the images it references by name in the `image` column. Rows are matched on `title`: existing scholarships are updated, new ones created. Invalid rows are skipped and reported.",
+        tags=["Admin Processes"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('file', openapi.IN_FORM, description=".csv, .jsonl or .zip file", type=openapi.TYPE_FILE, required=True),
+            openapi.Parameter('batch_size', openapi.IN_QUERY, description="Rows per transaction", type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Import report",
+                examples={
+                    "application/json": {
+                        "imported": 49998,
+                        "batches": 50,
+                        "error_count": 2,
+                        "errors": [{"row": 17, "errors": {"link": ["This field is required."]}}]
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description="Missing or unsupported file",
+            )
+        }
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = int(request.query_params.get('batch_size', settings.SCHOLARSHIP_IMPORT_BATCH_SIZE))
+        except ValueError:
+            return Response({"batch_size": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        batch_size = max(1, min(batch_size, settings.SCHOLARSHIP_IMPORT_MAX_BATCH_SIZE))
+
+        try:
+            report = ScholarshipImporter(batch_size).run(upload)
+        except ImportFormatError as exc:
+            return Response({"file": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class CommentCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -240,7 +368,8 @@ class CommentCreateView(APIView):
     def post(self, request):
         serializer = CommentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                comment_added(serializer.save())
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -272,29 +401,199 @@ class StatementOfPurposeCreateView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SOPUploadCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Start a resumable SOP upload",
+        operation_description="Creates an upload session. The file is then sent in chunks with PATCH requests to the returned Location and attached to a new SOP (or to `sop`, if given) once completed",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+        ],
+        request_body=UploadSessionSerializer,
+        responses={
+            201: openapi.Response(description="Upload session created", schema=UploadSessionSerializer()),
+            400: openapi.Response(description="Bad Request - validation errors"),
+        }
+    )
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        session = serializer.save(user=request.user)
+        start_session(session)
+        location = reverse('sop-upload', kwargs={'upload_id': session.id})
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers={
+            'Location': request.build_absolute_uri(location),
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.length),
+        })
+
+
+class SOPUploadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self, request, upload_id):
+        return UploadSession.objects.filter(pk=upload_id, user=request.user).first()
+
+    @swagger_auto_schema(
+        operation_summary="Get the state of a resumable SOP upload",
+        operation_description="Returns the number of bytes received so far in the `offset` field and the Upload-Offset header. Clients resume by sending the next chunk from that offset",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: openapi.Response(description="Successful", schema=UploadSessionSerializer()),
+            404: openapi.Response(description="Upload not found"),
+        }
+    )
+    def get(self, request, upload_id):
+        session = self.get_object(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = UploadSessionSerializer(session)
+        return Response(serializer.data, headers={
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.length),
+            'Cache-Control': 'no-store',
+        })
+
+    @swagger_auto_schema(
+        operation_summary="Upload a chunk of a SOP file",
+        operation_description="The request body is the raw chunk (Content-Type: application/offset+octet-stream). Upload-Offset must equal the current offset of the upload. An optional `Upload-Checksum: sha256 <base64 digest>` header is verified before the chunk is accepted",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('Upload-Offset', openapi.IN_HEADER, description="Offset of this chunk in the file", type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter('Upload-Checksum', openapi.IN_HEADER, description="sha256 <base64 digest of the chunk>", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            204: openapi.Response(description="Chunk stored, the new offset is in the Upload-Offset header"),
+            400: openapi.Response(description="Bad Request - missing or invalid headers"),
+            404: openapi.Response(description="Upload not found"),
+            409: openapi.Response(description="Upload-Offset does not match the current offset, or another chunk is in progress"),
+            410: openapi.Response(description="Upload has expired"),
+            413: openapi.Response(description="Chunk is too large"),
+            415: openapi.Response(description="Wrong Content-Type"),
+            460: openapi.Response(description="Checksum mismatch"),
+        }
+    )
+    def patch(self, request, upload_id):
+        if request.content_type.split(';')[0].strip() != CHUNK_CONTENT_TYPE:
+            return Response({"error": "Content-Type must be %s." % CHUNK_CONTENT_TYPE}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset and Content-Length headers are required."}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.SOP_UPLOAD_MAX_CHUNK_SIZE:
+            return Response({"error": "Chunks may not exceed %d bytes." % settings.SOP_UPLOAD_MAX_CHUNK_SIZE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        try:
+            checksum = parse_checksum(request.headers.get('Upload-Checksum'))
+            session = claim_session(upload_id, request.user, offset)
+            new_offset = append_chunk(session, request.stream or BytesIO(), offset, length, checksum)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        return Response(status=status.HTTP_204_NO_CONTENT, headers={'Upload-Offset': str(new_offset)})
+
+    @swagger_auto_schema(
+        operation_summary="Abort a resumable SOP upload",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            204: openapi.Response(description="Upload aborted"),
+            404: openapi.Response(description="Upload not found"),
+        }
+    )
+    def delete(self, request, upload_id):
+        session = self.get_object(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        discard_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SOPUploadCompleteView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Complete a resumable SOP upload",
+        operation_description="Attaches the uploaded file to a new SOP, or replaces the file of the SOP the upload was started for. Returns the SOP along with the SHA-256 of the file",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: openapi.Response(description="SOP file replaced"),
+            201: openapi.Response(description="SOP created"),
+            404: openapi.Response(description="Upload not found"),
+            409: openapi.Response(description="Upload is incomplete"),
+            410: openapi.Response(description="Upload has expired"),
+        }
+    )
+    def post(self, request, upload_id):
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(pk=upload_id, user=request.user).first()
+            if session is None:
+                return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+            try:
+                sop, created, sha256 = complete_session(session)
+            except UploadError as e:
+                return Response({"error": str(e)}, status=e.status_code)
+        data = dict(StatementOfPurposeSerializer(sop).data, id=sop.id, sha256=sha256)
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
 class GetScholarship(APIView):
     """ View for retrieving scholarship objects """
+    # Public read; skipping authentication keeps cache hits and 304s free of DB queries
+    authentication_classes = []
+
     @swagger_auto_schema(
         operation_summary="Retrieve all scholarships",
-        operation_description="This endpoint retrieves all scholarships from the database",
+        operation_description="This endpoint retrieves all scholarships from the database. Pass `page_size` or `cursor` to receive a cursor-paginated page instead of the full list. Ordering by `deadline_date` leaves out scholarships whose deadline could not be parsed, and ordering by `-last_comment_at` (most recent activity first) those without comments.",
         tags=["Scholarships"],
+        manual_parameters=[
+            openapi.Parameter('deadline_after', openapi.IN_QUERY, description="Only deadlines on or after this date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('deadline_before', openapi.IN_QUERY, description="Only deadlines on or before this date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('expired', openapi.IN_QUERY, description="true for closed scholarships, false for open ones", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="Sort order", type=openapi.TYPE_STRING, enum=list(SCHOLARSHIP_ORDERINGS)),
+        ] + fieldset_parameters + pagination_parameters,
         responses={
             200: openapi.Response(
                 description="Successful",
-                schema=ScholarshipSerializer(many=True),
+                schema=ScholarshipListSerializer(many=True),
             ),
-            404: openapi.Response(
-                description="No scholarship found",
+            400: openapi.Response(
+                description="Bad Request - invalid filter",
             ),
         }
     )
+    @cached_catalog_response
     def get(self, request):
-        scholarships = Scholarship.objects.all()
-        serializer = ScholarshipSerializer(scholarships, many=True)
+        filters = ScholarshipFilterSerializer(data=request.query_params.dict())
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+        scholarships, ordering = filter_scholarships(Scholarship.objects.all(), filters.validated_data)
+        fieldset = filters.validated_data['fieldset']
+        rows = ScholarshipValuesSerializer.values(scholarships, fieldset, ordering)
+        serializer_class = partial(ScholarshipValuesSerializer, fields=fieldset)
+        paginated = paginate(request, rows, serializer_class, view=self, ordering=ordering)
+        if paginated is not None:
+            return paginated
+        if ordering is not None:
+            rows = rows.order_by(*ordering)
+        serializer = serializer_class(rows, many=True)
         return Response(serializer.data)
 
 class GetAScholarship(APIView):
     """ Retrieve a specific scholarship based on id """
+    authentication_classes = []
+
     @swagger_auto_schema(
         operation_summary="Retrieve a specific scholarship by ID",
         operation_description="This endpoint retrieves a specific scholarship from the database by its ID",
@@ -321,6 +620,7 @@ class GetAScholarship(APIView):
             ),
         }
     )
+    @cached_catalog_response
     def get(self, request, id):
         try:
             scholarship = Scholarship.objects.get(id=id)
@@ -334,8 +634,9 @@ class GetComments(APIView):
     """ View to retrieve a comment """
     @swagger_auto_schema(
         operation_summary="Retrieve all comments",
-        operation_description="This endpoint retrieves all comments from the database",
+        operation_description="This endpoint retrieves all comments from the database. Pass `page_size` or `cursor` to receive a cursor-paginated page instead of the full list.",
         tags=["Comments"],
+        manual_parameters=pagination_parameters,
         responses={
             200: openapi.Response(
                 description="Request submitted successfully",
@@ -347,8 +648,45 @@ class GetComments(APIView):
         }
     )
     def get(self, request):
-        comments = Comment.objects.all()
-        serializer = CommentSerializer(comments, many=True)
+        ordering = ('created_at', 'id')
+        comments = CommentValuesSerializer.values(Comment.objects.order_by(*ordering), ordering=ordering)
+        # A page's replies are read level by level; the full list already holds every reply
+        paginated = paginate(request, comments, partial(CommentValuesSerializer, replies=comments), view=self, ordering=ordering)
+        if paginated is not None:
+            return paginated
+        serializer = CommentValuesSerializer(comments, many=True)
+        return Response(serializer.data)
+
+class GetScholarshipComments(APIView):
+    """ Retrieve the comment threads of a scholarship """
+    @swagger_auto_schema(
+        operation_summary="Retrieve the comment threads of a scholarship",
+        operation_description="This endpoint retrieves the top-level comments of a scholarship with their replies nested under them. All comments are loaded in a single query.",
+        tags=["Comments"],
+        manual_parameters=[
+            openapi.Parameter(
+                'id',
+                openapi.IN_PATH,
+                description="ID of the scholarship",
+                type=openapi.TYPE_INTEGER,
+                required=True
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Successful",
+                schema=CommentThreadSerializer(many=True),
+            ),
+            404: openapi.Response(
+                description="Scholarship not found",
+            ),
+        }
+    )
+    def get(self, request, id):
+        if not Scholarship.objects.filter(id=id).exists():
+            return Response({"error": "Scholarship not found."}, status=status.HTTP_404_NOT_FOUND)
+        comments = Comment.objects.filter(scholarship_id=id).select_related('user').order_by('created_at', 'id')
+        serializer = CommentThreadSerializer(build_comment_tree(comments), many=True)
         return Response(serializer.data)
 
 class GetAComment(APIView):
@@ -427,6 +765,70 @@ class GetSOP(APIView):
         return Response(serializer.data)
 
 
+class SOPDownloadView(APIView):
+    """ Download the file of an SOP, for its owner and staff """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = FileDownloadNegotiation
+    field_name = 'sop_file'
+
+    def download(self, request, id):
+        sop = StatementOfPurpose.objects.filter(pk=id).first()
+        if sop is None:
+            return Response({"error": "SOP not found."}, status=status.HTTP_404_NOT_FOUND)
+        if sop.user_id != request.user.pk and not request.user.is_staff:
+            return Response({"error": "You do not have permission to download this SOP."}, status=status.HTTP_403_FORBIDDEN)
+        field = getattr(sop, self.field_name)
+        if not field:
+            return Response({"error": "File not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            return serve_file(request, field)
+        except FileNotFoundError:
+            return Response({"error": "File not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    @swagger_auto_schema(
+        operation_summary="Download a Statement of Purpose file",
+        operation_description="Streams the SOP file to its owner or to staff. Supports Range/If-Range requests for resumed downloads",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('Range', openapi.IN_HEADER, description="Byte range, e.g. bytes=1024-", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: openapi.Response(description="The file"),
+            206: openapi.Response(description="The requested byte range"),
+            403: openapi.Response(description="Not the owner of the SOP"),
+            404: openapi.Response(description="SOP or file not found"),
+            416: openapi.Response(description="Range not satisfiable"),
+        }
+    )
+    def get(self, request, id):
+        return self.download(request, id)
+
+
+class ReviewedSOPDownloadView(SOPDownloadView):
+    """ Download the reviewed file of an SOP, for its owner and staff """
+    field_name = 'reviewed_sop'
+
+    @swagger_auto_schema(
+        operation_summary="Download a reviewed Statement of Purpose file",
+        operation_description="Streams the reviewed SOP file to its owner or to staff. Supports Range/If-Range requests for resumed downloads",
+        tags=["Statement of Purpose"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('Range', openapi.IN_HEADER, description="Byte range, e.g. bytes=1024-", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: openapi.Response(description="The file"),
+            206: openapi.Response(description="The requested byte range"),
+            403: openapi.Response(description="Not the owner of the SOP"),
+            404: openapi.Response(description="SOP or reviewed file not found"),
+            416: openapi.Response(description="Range not satisfiable"),
+        }
+    )
+    def get(self, request, id):
+        return self.download(request, id)
+
+
 class UserEditView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -462,7 +864,7 @@ class UserEditView(APIView):
         }
     )
     def put(self, request):
-        user = request.user
+        user = User.objects.get(pk=request.user.pk)
         serializer = UserEditSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -608,7 +1010,7 @@ class ChangePasswordView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Change Password",
-        operation_description="This endpoint allows a user to change their password by providing the old password, along with the new password",
+        operation_description="This endpoint allows a user to change their password by providing the old password, along with the new password. Every JWT issued before is revoked, and a new access/refresh pair is returned.",
         tags=["User Processes"],
         request_body=ChangePasswordSerializer,
         manual_parameters=[
@@ -632,16 +1034,20 @@ class ChangePasswordView(APIView):
     def post(self, request):
         serializer = ChangePasswordSerializer(data=request.data)
         if serializer.is_valid():
-            user = request.user
+            user = User.objects.get(pk=request.user.pk)
             old_password = serializer.data.get("old_password")
             new_password = serializer.data.get("new_password")
 
-            if not user.check_password(old_password):
-                return Response({"error": "Old password is incorrect."}, status=status.HTTP_400_BAD_REQUEST)
-            
-            user.set_password(new_password)
+            try:
+                if not check_user_password(user, old_password):
+                    return Response({"error": "Old password is incorrect."}, status=status.HTTP_400_BAD_REQUEST)
+                set_user_password(user, new_password)
+            except PasswordHashingBusy:
+                return password_hashing_busy()
             user.save()
-            return Response({"success": "Password changed successfully."}, status=status.HTTP_200_OK)
+            # Tokens issued with the old password stop working; the caller continues with a new pair
+            revoke_user_tokens(user.pk)
+            return Response({"success": "Password changed successfully.", **issue_tokens(user)}, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -650,7 +1056,7 @@ class ScholarshipSearchView(APIView):
     """ Search view """
     @swagger_auto_schema(
         operation_summary="Search Scholarships",
-        operation_description="This endpoint allows a user to Search for scholarships by title, and other fields in the scholarship table",
+        operation_description="This endpoint allows a user to Search for scholarships by title, and other fields in the scholarship table. Results are ranked by relevance, with matches in the title weighted above field of study and description. Pass `page` or `page_size` to receive a paginated response.",
         tags=["Search"],
         manual_parameters=[
             openapi.Parameter(
@@ -659,37 +1065,107 @@ class ScholarshipSearchView(APIView):
                 description="Search query",
                 type=openapi.TYPE_STRING
             )
-        ],
-        responses={200: ScholarshipSerializer(many=True)}
+        ] + fieldset_parameters + page_parameters,
+        responses={200: ScholarshipListSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
+        fields = ScholarshipFieldsetSerializer(data=request.query_params.dict())
+        if not fields.is_valid():
+            return Response(fields.errors, status=status.HTTP_400_BAD_REQUEST)
+        fieldset = fields.validated_data['fieldset']
         query = request.query_params.get('search', None)
         if query:
-            queryset = Scholarship.objects.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(eligibility__icontains=query) |
-                Q(benefit__icontains=query) |
-                Q(field_of_study__icontains=query) |
-                Q(deadline__icontains=query)
-            )
+            queryset = search_scholarships(Scholarship.objects.all(), query)
         else:
-            queryset = Scholarship.objects.all()
-        
-        serializer = ScholarshipSerializer(queryset, many=True)
+            queryset = Scholarship.objects.order_by('id')
+        queryset = select_scholarship_fields(queryset, fieldset)
+
+        serializer_class = partial(ScholarshipListSerializer, fields=fieldset)
+        paginated = paginate(request, queryset, serializer_class, view=self, pagination_class=PagePagination)
+        if paginated is not None:
+            return paginated
+        serializer = serializer_class(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class ScholarshipFilterView(APIView):
+    """ Faceted filtering of the scholarship catalog """
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_summary="Filter scholarships with facet counts",
+        operation_description="Filters scholarships by field of study, deadline range and free text, and returns one page of results together with the total `count` and facet counts per `field_of_study` and per deadline month (YYYY-MM). Each facet is counted without its own filter applied. Results are ranked by relevance when `q` is given without `ordering`.",
+        tags=["Search"],
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Free-text query", type=openapi.TYPE_STRING),
+            openapi.Parameter('field_of_study', openapi.IN_QUERY, description="Field of study; repeat the parameter to match any of several", type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING), collection_format='multi'),
+            openapi.Parameter('deadline_after', openapi.IN_QUERY, description="Only deadlines on or after this date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('deadline_before', openapi.IN_QUERY, description="Only deadlines on or before this date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('expired', openapi.IN_QUERY, description="true for closed scholarships, false for open ones", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="Sort order", type=openapi.TYPE_STRING, enum=list(SCHOLARSHIP_ORDERINGS)),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor returned in the `next`/`previous` links", type=openapi.TYPE_STRING),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page number, used instead of `cursor` for relevance-ranked results", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page", type=openapi.TYPE_INTEGER),
+        ] + fieldset_parameters,
+        responses={
+            200: openapi.Response(
+                description="Successful",
+                examples={
+                    "application/json": {
+                        "count": 2,
+                        "next": None,
+                        "previous": None,
+                        "results": [],
+                        "facets": {
+                            "field_of_study": [{"value": "Engineering", "count": 2}, {"value": "Medicine", "count": 1}],
+                            "deadline_month": [{"value": "2025-06", "count": 2}, {"value": None, "count": 1}],
+                        },
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description="Bad Request - invalid filter",
+            ),
+        }
+    )
+    @cached_catalog_response
+    def get(self, request):
+        data = request.query_params.dict()
+        if 'field_of_study' in request.query_params:
+            data['field_of_study'] = request.query_params.getlist('field_of_study')
+        filters = ScholarshipFacetFilterSerializer(data=data)
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        scholarships, ordering = filter_scholarships(Scholarship.objects.all(), filters.validated_data)
+        fieldset = filters.validated_data['fieldset']
+        scholarships = select_scholarship_fields(scholarships, fieldset, ordering)
+        if filters.validated_data.get('q') and ordering is None:
+            paginator = PagePagination()
+        else:
+            paginator = KeysetPagination(ordering=ordering)
+        page = paginator.paginate_queryset(scholarships, request, view=self)
+        facets = scholarship_facets(filters.validated_data)
+
+        response = paginator.get_paginated_response(ScholarshipListSerializer(page, many=True, fields=fieldset).data)
+        response.data = {
+            'count': facets['count'],
+            **response.data,
+            'facets': {'field_of_study': facets['field_of_study'], 'deadline_month': facets['deadline_month']},
+        }
+        return response
+
 class UserListView(APIView):
     """ View to retrieve all users by the admin """
     permission_classes = [permissions.IsAdminUser]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer, CSVRenderer]
 
     @swagger_auto_schema(
         operation_summary="Get All Users: Admin Only",
-        operation_description="This endpoint allows the admin user to retrieve all users in the database",
+        operation_description="This endpoint allows the admin user to retrieve all users in the database. Pass `page_size` or `cursor` to receive a cursor-paginated page instead of the full list, or `format=ndjson`/`format=csv` to stream an export.",
         tags=["Admin Processes"],
         manual_parameters=[
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
-        ],
+        ] + pagination_parameters,
         responses={
             200: openapi.Response(
                 description="Successful",
@@ -702,10 +1178,106 @@ class UserListView(APIView):
     )
     def get(self, request, *args, **kwargs):
 
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
+        if request.accepted_renderer.format in EXPORT_FORMATS:
+            return export_resource('users', request.accepted_renderer.format)
+
+        users = UserValuesSerializer.values(User.objects.all())
+        paginated = paginate(request, users, UserValuesSerializer, view=self)
+        if paginated is not None:
+            return paginated
+        serializer = UserValuesSerializer(users, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class AdminExportView(APIView):
+    """ View for streaming admin exports of users, scholarships, comments and SOP metadata """
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    @swagger_auto_schema(
+        operation_summary="Export a table: Admin Only",
+        operation_description="This endpoint streams every row of `users`, `scholarships`, `comments` or `sops` as NDJSON (default) or CSV (`format=csv`). Memory use stays constant regardless of table size.",
+        tags=["Admin Processes"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('resource', openapi.IN_PATH, description="One of: " + ", ".join(EXPORTS), type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('format', openapi.IN_QUERY, description="ndjson or csv", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Streamed export",
+            ),
+            401: openapi.Response(
+                description="Unauthorized",
+            ),
+            404: openapi.Response(
+                description="Unknown resource",
+            ),
+        }
+    )
+    def get(self, request, resource):
+        if resource not in EXPORTS:
+            raise Http404
+        return export_resource(resource, request.accepted_renderer.format)
+
+
+class RequestProfileListView(APIView):
+    """ Recent request profiles, for admins """
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="List request profiles: Admin Only",
+        operation_description="Staff can profile a single request by sending it with the `X-Profile: 1` header; the response then carries an `X-Profile-Id` header. This endpoint lists the stored profiles, newest first, with their top functions by cumulative time.",
+        tags=["Admin Processes"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+        ] + pagination_parameters,
+        responses={
+            200: openapi.Response(description="Successful", schema=RequestProfileSerializer(many=True)),
+            401: openapi.Response(description="Unauthorized"),
+        }
+    )
+    def get(self, request):
+        profiles = RequestProfile.objects.select_related('user').defer('stats')
+        paginated = paginate(request, profiles, RequestProfileSerializer, view=self, ordering=('-id',))
+        if paginated is not None:
+            return paginated
+        serializer = RequestProfileSerializer(profiles.order_by('-id')[:settings.PAGINATION_MAX_PAGE_SIZE], many=True)
+        return Response(serializer.data)
+
+
+class RequestProfileView(APIView):
+    """ A single request profile, for admins """
+    permission_classes = [permissions.IsAdminUser]
+    content_negotiation_class = FileDownloadNegotiation
+
+    def get_object(self, id):
+        try:
+            return RequestProfile.objects.select_related('user').get(pk=id)
+        except RequestProfile.DoesNotExist:
+            raise Http404
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve a request profile: Admin Only",
+        operation_description="Returns the profile summary as JSON, or with `?download=pstats` the raw profile, which can be loaded with `pstats.Stats` or viewers such as snakeviz.",
+        tags=["Admin Processes"],
+        manual_parameters=[
+            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Authentication token", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('download', openapi.IN_QUERY, description="Set to `pstats` to download the raw profile", type=openapi.TYPE_STRING, enum=['pstats']),
+        ],
+        responses={
+            200: openapi.Response(description="Successful", schema=RequestProfileSerializer()),
+            401: openapi.Response(description="Unauthorized"),
+            404: openapi.Response(description="Profile not found"),
+        }
+    )
+    def get(self, request, id):
+        profile = self.get_object(id)
+        if request.query_params.get('download') == 'pstats':
+            response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = content_disposition_header(True, 'profile-%d.prof' % profile.pk)
+            return response
+        return Response(RequestProfileSerializer(profile).data)
+
 class DeleteUserView(APIView):
     """ View to delete a user by the admin """
     permission_classes = [permissions.IsAdminUser]
@@ -731,7 +1303,10 @@ class DeleteUserView(APIView):
             user = User.objects.get(id=id)
         except User.DoesNotExist:
             raise Http404
-        user.delete()
+        with transaction.atomic():
+            # The user's comments cascade; count them (and their reply threads) off the scholarships first
+            delete_comments(Comment.objects.filter(user=user))
+            user.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -822,11 +1397,10 @@ class DeleteCommentView(APIView):
         }
     )
     def delete(self, request, id):
-        try:
-            comment = Comment.objects.get(id=id)
-        except Comment.DoesNotExist:
+        if not Comment.objects.filter(id=id).exists():
             raise Http404
-        comment.delete()
+        # Replies are deleted with the comment and come off the scholarship's counter too
+        delete_comments(Comment.objects.filter(id=id))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class DeleteSOPView(APIView):